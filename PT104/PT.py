@@ -1,17 +1,47 @@
+import bisect
 import logging
+import warnings
+
+try:
+    import numpy as np
+except ImportError:  # numpy is only needed for batch conversions
+    np = None
 
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
 
+def _require_numpy():
+    if np is None:
+        raise ImportError('numpy is required for batch conversions, '
+                          'install it with "pip install Pico_PT104[numpy]"')
+
+
 class PtCalculator:
-    def __init__(self, r_0=100):
+    def __init__(self, r_0=100, table_accuracy=1e-4):
         self.a = 3.9083e-3
         self.b = -5.7750e-7
         self.c = -4.1830e-12
         self.r_0 = r_0
+        self.table_accuracy = table_accuracy
         self._feed_temperature = 0
+        self._table = None
+
+    @property
+    def table(self):
+        """Inverse lookup table for the current coefficients and accuracy"""
+        if self._table is None or self._table.accuracy != self.table_accuracy:
+            self._table = PtTable.get(self, self.table_accuracy)
+        return self._table
+
+    def lookup_temperature(self, resistance):
+        """Get temperature from resistance value interpolating the table
+
+        Faster than :meth:`get_temperature`, the error is bounded by
+        ``table_accuracy`` (°C) inside the table range.
+        """
+        return self.table.get_temperature(resistance / self.r_0)
 
     def _normr(self, temperature):
         normr = 1 + self.a * temperature
@@ -34,24 +64,175 @@ class PtCalculator:
         norm_r = resistance / self.r_0
         for iteration in range(max_iter):
             delta_t = (
-                - (self._norm(temperature) - norm_r) /
-                self._dnorm_dt(temperature)
+                - (self._normr(temperature) - norm_r) /
+                self._dnormr_dt(temperature)
                 )
             temperature += delta_t
             if abs(delta_t) < error:
                 self._feed_temperature = temperature
-                logging.debug(f'Found temperature with error less than '
-                              f'{delta_t} after {iteration} iterations')
+                logger.debug('Found temperature with error less than %s '
+                             'after %s iterations', delta_t, iteration)
                 return temperature
         self._feed_temperature  = 0
         raise Exception(f'Not found temperature for resistance {resistance}')
 
+    def get_temperatures(self, resistances, error=1e-7, max_iter=100):
+        """Get temperatures from an array of resistance values
+
+        Values at or above ``r_0`` (T >= 0 °C) are solved with the closed-form
+        Callendar-Van Dusen inverse, only the negative branch is refined with
+        vectorized newton iterations seeded with that same quadratic root.
+
+        :param resistances: array like of resistances in ohm
+        :return: numpy array of temperatures in °C
+        """
+        _require_numpy()
+        norm_r = np.asarray(resistances, dtype=float) / self.r_0
+        with np.errstate(invalid='ignore'):
+            temperatures = self._quadratic_inverse(norm_r)
+        not_found = np.isnan(temperatures)
+        if not_found.any():
+            # Past the maximum of R(T), like the scalar path
+            resistance = np.asarray(resistances, dtype=float)[not_found][0]
+            raise Exception(
+                f'Not found temperature for resistance {resistance}'
+            )
+
+        negative = norm_r < 1
+        if not negative.any():
+            return temperatures
+
+        norm_r_neg = norm_r[negative]
+        temp_neg = temperatures[negative]
+        for iteration in range(max_iter):
+            delta_t = (
+                - (self._normr_array(temp_neg) - norm_r_neg) /
+                self._dnormr_dt_array(temp_neg)
+            )
+            temp_neg += delta_t
+            if np.all(np.abs(delta_t) < error):
+                logger.debug('Found %s negative temperatures after %s '
+                             'iterations', len(temp_neg), iteration)
+                temperatures[negative] = temp_neg
+                return temperatures
+
+        raise Exception('Not found temperatures for resistances below '
+                        f'{self.r_0} after {max_iter} iterations')
+
+    def _quadratic_inverse(self, norm_r):
+        return (
+            (-self.a + np.sqrt(self.a**2 - 4 * self.b * (1 - norm_r))) /
+            (2 * self.b)
+        )
+
+    def _normr_array(self, temperatures):
+        normr = 1 + self.a * temperatures + self.b * temperatures**2
+        return normr + np.where(
+            temperatures < 0,
+            self.c * (temperatures - 100) * temperatures**3,
+            0
+        )
+
+    def _dnormr_dt_array(self, temperatures):
+        value = self.a + 2 * self.b * temperatures
+        return value + np.where(
+            temperatures < 0,
+            self.c * (4 * temperatures - 300) * temperatures**2,
+            0
+        )
+
     def get_resistance(self, temperature):
         return self.r_0 * self._normr(temperature)
 
-    def get__dresistance__dtemperature(self, temperature):
+    def get_resistances(self, temperatures):
+        """Get resistances from an array of temperature values
+
+        :param temperatures: array like of temperatures in °C
+        :return: numpy array of resistances in ohm
+        """
+        _require_numpy()
+        temperatures = np.asarray(temperatures, dtype=float)
+        return self.r_0 * self._normr_array(temperatures)
+
+    def get_dresistance_dtemperature(self, temperature):
         return self.r_0 * self._dnormr_dt(temperature)
 
+    def get__dresistance__dtemperature(self, temperature):
+        """Deprecated, use :meth:`get_dresistance_dtemperature`"""
+        warnings.warn('get__dresistance__dtemperature is deprecated, use '
+                      'get_dresistance_dtemperature', DeprecationWarning,
+                      stacklevel=2)
+        return self.get_dresistance_dtemperature(temperature)
+
     def get_dtemperature_dresistance(self, resistance):
         temperature = self.get_temperature(resistance)
         return 1 / self.get_dresistance_dtemperature(temperature)
+
+
+class PtTable:
+    """Precomputed normalized R(T) table to invert resistances by bisection
+
+    Tables store ``R(T) / r_0`` so that PT100 and PT1000 sensors with the same
+    coefficients share one table. They are cached per coefficient set, range
+    and accuracy, use :meth:`get` instead of building them directly.
+    """
+    _TABLES = {}
+
+    T_MIN = -200
+    T_MAX = 850
+
+    def __init__(self, calculator, accuracy, t_min=T_MIN, t_max=T_MAX):
+        self.accuracy = accuracy
+        self.t_min = t_min
+        self.t_max = t_max
+        # Work normalized, r_0 is applied by the caller
+        normalized = PtCalculator(1)
+        normalized.a, normalized.b, normalized.c = (
+            calculator.a, calculator.b, calculator.c
+        )
+
+        points = 64
+        while True:
+            step = (t_max - t_min) / points
+            temperatures = [t_min + step * index for index in range(points + 1)]
+            resistances = [normalized._normr(t) for t in temperatures]
+            self.temperatures = temperatures
+            self.resistances = resistances
+            if self._max_error(normalized) <= accuracy:
+                break
+            points *= 2
+        logger.debug('Built table of %s points for accuracy %s',
+                     points + 1, accuracy)
+
+    @classmethod
+    def get(cls, calculator, accuracy, t_min=T_MIN, t_max=T_MAX):
+        key = (calculator.a, calculator.b, calculator.c, accuracy,
+               t_min, t_max)
+        table = cls._TABLES.get(key)
+        if table is None:
+            table = cls(calculator, accuracy, t_min, t_max)
+            cls._TABLES[key] = table
+        return table
+
+    def _max_error(self, normalized):
+        # Linear interpolation error is largest around the middle of each
+        # interval
+        error = 0
+        for t_low, t_high in zip(self.temperatures, self.temperatures[1:]):
+            t_middle = (t_low + t_high) / 2
+            estimated = self.get_temperature(normalized._normr(t_middle))
+            error = max(error, abs(estimated - t_middle))
+        return error
+
+    def get_temperature(self, norm_r):
+        resistances = self.resistances
+        index = bisect.bisect_right(resistances, norm_r)
+        if index == len(resistances) and norm_r == resistances[-1]:
+            return self.temperatures[-1]
+        if index == 0 or index == len(resistances):
+            raise ValueError(f'Normalized resistance {norm_r} out of table '
+                             f'range [{self.t_min}, {self.t_max}] °C')
+
+        r_low, r_high = resistances[index - 1], resistances[index]
+        t_low, t_high = self.temperatures[index - 1], self.temperatures[index]
+        return t_low + (norm_r - r_low) * (t_high - t_low) / (r_high - r_low)
@@ -45,8 +45,10 @@ __docformat__ = 'reStructuredText'
 
 
 import time
+import threading
 from enum import IntEnum
 import logging
+from .metrics import METRICS
 
 
 logger = logging.getLogger(__name__)
@@ -289,6 +291,10 @@ class PicoException(Exception):
         super().__init__(message)
 
 
+# Hooks need the exceptions and statuses defined above
+from .hooks import HOOKS  # noqa: E402
+
+
 class Channel:
     _UNITS = {
         DataTypes.OFF: '',
@@ -312,7 +318,6 @@ class Channel:
         self._data_type = data_type
         self._wires = wires
         self.low_pass_filter = low_pass_filter
-        self._next_query = None
         self._is_active = False
 
     @property
@@ -343,6 +348,48 @@ class Channel:
 
     @property
     def value(self):
+        self._assure_is_readable()
+        self._wait_for_conversion()
+
+        value = self.logger.get_value(self.number, self.low_pass_filter)
+        return value
+
+    @property
+    def latest(self):
+        """last sample acquired in background as (timestamp, value)
+
+        Never waits for a conversion, see :meth:`PT104.start_acquisition`
+        """
+        return self._get_buffer().latest()
+
+    def window(self, count=None, since=None):
+        """last samples acquired in background, oldest first
+
+        :param count: maximum number of samples
+        :param since: only samples taken from this timestamp
+        :return: tuple of timestamps and values arrays
+        """
+        return self._get_buffer().window(count, since)
+
+    def _get_buffer(self):
+        acquisition = self.logger.acquisition
+        if acquisition is None:
+            raise PicoException(
+                PicoStatus.PICO_NO_SAMPLES_AVAILABLE, self.logger.id,
+                f'Channel: {self.number}, acquisition is not running'
+            )
+        return acquisition.buffers[self.number]
+
+    def get_reader(self):
+        """prebuilt reader of the last value converted by the unit
+
+        Calls to its ``read`` method do not wait for a new conversion, get a
+        new reader after changing :attr:`data_type`.
+        """
+        self._assure_is_readable()
+        return self.logger.get_reader(self.number)
+
+    def _assure_is_readable(self):
         if not self._is_active:
             raise PicoException(
                 PicoStatus.PICO_INVALID_CHANNEL, self.logger.id,
@@ -355,55 +402,181 @@ class Channel:
                 f'Channel: {self.number}'
             )
 
-        self._wait_for_conversion()
-
-        value = self.logger.get_value(self.number, self.low_pass_filter)
-        return value
-
-    def _wait_for_conversion(self):
+    def _wait_for_conversion(self, cancel=None):
         """wait until a new adc conversion is avalaible
 
-        :param channel: channel number (Channels)
-        :return:
+        :param cancel: threading.Event ending the wait, see
+            :meth:`ConversionScheduler.wait`
+        :return: False if the wait was cancelled
         """
-        while time.time() < self._next_query:
-            time.sleep(0.01)
-        self._next_query = (time.time() +
-                            self.logger.active_channels_count * 0.75)
+        if not METRICS.enabled:
+            return self.logger.scheduler.wait(self.number, cancel)
+
+        start = time.perf_counter_ns()
+        try:
+            booked = self.logger.scheduler.wait(self.number, cancel)
+        except PicoException:
+            METRICS.record('wait_for_conversion', self.logger.id,
+                           self.number, start, True)
+            raise
+        METRICS.record('wait_for_conversion', self.logger.id, self.number,
+                       start)
+        return booked
 
     def activate(self):
         self.logger.activate_channel(self.number)
-        self._next_query = (time.time() + max(3,
-                            1.7 * self.logger.active_channels_count))
         self._is_active = self.data_type != DataTypes.OFF
+        self.logger.scheduler.warm_up(self.number)
 
     def deactivate(self):
         self.logger.deactivate_channel(self.number)
         self._is_active = False
+        self.logger.scheduler.discard(self.number)
+
+
+class ConversionScheduler:
+    """Tracks the conversion cycle of a PT104 unit
+
+    The unit converts its active channels one after the other, each
+    conversion takes ``CONVERSION_TIME`` seconds. Readers are parked on a
+    per channel condition and wake up once, when their channel is due,
+    instead of polling the clock.
+    """
+    CONVERSION_TIME = 0.75
+    WARM_UP_FACTOR = 1.7
+    MIN_WARM_UP = 3
+
+    def __init__(self, logger):
+        self.logger = logger
+        self._lock = threading.Lock()
+        self._next_query = {}
+        self._conditions = {}
+
+    @property
+    def cycle(self):
+        """time between two conversions of the same channel"""
+        return self.logger.active_channels_count * self.CONVERSION_TIME
+
+    def _get_condition(self, channel_number):
+        condition = self._conditions.get(channel_number)
+        if condition is None:
+            condition = threading.Condition(self._lock)
+            self._conditions[channel_number] = condition
+        return condition
+
+    def next_query(self, channel_number):
+        """time when channel will have a new conversion available"""
+        return self._next_query.get(channel_number)
+
+    def warm_up(self, *channel_numbers):
+        """restart schedule of channels after their configuration has changed
+
+        All the channels share a single warm up delay.
+        """
+        delay = max(self.MIN_WARM_UP,
+                    self.WARM_UP_FACTOR * self.logger.active_channels_count)
+        with self._lock:
+            next_query = time.time() + delay
+            for channel_number in channel_numbers:
+                self._next_query[channel_number] = next_query
+                self._get_condition(channel_number).notify_all()
+
+    def discard(self, channel_number):
+        with self._lock:
+            self._next_query.pop(channel_number, None)
+            self._get_condition(channel_number).notify_all()
+
+    def wait(self, channel_number, cancel=None):
+        """block until channel is due and book its next conversion
+
+        :param cancel: threading.Event, once set the wait returns at the
+            next :meth:`wake_all`
+        :return: False if the wait was cancelled, True otherwise
+        """
+        with self._lock:
+            condition = self._get_condition(channel_number)
+            while True:
+                if cancel is not None and cancel.is_set():
+                    return False
+                remaining = self._book(channel_number)
+                if remaining <= 0:
+                    return True
+                condition.wait(remaining)
+
+    def wake_all(self):
+        """wake every waiting reader, e.g. to let it see a cancellation"""
+        with self._lock:
+            for condition in self._conditions.values():
+                condition.notify_all()
+
+    def try_book(self, channel_number):
+        """book next conversion of channel only if it is already due
+
+        Non blocking alternative to :meth:`wait` for event loops.
+
+        :return: 0 if booked, otherwise seconds until the channel is due
+        """
+        with self._lock:
+            return self._book(channel_number)
+
+    def _book(self, channel_number):
+        next_query = self._next_query.get(channel_number)
+        if next_query is None:
+            raise PicoException(
+                PicoStatus.PICO_INVALID_CHANNEL, self.logger.id,
+                f'Channel: {channel_number} is not scheduled'
+            )
+        now = time.time()
+        remaining = next_query - now
+        if remaining > 0:
+            return remaining
+        self._next_query[channel_number] = now + self.cycle
+        return 0
 
 
 class PT104:
-    def __init__(self, conn_string, interface=None):
+    def __init__(self, conn_string, interface=None, cache=None):
         self._conn_string = conn_string
         self.interface = interface
+        self.cache = cache
         self.channels = {
             key: Channel(self, key)
             for key in [1, 2, 3, 4]
         }
         self.id = None
         self._info = {}
+        self.scheduler = ConversionScheduler(self)
+        self.acquisition = None
+        self.publisher = None
+        # Called for every query of the acquisition, see
+        # :class:`PT104.acquisition.Acquisition`
+        self.listeners = []
+        self._subscriptions = {}
 
     @property
     def info(self):
         """This function obtains information on a specified device.
 
-        :param print_result: also print the unit info to the console
+        With a :class:`PT104.cache.InfoCache` only the calibration date is
+        queried when the unit info is cached.
+
         :return: the unit info as dict
         """
         if not self._info:
-            self._info = self.interface.get_info(self.id)
+            self._info = self._read_info()
         return self._info
 
+    def _read_info(self):
+        if self.cache is None:
+            return self.interface.get_info(self.id)
+
+        cal_date = self.interface.get_info(self.id, ['cal_date'])['cal_date']
+        info = self.cache.get(self._conn_string, cal_date)
+        if info is None:
+            info = self.interface.get_info(self.id)
+            self.cache.put(info, alias=self._conn_string)
+        return info
+
     @property
     def is_connected(self):
         """returns the connection status
@@ -420,7 +593,12 @@ class PT104:
         :param serial: serial number of the device
         :return: connection status
         """
+        if HOOKS.active:
+            HOOKS.call('connect', self._conn_string, None, self._connect)
+        else:
+            self._connect()
 
+    def _connect(self):
         self.id = self.interface.open_unit(self._conn_string)
 
     @property
@@ -439,10 +617,21 @@ class PT104:
         """
         if not self.is_connected:
             return
+        if HOOKS.active:
+            HOOKS.call('disconnect', self._conn_string, None, self._disconnect)
+        else:
+            self._disconnect()
 
+    def _disconnect(self):
+        self.stop_acquisition()
         self.interface.close_unit(self.id)
         self.id = None
         self._info = {}
+        # Closed units forget their channel setup
+        for channel in self.channels.values():
+            if channel.is_active:
+                channel._is_active = False
+                self.scheduler.discard(channel.number)
 
     def _assure_is_connected(self):
         if not self.is_connected:
@@ -455,24 +644,212 @@ class PT104:
         :param raw_value: skip conversion
         :return: measured value
         """
+        if HOOKS.active:
+            return HOOKS.call('get_value', self._conn_string, channel,
+                              self._get_value, channel, lower_pass_filter)
+        # Same as _get_value, inlined to keep the hot read path short
         self._assure_is_connected()
         return self.interface.get_value(self.id, channel,
                                         lower_pass_filter)
 
-    def activate_channel(self, channel_number):
+    def _get_value(self, channel, lower_pass_filter):
+        self._assure_is_connected()
+        return self.interface.get_value(self.id, channel,
+                                        lower_pass_filter)
+
+    def get_reader(self, channel_number):
+        """prebuilt reader of a channel from the interface
+
+        :param channel_number: channel number (Channels)
+        :return: object with a ``read`` method returning the last value
+        """
         self._assure_is_connected()
         channel = self.channels[channel_number]
-        self.interface.set_channel(self.id, channel.number, channel.data_type,
-                                   channel.wires)
+        return self.interface.get_reader(self.id, channel_number,
+                                         channel.low_pass_filter)
+
+    def read_all(self, channels=None):
+        """reads fresh values of several channels within one conversion cycle
+
+        Channels are read in the order their conversions get ready, each
+        value is queried as soon as its channel is due.
+
+        :param channels: channel numbers to read, all active channels if None
+        :return: timestamp of the last reading and dict of values by channel
+        """
+        if channels is None:
+            channels = [number for number, channel in self.channels.items()
+                        if channel.is_active]
+        channels = [self.channels[number] for number in channels]
+        for channel in channels:
+            channel._assure_is_readable()
+
+        channels.sort(key=lambda channel: self.scheduler.next_query(
+            channel.number))
+        values = {}
+        for channel in channels:
+            channel._wait_for_conversion()
+            values[channel.number] = self.get_value(channel.number,
+                                                    channel.low_pass_filter)
+        return time.time(), values
+
+    def start_acquisition(self, size=4800, publish=None):
+        """polls active channels in a background thread
+
+        Samples are kept in a fixed size ring buffer per channel, read them
+        with :attr:`Channel.latest` or :meth:`Channel.window`.
+
+        :param size: samples kept per channel
+        :param publish: name of a shared memory table where the last reading
+            of each channel is published for other processes, see
+            :mod:`PT104.shared`
+        """
+        from .acquisition import Acquisition
+
+        if self.acquisition is not None:
+            return
+        self._assure_is_connected()
+        acquisition = Acquisition(self, size)
+        if publish is not None:
+            from .shared import TablePublisher
+
+            # Created first, a failure leaves no acquisition behind
+            self.publisher = TablePublisher(publish, len(self.channels))
+            self.listeners.append(self.publisher)
+        self.acquisition = acquisition
+        self.acquisition.start()
+
+    def stop_acquisition(self):
+        if self.acquisition is None:
+            return
+        self.acquisition.stop()
+        self.acquisition = None
+        if self.publisher is not None:
+            self.listeners.remove(self.publisher)
+            self.publisher.unlink()
+            self.publisher = None
+
+    def subscribe(self, key, listener):
+        """call listener with every query of the acquisition, started if needed
+
+        A subscription is kept across restarts of the acquisition, see
+        :meth:`start_acquisition`. Subscribing again with the same key
+        replaces the previous listener.
+
+        :param key: identifies the subscriber, e.g. the subscribing object
+        :param listener: called with the channel number, timestamp, value
+            and PicoStatus of every query
+        :return: listener
+        """
+        self.unsubscribe(key)
+        self._subscriptions[key] = listener
+        self.listeners.append(listener)
+        self.start_acquisition()
+        return listener
+
+    def unsubscribe(self, key):
+        """remove the listener subscribed with key, if any"""
+        listener = self._subscriptions.pop(key, None)
+        if listener is not None:
+            self.listeners.remove(listener)
+
+    def activate_channel(self, channel_number):
+        if HOOKS.active:
+            HOOKS.call('activate_channel', self._conn_string, channel_number,
+                       self._set_channel, channel_number, False)
+        else:
+            self._set_channel(channel_number, False)
 
     def deactivate_channel(self, channel_number):
+        if HOOKS.active:
+            HOOKS.call('deactivate_channel', self._conn_string,
+                       channel_number, self._set_channel, channel_number,
+                       True)
+        else:
+            self._set_channel(channel_number, True)
+
+    def _set_channel(self, channel_number, off):
         self._assure_is_connected()
         channel = self.channels[channel_number]
-        self.interface.set_channel(self.id, channel.number, DataTypes.OFF,
+        data_type = DataTypes.OFF if off else channel.data_type
+        self.interface.set_channel(self.id, channel.number, data_type,
                                    channel.wires)
 
+    def configure(self, channels):
+        """sets up many channels at once
+
+        Only channels whose setup differs from the current one are sent to
+        the unit, one after the other, and every active channel then waits
+        a single warm up, as the unit restarts its conversion cycle. If the
+        unit refuses a setup, the channels already changed are restored.
+
+        :param channels: dict by channel number of (data_type, wires), or
+            of a data type to keep the wires. Channels not given are left
+            untouched.
+        :return: numbers of the changed channels
+        """
+        changes = {}
+        for number, setup in channels.items():
+            if number not in self.channels:
+                raise PicoException(PicoStatus.PICO_INVALID_CHANNEL, self.id,
+                                    f'Channel: {number}')
+            channel = self.channels[number]
+            data_type, wires = (setup if isinstance(setup, tuple)
+                                else (setup, channel.wires))
+            if data_type == DataTypes.OFF:
+                if channel.is_active:
+                    changes[number] = (data_type, wires)
+            elif (not channel.is_active or channel.data_type != data_type or
+                    channel.wires != wires):
+                changes[number] = (data_type, wires)
+        if not changes:
+            return []
+
+        previous = {}
+        try:
+            for number, (data_type, wires) in changes.items():
+                channel = self.channels[number]
+                previous[number] = (channel.data_type, channel.wires,
+                                    channel.is_active)
+                channel.data_type = data_type
+                channel.wires = wires
+                if data_type == DataTypes.OFF:
+                    self.deactivate_channel(number)
+                else:
+                    self.activate_channel(number)
+                channel._is_active = data_type != DataTypes.OFF
+        except PicoException:
+            self._restore_channels(previous)
+            raise
+        finally:
+            self._warm_up_channels(changes)
+        return list(changes)
+
+    def _restore_channels(self, previous):
+        for number, (data_type, wires, is_active) in previous.items():
+            channel = self.channels[number]
+            channel.data_type = data_type
+            channel.wires = wires
+            try:
+                if is_active:
+                    self.activate_channel(number)
+                else:
+                    self.deactivate_channel(number)
+            except PicoException as e:
+                logger.warning(f'Channel {number} of {self.id} not '
+                               f'restored: {e}')
+                is_active = False
+            channel._is_active = is_active
+
+    def _warm_up_channels(self, changed):
+        for number in changed:
+            if not self.channels[number].is_active:
+                self.scheduler.discard(number)
+        self.scheduler.warm_up(*[number
+                                 for number, channel in self.channels.items()
+                                 if channel.is_active])
+
     def set_mains(self, sixty_hertz=False):
-        self._assure_is_connected()
         """This function is used to inform the driver of the local mains (line) frequency.
 
         This helps the driver to filter out electrical noise.
@@ -480,6 +857,14 @@ class PT104:
         :param sixty_hertz: mains frequency is sixty
         :return: success
         """
+        if HOOKS.active:
+            HOOKS.call('set_mains', self._conn_string, None, self._set_mains,
+                       sixty_hertz)
+        else:
+            self._set_mains(sixty_hertz)
+
+    def _set_mains(self, sixty_hertz):
+        self._assure_is_connected()
         self.interface.set_mains(self.id, sixty_hertz)
 
     def clear(self):
@@ -488,5 +873,7 @@ class PT104:
                 channel.deactivate()
 
     def __del__(self):
-        self.clear()
-        self.interface.close_unit(self.id)
+        # __init__ may have failed before setting id
+        if getattr(self, 'id', None) is not None:
+            self.clear()
+            self.disconnect()
@@ -0,0 +1,151 @@
+import threading
+import time
+from array import array
+import logging
+from . import PicoException, PicoStatus
+
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+class RingBuffer:
+    """Preallocated buffer keeping the last ``size`` (timestamp, value) samples
+
+    Memory is allocated once, new samples overwrite the oldest ones.
+    """
+    def __init__(self, size):
+        self.size = size
+        self._timestamps = array('d', bytes(8 * size))
+        self._values = array('d', bytes(8 * size))
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return min(self._count, self.size)
+
+    @property
+    def count(self):
+        """total number of samples appended since creation"""
+        return self._count
+
+    def append(self, timestamp, value):
+        with self._lock:
+            index = self._count % self.size
+            self._timestamps[index] = timestamp
+            self._values[index] = value
+            self._count += 1
+
+    def latest(self):
+        """last sample as (timestamp, value) or None if buffer is empty"""
+        with self._lock:
+            if not self._count:
+                return None
+            index = (self._count - 1) % self.size
+            return self._timestamps[index], self._values[index]
+
+    def window(self, count=None, since=None):
+        """copy of the last samples, oldest first
+
+        :param count: maximum number of samples
+        :param since: only samples with timestamp greater or equal
+        :return: tuple of timestamps and values arrays
+        """
+        with self._lock:
+            length = len(self)
+            if count is not None:
+                length = min(length, count)
+            start = (self._count - length) % self.size
+            stop = start + length
+            if stop <= self.size:
+                timestamps = self._timestamps[start:stop]
+                values = self._values[start:stop]
+            else:
+                stop -= self.size
+                timestamps = self._timestamps[start:] + self._timestamps[:stop]
+                values = self._values[start:] + self._values[:stop]
+
+        if since is not None:
+            first = 0
+            while first < len(timestamps) and timestamps[first] < since:
+                first += 1
+            timestamps, values = timestamps[first:], values[first:]
+        return timestamps, values
+
+
+class Acquisition(threading.Thread):
+    """Background worker polling every active channel of a PT104
+
+    A new value is queried once per conversion of each channel and stored in
+    its ring buffer, readers never wait for the device.
+
+    The listeners of the unit, :attr:`PT104.PT104.listeners`, are called
+    from the acquisition thread with the channel number, timestamp, value
+    and PicoStatus of every query, value is NaN when the query failed.
+    They are kept by the unit, so they outlive a stop and start of the
+    acquisition.
+    """
+    IDLE_TIME = 0.1
+
+    def __init__(self, unit, size=4800):
+        super().__init__(daemon=True)
+        self.unit = unit
+        self.buffers = {number: RingBuffer(size) for number in unit.channels}
+        self.listeners = unit.listeners
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                self._acquire_all()
+            except Exception:
+                # Keep polling, the failure may be temporary
+                logger.exception(f'Acquisition of {self.unit.id} failed')
+                self._stop_event.wait(self.IDLE_TIME)
+
+    def _acquire_all(self):
+        channels = [channel for channel in self.unit.channels.values()
+                    if channel.is_active]
+        if not channels:
+            self._stop_event.wait(self.IDLE_TIME)
+            return
+
+        channels.sort(key=lambda channel: self.unit.scheduler.next_query(
+            channel.number) or 0)
+        for channel in channels:
+            if self._stop_event.is_set():
+                break
+            self._acquire(channel)
+
+    def _acquire(self, channel):
+        try:
+            if not channel._wait_for_conversion(self._stop_event):
+                return
+            value = self.unit.get_value(channel.number,
+                                        channel.low_pass_filter)
+        except PicoException as e:
+            logger.warning(f'Acquisition of channel {channel.number} '
+                           f'failed: {e}')
+            self._notify(channel.number, time.time(), float('nan'), e.status)
+            return
+        timestamp = time.time()
+        self.buffers[channel.number].append(timestamp, value)
+        self._notify(channel.number, timestamp, value, PicoStatus.PICO_OK)
+
+    def _notify(self, number, timestamp, value, status):
+        # Listeners may be added or removed from other threads meanwhile
+        for listener in tuple(self.listeners):
+            try:
+                listener(number, timestamp, value, status)
+            except Exception:
+                logger.exception(f'Acquisition listener {listener} failed')
+
+    def stop(self, timeout=1):
+        """stop polling, a wait for a conversion is cancelled
+
+        :param timeout: seconds to wait for a query in progress
+        """
+        self._stop_event.set()
+        self.unit.scheduler.wake_all()
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join(timeout)
@@ -0,0 +1,164 @@
+""" asyncio front end for PT104 units
+
+Example::
+
+    from PT104 import PT104, DataTypes, Wires
+    from PT104.aio import AsyncPT104
+    from PT104.usb import USBinterface
+
+    async def main():
+        unit = AsyncPT104(PT104('AY429/026', USBinterface()))
+        await unit.connect()
+        unit.channels[1].data_type = DataTypes.PT100
+        unit.channels[1].wires = Wires.WIRES_4
+        await unit.channels[1].activate()
+
+        value = await unit.channels[1].read()
+        timestamp, values = await unit.read_all()
+        async for timestamp, number, value in unit.stream():
+            print(f'CH{number}: {value:1.3f}')
+
+Conversion readiness is tracked with event loop timers, blocking calls into
+the interface run in a bounded thread pool shared by all units.
+"""
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+MAX_WORKERS = 8
+
+_executor = None
+
+
+def get_executor():
+    """thread pool shared by every AsyncPT104 without its own executor"""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=MAX_WORKERS,
+                                       thread_name_prefix='PT104')
+    return _executor
+
+
+def _set_result(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class AsyncChannel:
+    def __init__(self, unit, channel):
+        self.unit = unit
+        self.channel = channel
+
+    def __getattr__(self, name):
+        return getattr(self.channel, name)
+
+    def __setattr__(self, name, value):
+        if name in ('unit', 'channel'):
+            super().__setattr__(name, value)
+        else:
+            setattr(self.channel, name, value)
+
+    async def activate(self):
+        await self.unit._run(self.channel.activate)
+
+    async def deactivate(self):
+        await self.unit._run(self.channel.deactivate)
+
+    async def read(self):
+        """waits for a new conversion of the channel and reads it"""
+        self.channel._assure_is_readable()
+        await self.unit._wait_for_conversion(self.channel.number)
+        return await self.unit._run(self.unit.unit.get_value,
+                                    self.channel.number,
+                                    self.channel.low_pass_filter)
+
+
+class AsyncPT104:
+    """Awaitable wrapper around a :class:`PT104` unit
+
+    :param unit: PT104 to drive
+    :param executor: executor for interface calls, a shared bounded pool
+        by default
+    """
+    IDLE_TIME = 0.1
+
+    def __init__(self, unit, executor=None):
+        self.unit = unit
+        self.executor = executor
+        self.channels = {number: AsyncChannel(self, channel)
+                         for number, channel in unit.channels.items()}
+
+    @property
+    def id(self):
+        return self.unit.id
+
+    async def _run(self, function, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor or get_executor(),
+                                          function, *args)
+
+    async def _sleep(self, delay):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        handle = loop.call_at(loop.time() + delay, _set_result, future)
+        try:
+            await future
+        finally:
+            handle.cancel()
+
+    async def _wait_for_conversion(self, channel_number):
+        while True:
+            remaining = self.unit.scheduler.try_book(channel_number)
+            if remaining <= 0:
+                return
+            await self._sleep(remaining)
+
+    async def connect(self):
+        await self._run(self.unit.connect)
+
+    async def disconnect(self):
+        await self._run(self.unit.disconnect)
+
+    async def set_mains(self, sixty_hertz=False):
+        await self._run(self.unit.set_mains, sixty_hertz)
+
+    async def info(self):
+        return await self._run(lambda: self.unit.info)
+
+    def _sorted_channels(self, channels):
+        if channels is None:
+            channels = [number for number, channel in self.channels.items()
+                        if channel.is_active]
+        channels = [self.channels[number] for number in channels]
+        for channel in channels:
+            channel._assure_is_readable()
+        channels.sort(key=lambda channel: self.unit.scheduler.next_query(
+            channel.number))
+        return channels
+
+    async def read_all(self, channels=None):
+        """reads fresh values of several channels within one conversion cycle
+
+        :param channels: channel numbers to read, all active channels if None
+        :return: timestamp of the last reading and dict of values by channel
+        """
+        values = {}
+        for channel in self._sorted_channels(channels):
+            values[channel.number] = await channel.read()
+        return time.time(), values
+
+    async def stream(self, channels=None):
+        """yields (timestamp, channel number, value) as conversions arrive
+
+        :param channels: channel numbers to read, all active channels if None
+        """
+        while True:
+            sorted_channels = self._sorted_channels(channels)
+            if not sorted_channels:
+                # Let the loop run until a channel is activated
+                await self._sleep(self.IDLE_TIME)
+                continue
+            for channel in sorted_channels:
+                value = await channel.read()
+                yield time.time(), channel.number, value
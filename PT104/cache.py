@@ -0,0 +1,105 @@
+""" Persistent cache of unit info and calibration constants
+
+Example::
+
+    cache = InfoCache()
+    unit = PT104('AY429/026', USBinterface(), cache=cache)
+    interface = EthernetInterface(cache=cache)
+
+Entries are keyed by batch and serial, units reached by another id, like
+the address of an ethernet unit, are found through aliases. An entry is
+dropped when the unit reports a calibration date different from the cached
+one.
+"""
+import json
+import os
+import threading
+import logging
+
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+def default_path():
+    cache_home = os.environ.get('XDG_CACHE_HOME',
+                                os.path.join(os.path.expanduser('~'),
+                                             '.cache'))
+    return os.path.join(cache_home, 'PT104', 'units.json')
+
+
+class InfoCache:
+    """JSON file with info and calibrations of units by batch and serial
+
+    :param path: file of the cache, see :func:`default_path`
+    """
+    def __init__(self, path=None):
+        self.path = path or default_path()
+        self._lock = threading.Lock()
+        self._data = None
+
+    def _load(self):
+        if self._data is None:
+            try:
+                with open(self.path) as cache_file:
+                    self._data = json.load(cache_file)
+            except FileNotFoundError:
+                self._data = {'units': {}, 'aliases': {}}
+            except ValueError:
+                logger.warning(f'Ignoring corrupt unit cache {self.path}')
+                self._data = {'units': {}, 'aliases': {}}
+        return self._data
+
+    def _save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_path = f'{self.path}.{os.getpid()}.tmp'
+        with open(temp_path, 'w') as cache_file:
+            json.dump(self._data, cache_file, indent=1, sort_keys=True)
+        os.replace(temp_path, self.path)
+
+    def _resolve(self, key):
+        data = self._load()
+        return data['aliases'].get(key, key)
+
+    def get(self, key, cal_date=None):
+        """cached entry of a unit or None
+
+        :param key: batch and serial or alias of the unit
+        :param cal_date: current calibration date of the unit, a cached
+            entry with another date is invalidated
+        """
+        with self._lock:
+            batch_and_serial = self._resolve(key)
+            entry = self._load()['units'].get(batch_and_serial)
+            if entry is None:
+                return None
+            if cal_date is not None and entry.get('cal_date') != cal_date:
+                logger.info(f'Calibration of {batch_and_serial} changed, '
+                            'dropping cached info')
+                self._invalidate(batch_and_serial)
+                return None
+            return dict(entry)
+
+    def put(self, entry, alias=None):
+        """store entry, it must have the 'batch_and_serial' of the unit
+
+        :param alias: other id of the unit, e.g. its ethernet address
+        """
+        with self._lock:
+            data = self._load()
+            batch_and_serial = entry['batch_and_serial']
+            data['units'][batch_and_serial] = dict(entry)
+            if alias is not None and alias != batch_and_serial:
+                data['aliases'][alias] = batch_and_serial
+            self._save()
+
+    def invalidate(self, key):
+        with self._lock:
+            self._invalidate(self._resolve(key))
+
+    def _invalidate(self, batch_and_serial):
+        data = self._load()
+        if data['units'].pop(batch_and_serial, None) is not None:
+            self._save()
@@ -0,0 +1,577 @@
+""" Acquisition daemon sharing units between processes
+
+Only one process can open a unit with the usbpt104 library. The daemon
+owns every handle, runs the background acquisition of the units and serves
+any number of local client processes on a Unix domain socket.
+
+Example::
+
+    # daemon process, or ``python -m PT104.daemon /tmp/pt104.sock``
+    from PT104.daemon import AcquisitionDaemon
+    from PT104.usb import USBinterface
+
+    daemon = AcquisitionDaemon('/tmp/pt104.sock', USBinterface())
+    daemon.run()
+
+    # any client process
+    from PT104 import PT104, DataTypes
+    from PT104.daemon import DaemonInterface
+
+    interface = DaemonInterface('/tmp/pt104.sock')
+    unit = PT104('AY429/026', interface)
+    unit.channels[1].data_type = DataTypes.PT100
+    unit.channels[1].activate()
+    print(unit.channels[1].value)
+    print(interface.get_values([('AY429/026', 1), ('AY429/027', 2)]))
+
+Requests and responses are JSON lists, one per line. Values of active
+channels are served from the acquisition buffers of the daemon, so clients
+never wait for the hardware. A value requested before the first sample of
+a channel is answered when the acquisition gets it. Channel setup is
+shared, the last client setting a channel wins.
+"""
+import argparse
+import inspect
+import json
+import os
+import selectors
+import socket
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from queue import SimpleQueue, Empty
+import logging
+from . import (PT104, PicoException, PicoStatus, DataTypes, Wires,
+               CommunicationType)
+
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+class _Client:
+    def __init__(self, sock):
+        self.sock = sock
+        self.buffer = b''
+        self.output = bytearray()
+        self.requests = deque()
+        self.busy = False
+        self.closed = False
+        self.units = set()
+
+
+class AcquisitionDaemon(threading.Thread):
+    """Serves the units of an interface to the clients of a Unix socket
+
+    A single thread multiplexes every client connection on non-blocking
+    sockets, the requests of a client are answered in order. Requests
+    calling the hardware, like opening a unit, run one at a time on a
+    worker thread, values are served from the acquisition buffers. Units
+    are opened on the first request of a client and closed when no client
+    uses them.
+
+    :param path: path of the Unix domain socket
+    :param interface: interface owning the units, e.g. USBinterface
+    :param size: samples kept per channel by the acquisition
+    :raises FileExistsError: another daemon serves path
+    """
+    # Requests calling the driver, run on the worker thread
+    HARDWARE_REQUESTS = ('discover_devices', 'open_unit', 'close_unit',
+                         'set_channel', 'set_mains', 'get_info')
+
+    def __init__(self, path, interface, size=4800):
+        super().__init__(daemon=True)
+        self.path = path
+        self.interface = interface
+        self.size = size
+        self.units = {}
+        self._users = {}
+        self._configured = {}
+        self._parked = {}
+        self._events = SimpleQueue()
+        self._worker = ThreadPoolExecutor(max_workers=1,
+                                          thread_name_prefix='PT104-daemon')
+        self._selector = selectors.DefaultSelector()
+        self._continue = True
+        if os.path.exists(path):
+            self._remove_stale_socket(path)
+        self._server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._server.bind(path)
+        self._server.listen()
+        self._server.setblocking(False)
+        self._selector.register(self._server, selectors.EVENT_READ)
+        self._wake_reader, self._wake_writer = socket.socketpair()
+        self._wake_reader.setblocking(False)
+        self._wake_writer.setblocking(False)
+        self._selector.register(self._wake_reader, selectors.EVENT_READ)
+
+    @staticmethod
+    def _remove_stale_socket(path):
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(path)
+        except OSError:
+            # Left behind by a daemon which did not exit cleanly
+            os.unlink(path)
+            return
+        finally:
+            probe.close()
+        raise FileExistsError(f'A daemon is already serving {path}')
+
+    def run(self):
+        try:
+            while self._continue:
+                events = self._selector.select(self._select_timeout())
+                for key, mask in events:
+                    if key.fileobj is self._server:
+                        self._accept()
+                    elif key.fileobj is self._wake_reader:
+                        self._process_events()
+                    else:
+                        if mask & selectors.EVENT_WRITE:
+                            self._flush(key.data)
+                        if mask & selectors.EVENT_READ:
+                            self._receive(key.data)
+                self._expire_parked()
+        finally:
+            self._close()
+
+    def _close(self):
+        for key in list(self._selector.get_map().values()):
+            if key.data is not None:
+                self._disconnect(key.data)
+        self._worker.shutdown(wait=True)
+        self._selector.close()
+        self._server.close()
+        self._wake_reader.close()
+        self._wake_writer.close()
+        for unit in self.units.values():
+            unit.disconnect()
+        self.units = {}
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def stop(self, timeout=1):
+        self._continue = False
+        if self.is_alive():
+            self.join(timeout)
+
+    def _call_soon(self, callback, *args):
+        """run callback on the daemon thread, from any thread"""
+        self._events.put((callback, args))
+        try:
+            self._wake_writer.send(b'\0')
+        except OSError:
+            # Full of wake ups already, or closed at exit
+            pass
+
+    def _process_events(self):
+        try:
+            while self._wake_reader.recv(4096):
+                pass
+        except OSError:
+            pass
+        while True:
+            try:
+                callback, args = self._events.get_nowait()
+            except Empty:
+                return
+            callback(*args)
+
+    def _accept(self):
+        try:
+            sock, _ = self._server.accept()
+        except OSError:
+            return
+        sock.setblocking(False)
+        self._selector.register(sock, selectors.EVENT_READ, _Client(sock))
+
+    def _disconnect(self, client):
+        if client.closed:
+            return
+        client.closed = True
+        self._selector.unregister(client.sock)
+        client.sock.close()
+        for batch_and_serial in list(client.units):
+            self._worker.submit(self._release, client, batch_and_serial)
+
+    def _receive(self, client):
+        try:
+            data = client.sock.recv(65536)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b''
+        if not data:
+            self._disconnect(client)
+            return
+
+        client.buffer += data
+        *lines, client.buffer = client.buffer.split(b'\n')
+        client.requests.extend(line for line in lines if line)
+        self._dispatch(client)
+
+    def _dispatch(self, client):
+        """start the next requests of client, one at a time"""
+        while not client.busy and client.requests and not client.closed:
+            line = client.requests.popleft()
+            try:
+                method, args = json.loads(line)
+                handler = getattr(self, f'_do_{method}')
+                # Malformed arguments are answered, never raised in the loop
+                inspect.signature(handler).bind(client, *args)
+            except Exception as e:
+                self._respond(client, self._error(e))
+                continue
+            client.busy = True
+            if method in self.HARDWARE_REQUESTS:
+                self._worker.submit(self._run_hardware_request, client,
+                                    handler, args)
+            elif method == 'get_value':
+                self._get_value(client, *args)
+            else:
+                self._respond(client, self._call(handler, client, args))
+
+    def _run_hardware_request(self, client, handler, args):
+        response = self._call(handler, client, args)
+        self._call_soon(self._respond, client, response)
+
+    def _call(self, handler, client, args):
+        try:
+            return ['ok', handler(client, *args)]
+        except Exception as e:
+            return self._error(e)
+
+    @staticmethod
+    def _error(exception):
+        if isinstance(exception, PicoException):
+            return ['error', int(exception.status), exception.more_info]
+        logger.error('Daemon request failed', exc_info=exception)
+        return ['error', int(PicoStatus.PICO_INVALID_CALL), str(exception)]
+
+    def _respond(self, client, response):
+        client.busy = False
+        if client.closed:
+            return
+        client.output += json.dumps(response).encode() + b'\n'
+        self._flush(client)
+        self._dispatch(client)
+
+    def _flush(self, client):
+        if client.closed:
+            return
+        try:
+            sent = client.sock.send(client.output)
+        except BlockingIOError:
+            sent = 0
+        except OSError as e:
+            logger.warning(f'Daemon can not answer client: {e}')
+            self._disconnect(client)
+            return
+        del client.output[:sent]
+        # A client not reading its responses is not read either, so its
+        # output can not grow without bound
+        events = (selectors.EVENT_WRITE if client.output
+                  else selectors.EVENT_READ)
+        if self._selector.get_key(client.sock).events != events:
+            self._selector.modify(client.sock, events, client)
+
+    def _get_unit(self, client, batch_and_serial):
+        unit = self.units.get(batch_and_serial)
+        if batch_and_serial not in client.units or unit is None:
+            raise PicoException(PicoStatus.PICO_INVALID_HANDLE,
+                                batch_and_serial, 'Unit is not open')
+        return unit
+
+    def _release(self, client, batch_and_serial):
+        if batch_and_serial not in client.units:
+            return
+        client.units.discard(batch_and_serial)
+        users = self._users[batch_and_serial]
+        users.discard(client)
+        if not users:
+            unit = self.units.pop(batch_and_serial)
+            del self._users[batch_and_serial]
+            unit.disconnect()
+            logger.info(f'Daemon closed {batch_and_serial}')
+
+    def _do_discover_devices(self, client, communication_type):
+        return self.interface.discover_devices(communication_type)
+
+    def _do_open_unit(self, client, batch_and_serial):
+        unit = self.units.get(batch_and_serial)
+        if unit is None:
+            unit = PT104(batch_and_serial, self.interface)
+            unit.listeners.append(
+                lambda number, timestamp, value, status: self._call_soon(
+                    self._wake_parked, batch_and_serial, number, status
+                )
+            )
+            unit.connect()
+            unit.start_acquisition(self.size)
+            self._users[batch_and_serial] = set()
+            self.units[batch_and_serial] = unit
+            logger.info(f'Daemon opened {batch_and_serial}')
+        self._users[batch_and_serial].add(client)
+        client.units.add(batch_and_serial)
+        if client.closed:
+            # The client left while the unit was opened for it, after its
+            # units were released
+            self._release(client, batch_and_serial)
+        return batch_and_serial
+
+    def _do_close_unit(self, client, batch_and_serial):
+        self._get_unit(client, batch_and_serial)
+        self._release(client, batch_and_serial)
+
+    def _do_set_channel(self, client, batch_and_serial, number, data_type,
+                        wires):
+        unit = self._get_unit(client, batch_and_serial)
+        channel = unit.channels[number]
+        channel.data_type = DataTypes(data_type)
+        channel.wires = Wires(wires)
+        if channel.data_type == DataTypes.OFF:
+            channel.deactivate()
+        else:
+            channel.activate()
+        self._configured[batch_and_serial, number] = time.time()
+
+    def _do_set_mains(self, client, batch_and_serial, sixty_hertz):
+        self._get_unit(client, batch_and_serial).set_mains(sixty_hertz)
+
+    def _do_get_info(self, client, batch_and_serial, keys):
+        unit = self._get_unit(client, batch_and_serial)
+        return self.interface.get_info(unit.id, keys)
+
+    def _latest(self, client, batch_and_serial, number, low_pass_filter):
+        """last value acquired since the setup of channel, or None"""
+        unit = self._get_unit(client, batch_and_serial)
+        channel = unit.channels[number]
+        if unit.acquisition is None or not unit.acquisition.is_alive():
+            raise PicoException(PicoStatus.PICO_OPERATION_FAILED,
+                                batch_and_serial, 'Acquisition is not running')
+        if not channel.is_active:
+            raise PicoException(PicoStatus.PICO_NO_SAMPLES_AVAILABLE,
+                                batch_and_serial,
+                                f'Channel {number} is not active')
+        if channel.low_pass_filter != low_pass_filter:
+            # Like the setup, the last client asking wins
+            channel.low_pass_filter = low_pass_filter
+            self._configured[batch_and_serial, number] = time.time()
+        sample = channel.latest
+        # Samples taken before the last setup have another data type
+        if (sample is not None and sample[0] >=
+                self._configured.get((batch_and_serial, number), 0)):
+            return sample[1]
+        return None
+
+    def _do_get_value(self, client, batch_and_serial, number,
+                      low_pass_filter=False):
+        value = self._latest(client, batch_and_serial, number,
+                             low_pass_filter)
+        if value is None:
+            raise PicoException(PicoStatus.PICO_NO_SAMPLES_AVAILABLE,
+                                batch_and_serial,
+                                f'Channel {number} has no sample yet')
+        return value
+
+    def _get_value(self, client, batch_and_serial, number,
+                   low_pass_filter=False):
+        """answer with the last value, or once the next one is acquired"""
+        try:
+            value = self._latest(client, batch_and_serial, number,
+                                 low_pass_filter)
+        except Exception as e:
+            self._respond(client, self._error(e))
+            return
+        if value is not None:
+            self._respond(client, ['ok', value])
+            return
+        scheduler = self.units[batch_and_serial].scheduler
+        due = max(scheduler.next_query(number) or 0, time.time())
+        deadline = due + scheduler.cycle + scheduler.CONVERSION_TIME
+        self._parked.setdefault((batch_and_serial, number), []).append(
+            (deadline, client, low_pass_filter)
+        )
+
+    def _wake_parked(self, batch_and_serial, number, status):
+        parked = self._parked.pop((batch_and_serial, number), [])
+        for _, client, low_pass_filter in parked:
+            if status != PicoStatus.PICO_OK:
+                self._respond(client, ['error', int(status),
+                                       'Acquisition failed'])
+            else:
+                self._get_value(client, batch_and_serial, number,
+                                low_pass_filter)
+
+    def _select_timeout(self):
+        deadlines = [deadline for parked in self._parked.values()
+                     for deadline, _, _ in parked]
+        if not deadlines:
+            return 0.1
+        return min(0.1, max(min(deadlines) - time.time(), 0))
+
+    def _expire_parked(self):
+        now = time.time()
+        for key in list(self._parked):
+            parked = self._parked[key]
+            expired = [request for request in parked if request[0] <= now]
+            if not expired:
+                continue
+            self._parked[key] = [request for request in parked
+                                 if request[0] > now]
+            if not self._parked[key]:
+                del self._parked[key]
+            for _, client, _ in expired:
+                self._respond(client, [
+                    'error', int(PicoStatus.PICO_NO_SAMPLES_AVAILABLE),
+                    f'Channel {key[1]} has no sample yet'
+                ])
+
+    def _do_get_values(self, client, queries):
+        values = []
+        for query in queries:
+            try:
+                values.append(['ok', self._do_get_value(client, *query)])
+            except PicoException as e:
+                values.append(['error', int(e.status), e.more_info])
+        return values
+
+
+class DaemonReader:
+    """Reader of a channel served by an AcquisitionDaemon"""
+    def __init__(self, interface, batch_and_serial, channel,
+                 low_pass_filter=False):
+        self.interface = interface
+        self.batch_and_serial = batch_and_serial
+        self.channel = channel
+        self.low_pass_filter = low_pass_filter
+
+    def read(self):
+        return self.interface.get_value(self.batch_and_serial, self.channel,
+                                        self.low_pass_filter)
+
+
+class DaemonInterface:
+    """Interface between PT104 and an AcquisitionDaemon
+
+    Any number of processes, and threads, may use their own
+    DaemonInterface with the same daemon.
+
+    :param path: path of the Unix domain socket of the daemon
+    """
+    def __init__(self, path):
+        self.path = path
+        self._sock = None
+        self._file = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if self._sock is None:
+            self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self._sock.connect(self.path)
+            self._file = self._sock.makefile('rb')
+
+    def close(self):
+        with self._lock:
+            if self._sock is not None:
+                self._file.close()
+                self._sock.close()
+                self._sock = self._file = None
+
+    def _send(self, method, args, batch_and_serial=None):
+        request = json.dumps([method, args]).encode()
+        with self._lock:
+            try:
+                self._connect()
+                self._sock.sendall(request + b'\n')
+                line = self._file.readline()
+            except OSError as e:
+                logger.warning(f'Daemon at {self.path} failed: {e}')
+                line = b''
+        if not line:
+            self.close()
+            raise PicoException(PicoStatus.PICO_NOT_RESPONDING,
+                                batch_and_serial, 'Daemon closed connection')
+        return self._result(json.loads(line), batch_and_serial)
+
+    def _request(self, method, batch_and_serial, *args):
+        return self._send(method, [batch_and_serial, *args], batch_and_serial)
+
+    @staticmethod
+    def _result(response, batch_and_serial):
+        if response[0] == 'error':
+            raise PicoException(response[1], batch_and_serial, response[2])
+        return response[1]
+
+    def discover_devices(self, communication_type=CommunicationType.CT_USB):
+        return self._send('discover_devices', [int(communication_type)])
+
+    def open_unit(self, batch_and_serial):
+        return self._request('open_unit', batch_and_serial)
+
+    def close_unit(self, batch_and_serial):
+        self._request('close_unit', batch_and_serial)
+
+    def set_channel(self, batch_and_serial, channel_number, data_type, wires):
+        self._request('set_channel', batch_and_serial, int(channel_number),
+                      int(data_type), int(wires))
+
+    def set_mains(self, batch_and_serial, sixty_hertz=False):
+        self._request('set_mains', batch_and_serial, bool(sixty_hertz))
+
+    def get_info(self, batch_and_serial, keys=None):
+        return self._request('get_info', batch_and_serial,
+                             None if keys is None else list(keys))
+
+    def get_value(self, batch_and_serial, channel, low_pass_filter=False):
+        return self._request('get_value', batch_and_serial, int(channel),
+                             bool(low_pass_filter))
+
+    def get_values(self, queries, return_exceptions=False):
+        """last values of many channels in a single request
+
+        :param queries: (batch_and_serial, channel) tuples, the units must
+            be open
+        :param return_exceptions: return PicoException of failed queries
+            instead of raising the first one
+        :return: list of values in the order of queries
+        """
+        queries = [(batch_and_serial, int(channel))
+                   for batch_and_serial, channel in queries]
+        values = []
+        for (batch_and_serial, _), response in zip(
+                queries, self._send('get_values', [queries])):
+            try:
+                values.append(self._result(response, batch_and_serial))
+            except PicoException as e:
+                if not return_exceptions:
+                    raise
+                values.append(e)
+        return values
+
+    def get_reader(self, batch_and_serial, channel, low_pass_filter=False):
+        return DaemonReader(self, batch_and_serial, channel, low_pass_filter)
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description=__doc__.strip().splitlines()[0])
+    parser.add_argument('path', help='path of the Unix domain socket')
+    parser.add_argument('--size', type=int, default=4800,
+                        help='samples kept per channel')
+    args = parser.parse_args(args)
+
+    from .usb import USBinterface
+
+    logging.basicConfig()
+    daemon = AcquisitionDaemon(args.path, USBinterface(), args.size)
+    try:
+        daemon.run()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
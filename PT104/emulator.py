@@ -0,0 +1,266 @@
+""" Emulator of the PT-104 Ethernet UDP protocol on localhost
+
+Example::
+
+    from PT104.emulator import EthernetEmulator, EmulatedUnit
+
+    emulator = EthernetEmulator()
+    address = emulator.add_unit(EmulatedUnit('EMU00/000',
+                                             resistances={1: 107.79}))
+    emulator.start()
+    ...  # talk to address ('127.0.0.1:<port>') with the ethernet interface
+    emulator.stop()
+
+Implemented commands are ``lock``, 0x30 FREQ, 0x31 CONVERT, 0x32 EPROM,
+0x33 UNLOCK and 0x34 ALIVE. While converting, a 20 bytes measurement frame
+is sent for each active channel every ``conversion_time`` seconds, one
+channel after the other as the real unit does.
+
+Raw measurements are generated for 4 wire sensors without lead resistance,
+such that ``calibration * (m3 - m2) / (m1 - m0)`` is the resistance of the
+channel in ohm.
+"""
+import random
+import selectors
+import socket
+import struct
+import threading
+import time
+import logging
+
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+COMMANDS = {
+    'LOCK': b'lock',
+    'FREQ': b'\x30',
+    'CONVERT': b'\x31',
+    'EPROM': b'\x32',
+    'UNLOCK': b'\x33',
+    'ALIVE': b'\x34'
+}
+
+_FRAME = struct.Struct('>BIBIBIBI')
+
+
+class EmulatedUnit:
+    """Protocol state of an emulated PT-104 Ethernet unit
+
+    :param batch_and_serial: serial number stored in the EEPROM (10 chars)
+    :param calibrations: calibration constant of the 4 channels
+    :param cal_date: calibration date stored in the EEPROM (8 chars)
+    :param mac_address: 6 bytes MAC address stored in the EEPROM
+    :param resistances: resistance in ohm by channel number, a number or a
+        callable receiving the conversion time. 100 ohm by default
+    :param noise: standard deviation of the gaussian noise in ohm
+    :param conversion_time: seconds to convert one channel
+    :param loss: probability to drop a measurement frame
+    :param lock_timeout: seconds without messages to release the lock
+    :param seed: seed of the noise and loss generator
+    """
+    REFERENCE_OFFSET = 0x00100000
+    REFERENCE_SPAN = 0x00800000
+
+    def __init__(self, batch_and_serial='EMU00/000',
+                 calibrations=(1000, 1000, 1000, 1000),
+                 cal_date='01JAN25', mac_address=b'\x00\x00\x00\x00\x00\x00',
+                 resistances=None, noise=0.0, conversion_time=0.75,
+                 loss=0.0, lock_timeout=15, seed=None):
+        self.batch_and_serial = batch_and_serial
+        self.calibrations = tuple(calibrations)
+        self.cal_date = cal_date
+        self.mac_address = mac_address
+        self.resistances = resistances or {}
+        self.noise = noise
+        self.conversion_time = conversion_time
+        self.loss = loss
+        self.lock_timeout = lock_timeout
+        self.sixty_hertz = False
+        self.frames_sent = 0
+        self.frames_dropped = 0
+
+        self._random = random.Random(seed)
+        self._locked_by = None
+        self._last_message = None
+        self._active_channels = []
+        self._next_frame = None
+        self._next_channel = 0
+
+    @property
+    def eeprom(self):
+        data = bytearray(128)
+        data[19:29] = self.batch_and_serial.encode().ljust(10)[:10]
+        data[29:37] = self.cal_date.encode().ljust(8)[:8]
+        data[37:53] = struct.pack('<4I', *self.calibrations)
+        data[53:59] = self.mac_address
+        return bytes(data)
+
+    @property
+    def is_locked(self):
+        return self._locked_by is not None
+
+    @property
+    def is_converting(self):
+        return self._next_frame is not None
+
+    def handle(self, data, address, now):
+        """process a request, return the response or None"""
+        if (self.is_locked and
+                now - self._last_message > self.lock_timeout):
+            logger.info(f'{self.batch_and_serial} lock of {self._locked_by} '
+                        'expired')
+            self._release()
+
+        if data == COMMANDS['LOCK']:
+            if self._locked_by == address:
+                response = b'Lock Success (already locked to this machine)'
+            elif self.is_locked:
+                return b'Lock Failed'
+            else:
+                response = b'Lock Success'
+            self._locked_by = address
+            self._last_message = now
+            return response
+
+        if address != self._locked_by:
+            return None
+        self._last_message = now
+
+        command, arg = data[:1], data[1:]
+        if command == COMMANDS['ALIVE']:
+            return b'Alive'
+        if command == COMMANDS['EPROM']:
+            return b'Eeprom=' + self.eeprom
+        if command == COMMANDS['FREQ']:
+            self.sixty_hertz = arg[:1] == b'\xff'
+            return b'Mains Changed'
+        if command == COMMANDS['CONVERT']:
+            mask = arg[0] if arg else 0
+            self._active_channels = [number for number in range(1, 5)
+                                     if mask & 2**(number - 1)]
+            self._next_channel = 0
+            self._next_frame = (now + self.conversion_time
+                                if self._active_channels else None)
+            return b'Converting'
+        if command == COMMANDS['UNLOCK']:
+            self._release()
+            return b'Unlocked'
+        return None
+
+    def _release(self):
+        self._locked_by = None
+        self._next_frame = None
+        self._active_channels = []
+
+    def next_frame_time(self):
+        return self._next_frame
+
+    def pop_frame(self, now):
+        """measurement frame due at now and its destination, or None"""
+        if self._next_frame is None or now < self._next_frame:
+            return None
+        number = self._active_channels[self._next_channel]
+        self._next_channel = ((self._next_channel + 1) %
+                              len(self._active_channels))
+        self._next_frame += self.conversion_time
+        if self.loss and self._random.random() < self.loss:
+            self.frames_dropped += 1
+            return None
+        self.frames_sent += 1
+        return self.get_frame(number, now), self._locked_by
+
+    def _resistance(self, number, now):
+        resistance = self.resistances.get(number, 100.0)
+        if callable(resistance):
+            resistance = resistance(now)
+        if self.noise:
+            resistance = self._random.gauss(resistance, self.noise)
+        return resistance
+
+    def get_frame(self, number, now):
+        """20 bytes measurement frame of a channel"""
+        index = number - 1
+        m0 = self.REFERENCE_OFFSET
+        m1 = m0 + self.REFERENCE_SPAN
+        m2 = self.REFERENCE_OFFSET
+        ratio = self._resistance(number, now) / self.calibrations[index]
+        m3 = m2 + int(round(ratio * self.REFERENCE_SPAN))
+        return _FRAME.pack(index * 4, m0, index * 4 + 1, m1,
+                           index * 4 + 2, m2, index * 4 + 3, m3)
+
+
+class EthernetEmulator(threading.Thread):
+    """Serves many emulated units, each one on its own localhost UDP port
+
+    A single thread multiplexes every socket and sends the measurement
+    frames when they are due.
+
+    :param host: address to bind the unit sockets
+    """
+    def __init__(self, host='127.0.0.1'):
+        super().__init__(daemon=True)
+        self.host = host
+        self.units = {}
+        self._selector = selectors.DefaultSelector()
+        self._sockets = {}
+        self._continue = True
+        self._lock = threading.Lock()
+
+    def add_unit(self, unit, port=0):
+        """serve unit on port, any free port by default
+
+        :return: address of the unit as 'host:port'
+        """
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.bind((self.host, port))
+        sock.setblocking(False)
+        address = '{}:{}'.format(*sock.getsockname())
+        with self._lock:
+            self.units[address] = unit
+            self._sockets[address] = sock
+            self._selector.register(sock, selectors.EVENT_READ, unit)
+        return address
+
+    def run(self):
+        while self._continue:
+            now = time.time()
+            with self._lock:
+                items = list(self._sockets.items())
+            timeout = 0.05
+            for address, sock in items:
+                unit = self.units[address]
+                frame = unit.pop_frame(now)
+                if frame:
+                    self._send(sock, *frame)
+                next_frame = unit.next_frame_time()
+                if next_frame is not None:
+                    timeout = min(timeout, max(0, next_frame - now))
+
+            for key, _ in self._selector.select(timeout):
+                self._receive(key.fileobj, key.data)
+
+        for sock in self._sockets.values():
+            sock.close()
+        self._selector.close()
+
+    def _receive(self, sock, unit):
+        try:
+            data, address = sock.recvfrom(1024)
+        except OSError:
+            return
+        response = unit.handle(data, address, time.time())
+        if response is not None:
+            self._send(sock, response, address)
+
+    def _send(self, sock, data, address):
+        try:
+            sock.sendto(data, address)
+        except OSError as e:
+            logger.warning(f'Emulator can not send to {address}: {e}')
+
+    def stop(self, timeout=1):
+        self._continue = False
+        if self.is_alive():
+            self.join(timeout)
@@ -1,9 +1,19 @@
-import socket
-import time
+""" Ethernet interface for PT-104 units
+
+All connections share one asyncio event loop running in a background
+thread: sockets are multiplexed by the loop, keep alives are loop timers,
+command responses are futures and measurement frames are processed by
+callbacks. :class:`EthernetInterface` offers the usual synchronous methods
+on top of it.
+"""
+import asyncio
+import struct
 import threading
-from queue import Queue
-from . import PicoException, DataTypes, PicoStatus, Wires, PicoInfo
-from .PT import PTCalculator
+import time
+from array import array
+from . import PicoException, DataTypes, PicoStatus, Wires
+from .PT import PtCalculator, np, _require_numpy
+from .metrics import METRICS
 import logging
 
 
@@ -11,47 +21,205 @@ logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
 
-pt_calculator = PTCalculator(1)
+pt_calculator = PtCalculator(1)
+
+_pt_calculators = {
+    DataTypes.PT100: PtCalculator(100),
+    DataTypes.PT1000: PtCalculator(1000)
+}
+
+
+def get_resistances(raw, calibration, wires):
+    """resistances in ohm of a block of raw measurements
+
+    :param raw: array like of raw measurement 4-tuples, a flat array as
+        given by :meth:`FrameDecoder.window` is accepted too
+    :param calibration: calibration constant of the channel from the EEPROM
+    :param wires: wiring of the sensor (Wires)
+    :return: numpy array of resistances
+    """
+    _require_numpy()
+    raw = np.asarray(raw, dtype=np.float64).reshape(-1, 4)
+    m0, m1, m2, m3 = raw.T
+    if wires == Wires.WIRES_3:
+        numerator = (m3 - (m2 - m1)) - m2
+    else:
+        # For 2 and 4 wire
+        numerator = m3 - m2
+    return calibration * numerator / (m1 - m0)
+
+
+def get_values(raw, calibration, data_type, wires):
+    """values of a block of raw measurements
+
+    Vectorized equivalent of :meth:`ChannelCalculator.get_value` to process
+    recorded captures.
+
+    :return: numpy array in the units of :attr:`PT104.Channel.units`
+    """
+    if data_type == DataTypes.OFF:
+        raise PicoException(PicoStatus.PICO_NO_SAMPLES_AVAILABLE, None)
+    resistances = get_resistances(raw, calibration, wires)
+    if data_type in _pt_calculators:
+        return _pt_calculators[data_type].get_temperatures(resistances)
+    if data_type in [DataTypes.RESISTANCE_TO_10K,
+                     DataTypes.RESISTANCE_TO_375R]:
+        return resistances * 1000  # mOhm
+    # Voltage_types
+    raise NotImplementedError()
 
 
 class ChannelCalculator:
-    def __init__(self, calibration, data_type, wires):
+    def __init__(self, calibration=None, data_type=DataTypes.OFF,
+                 wires=Wires.WIRES_4):
         self.wires = wires
         self.calibration = calibration
         self.data_type = data_type
+        self.measurements = None
 
-    def get_value(self):
+    def get_resistance(self):
+        """resistance in ohm from the last raw measurements"""
         measurements = self.measurements
-        if DataTypes.OFF:
-            raise PicoException(PicoStatus.PICO_NO_SAMPLES_AVAILABLE)
+        if self.wires == Wires.WIRES_3:
+            return (
+                self.calibration *
+                ((measurements[3] - (measurements[2] - measurements[1])) -
+                 measurements[2]) /
+                (measurements[1] - measurements[0])
+            )
+        # For 2 and 4 wire
+        return (
+            self.calibration * (measurements[3] - measurements[2]) /
+            (measurements[1] - measurements[0])
+        )
+
+    def get_value(self):
+        """last value in the units of :attr:`PT104.Channel.units`"""
+        if self.data_type == DataTypes.OFF or self.measurements is None:
+            raise PicoException(PicoStatus.PICO_NO_SAMPLES_AVAILABLE, None)
 
         temperature_types = [DataTypes.PT100, DataTypes.PT1000]
         res_types = [DataTypes.RESISTANCE_TO_10K, DataTypes.RESISTANCE_TO_375R]
-        # voltage_types = [DataTypes.DIFFERENTIAL_TO_2500MV, DataTypes.DIFFERENTIAL_TO_115MV,
-        #                  DataTypes.SINGLE_ENDED_TO_115W, DataTypes.SINGLE_ENDED_TO_2500MV]
-        if self.data_type in res_types or self.data_type in temperature_types:
-            if self.wires == Wires.WIRES_3:
-
-                # For 3 wire
-                resistance = (
-                    self.calibration *
-                    ((measurements[3] - (measurements[2] - measurements[1])) - measurements[2])
-                ) /
-                (measurements[1] - measurements[0])
-            else:
-                # For 2 and 4 wire
-                resistance = (self.calibration * (measurements[3] - measurements[2]))/(measurements[1] - measurements[0])
-        else:   # Voltage_types
-            raise NotImplementedError()
-
-        if self.data_type in [DataTypes.PT100, DataTypes.PT1000]:
+        if self.data_type in temperature_types:
+            resistance = self.get_resistance()
             adim_res = (resistance / 100 if self.data_type == DataTypes.PT100
                         else resistance / 1000)
-            return PtCalculator.get_temperature(adim_res)
+            return pt_calculator.get_temperature(adim_res)
+        if self.data_type in res_types:
+            return self.get_resistance() * 1000  # mOhm
+        # Voltage_types
+        raise NotImplementedError()
+
+    def get_values(self, raw):
+        """values of a block of raw measurements with this channel setup"""
+        return get_values(raw, self.calibration, self.data_type, self.wires)
+
+
+class FrameDecoder:
+    """Decodes measurement frames into preallocated raw buffers per channel
+
+    A frame has 4 groups of a measurement index byte followed by a big
+    endian unsigned count. Frames are unpacked in place with a precompiled
+    struct and the counts copied straight to a ring of the last ``size``
+    measurement 4-tuples of their channel.
+
+    :param size: measurements kept per channel
+    :param recv_frames: frames fitting the reusable receive buffer
+    """
+    FRAME = struct.Struct('>BIBIBIBI')
+
+    def __init__(self, size=1024, recv_frames=64):
+        self.size = size
+        self.raw = {number: array('I', bytes(4 * 4 * size))
+                    for number in range(1, 5)}
+        self.counts = dict.fromkeys(range(1, 5), 0)
+        self._buffer = bytearray(self.FRAME.size * recv_frames)
+        self._view = memoryview(self._buffer)
+
+    def decode(self, data, offset=0):
+        """decode the frame at offset of data
+
+        :return: channel number of the frame
+        """
+        header, m0, _, m1, _, m2, _, m3 = self.FRAME.unpack_from(data, offset)
+        number = header // 4 + 1
+        raw = self.raw[number]
+        index = (self.counts[number] % self.size) * 4
+        raw[index] = m0
+        raw[index + 1] = m1
+        raw[index + 2] = m2
+        raw[index + 3] = m3
+        self.counts[number] += 1
+        return number
+
+    def decode_many(self, data, nbytes=None):
+        """decode consecutive frames, e.g. a recorded capture
+
+        :return: number of decoded frames
+        """
+        if nbytes is None:
+            nbytes = len(data)
+        frame_size = self.FRAME.size
+        frames = nbytes // frame_size
+        for offset in range(0, frames * frame_size, frame_size):
+            self.decode(data, offset)
+        return frames
+
+    def recv_into(self, sock):
+        """receive from a blocking socket into the reusable buffer and decode
+
+        :return: number of decoded frames
+        """
+        nbytes = sock.recv_into(self._buffer)
+        return self.decode_many(self._view, nbytes)
+
+    def latest(self, number):
+        """last measurement 4-tuple of channel or None"""
+        count = self.counts[number]
+        if not count:
+            return None
+        index = ((count - 1) % self.size) * 4
+        return tuple(self.raw[number][index:index + 4])
+
+    def window(self, number):
+        """kept measurements of channel, oldest first, as flat array"""
+        raw = self.raw[number]
+        count = self.counts[number]
+        if count <= self.size:
+            return raw[:count * 4]
+        start = (count % self.size) * 4
+        return raw[start:] + raw[:start]
+
+
+class _EventLoopThread(threading.Thread):
+    def __init__(self):
+        super().__init__(daemon=True, name='PT104-ethernet')
+        self.loop = asyncio.new_event_loop()
+
+    def run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
 
+_loop_thread = None
+_loop_lock = threading.Lock()
 
-class Connection(threading.Thread):
-    _channel_headers = (0, 4, 8, 12)
+
+def get_event_loop():
+    """event loop shared by every ethernet connection, started on demand"""
+    global _loop_thread
+    with _loop_lock:
+        if _loop_thread is None:
+            _loop_thread = _EventLoopThread()
+            _loop_thread.start()
+    return _loop_thread.loop
+
+
+class Connection(asyncio.DatagramProtocol):
+    """UDP connection to a PT-104 unit, driven by the shared event loop"""
+    DEFAULT_PORT = 25
+    ALIVE_INTERVAL = 10
+    TIMEOUT = 3
 
     COMMANDS = {
         'LOCK': b'lock',
@@ -62,189 +230,300 @@ class Connection(threading.Thread):
         'ALIVE': b'\x34'
     }
 
-    def __init__(self, address):
-        super().__init__()
-        self._last_alive = None
-        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        self.sock.settimeout(3)
-        address = address.split(':')
-        if len(address) == 1:
-            address.append(25)
-        address[1] = int(address[1])
-
-        self.sock.connect(tuple(address))
-
-        self._continue = True
-        self.calculator  = Calculator()
-        self.setDaemon(True)
-        self._converting = False
-        self._commands = Queue()
-        self.exception = None
-
-    def _run_command(request, expected_response):
-        args = self._commands.get(block=False)
-        if args:
-            observer, request, process_response = args
-            self.socket.send(request)
-            response = self.socket.recv(1024)
-            process_response(response)
+    # Metric names of the commands by first byte
+    _OPERATIONS = {command[:1]: f'Ethernet{name.title()}'
+                   for name, command in COMMANDS.items()}
 
-    def run(self):
-        while self._continue:
+    def __init__(self, address, cache=None):
+        self.address = address
+        self.cache = cache
+        host, _, port = address.partition(':')
+        self._remote = (host, int(port) if port else self.DEFAULT_PORT)
+        self.transport = None
+        self.exception = None
+        self.calculators = {number: ChannelCalculator()
+                            for number in range(1, 5)}
+        self.listeners = []
+        self.decoder = FrameDecoder()
+        self._info = {}
+        self._converting = False
+        self._pending = None
+        self._command_lock = None
+        self._keep_alive_handle = None
+
+    @property
+    def is_converting(self):
+        return self._converting
+
+    async def open(self):
+        loop = asyncio.get_running_loop()
+        self._command_lock = asyncio.Lock()
+        self.transport, _ = await loop.create_datagram_endpoint(
+            lambda: self, remote_addr=self._remote
+        )
+        try:
+            await self._lock_unit()
+            # The calibration date comes with the calibrations in the one
+            # EEPROM response, it is checked before the first reading
+            await self._read_eeprom()
+        except BaseException:
+            self.transport.close()
+            raise
+        self._schedule_keep_alive()
+        if self.cache:
+            cached = self.cache.get(self.address,
+                                    cal_date=self._info['cal_date'])
+            if cached != self.get_info():
+                self.cache.put(self.get_info(), alias=self.address)
+
+    async def _lock_unit(self):
+        await self.request(self.COMMANDS['LOCK'], b'Lock Success',
+                           b'Lock Failed', PicoStatus.PICO_BUSY)
+
+    def connection_lost(self, exc):
+        if exc is not None:
+            self.exception = PicoException(PicoStatus.PICO_NETWORK_FAILED,
+                                           self.address, str(exc))
+
+    def error_received(self, exc):
+        self.exception = PicoException(PicoStatus.PICO_NETWORK_FAILED,
+                                       self.address, str(exc))
+
+    def datagram_received(self, data, addr):
+        # Measurement frames start with a measurement index, responses are
+        # text
+        if len(data) == 20 and data[0] < 0x10:
+            self.process_measurement(data)
+            return
+
+        pending = self._pending
+        if pending is None or pending[1].done():
+            logger.debug(f'Unexpected response from {self.address}: {data}')
+            return
+        expected_response, future, failure_response, failure_status = pending
+        if data.startswith(expected_response):
+            future.set_result(data)
+        elif failure_response and data.startswith(failure_response):
+            future.set_exception(PicoException(failure_status, self.address,
+                                               data.decode(errors='replace')))
+        else:
+            logger.debug(f'Unexpected response from {self.address}: {data}')
+
+    async def request(self, data, expected_response, failure_response=None,
+                      failure_status=PicoStatus.PICO_OPERATION_FAILED):
+        """send a command and wait for the response starting as expected
+
+        :param failure_response: start of the response refusing the command,
+            it raises a PicoException with failure_status
+        """
+        async with self._command_lock:
+            future = asyncio.get_running_loop().create_future()
+            self._pending = (expected_response, future, failure_response,
+                             failure_status)
+            timed = METRICS.enabled
+            if timed:
+                start = time.perf_counter_ns()
+            self.transport.sendto(data)
             try:
-                self._keep_alive()
-                self._run_command()
-                if self.is_converting:
-                    self.process_measurement()
-            except Exception as e:
-                self.exception = e
-                self.socket.close()
-                raise e
-            time.sleep(0.01)
-
-    def _keep_alive(self):
-        if time.time() - self._last_alive > 10:
-            self.socket.send(COMMANDS['ALIVE'])
-            response = self.socket.recv(60)
-            if response != b'Alive':
-                raise PicoException(PicoStatus.PICO_NO_RESPONSE, self._sn,
-                                    f'Response: {response}')
-            self._last_alive = time.time()
-
-    def process_measurement(self, data):
-        data = self.socket.recv(20)
-        if len(data) != 20:
-            raise PicoException('INCORRECT_DATA', '{} with data'.format(self.socket))
-
-        index = int(data[0] / 4)
-        self.calculators[index].measurements = (
-            int.from_bytes(data[1:5], 'big', signed=False),
-            int.from_bytes(data[6:10], 'big', signed=False),
-            int.from_bytes(data[11:15], 'big', signed=False),
-            int.from_bytes(data[16:20], 'big', signed=False)
+                return await asyncio.wait_for(future, self.TIMEOUT)
+            except asyncio.TimeoutError:
+                raise PicoException(
+                    PicoStatus.PICO_NOT_RESPONDING, self.address,
+                    f'No {expected_response} response to {data}'
+                )
+            finally:
+                self._pending = None
+                if timed:
+                    METRICS.record(self._OPERATIONS.get(data[:1], 'request'),
+                                   self.address, None, start,
+                                   not future.done() or future.cancelled() or
+                                   future.exception() is not None)
+
+    def _schedule_keep_alive(self):
+        loop = asyncio.get_running_loop()
+        self._keep_alive_handle = loop.call_later(
+            self.ALIVE_INTERVAL,
+            lambda: loop.create_task(self._keep_alive())
         )
 
-    def close(self):
-        self._commands.put(self._COMMANDS['UNLOCK'], self._close)
+    async def _keep_alive(self):
+        if self.exception is not None:
+            await self._reconnect()
+        else:
+            try:
+                await self.request(self.COMMANDS['ALIVE'], b'Alive')
+            except PicoException as e:
+                logger.warning(f'Keep alive of {self.address} failed: {e}')
+                await self._reconnect()
+        self._schedule_keep_alive()
+
+    async def _reconnect(self):
+        """lock the unit again after it stopped answering
+
+        The connection is unusable until it succeeds, it is tried again at
+        every keep alive interval.
+        """
+        try:
+            await self._lock_unit()
+        except PicoException as e:
+            self.exception = e
+            return
+        if self._converting:
+            self._send_convert()
+        self.exception = None
+        logger.info(f'Reconnected to {self.address}')
 
-    def _close(self, response):
-        if response != b'Unlocked':
-            raise PicoException(f'Socket can not be unlocked: {response}')
-        self.is_converting = False
-        self._continue = False
-        self.join()
-        self.socket.close()
+    def process_measurement(self, data):
+        number = self.decoder.decode(data)
+        calculator = self.calculators[number]
+        calculator.measurements = self.decoder.latest(number)
+        for listener in self.listeners:
+            listener(number, calculator.measurements)
+
+    async def close(self):
+        if self._keep_alive_handle:
+            self._keep_alive_handle.cancel()
+        try:
+            await self.request(self.COMMANDS['UNLOCK'], b'Unlocked')
+        finally:
+            self._converting = False
+            self.transport.close()
 
     def get_value(self, channel, low_pass_filter=False):
         if low_pass_filter:
-            raise PicoException('Ethernet inferface has not low_pass_filter')
-        return self.channels[channel].value
-
-    def convert(self, channels=None):
-        if channels:
-            self.channels = channels
-        arg = 0x00
-        for channel in self.channels.values():
-            if channel.data_type != DataTypes.OFF:
-                arg |= 2**(channel.number - 1)
-        event = threading.Event()
-        self._commands.put(
-            (self._COMMANDS['CONVERT'] + arg, self._convert, event)
-        )
-        event.wait()
+            raise PicoException(PicoStatus.PICO_NOT_SUPPORTED_BY_THIS_DEVICE,
+                                self.address,
+                                'Ethernet interface has not low_pass_filter')
+        if not METRICS.enabled:
+            return self.calculators[channel].get_value()
+
+        start = time.perf_counter_ns()
+        try:
+            value = self.calculators[channel].get_value()
+        except PicoException:
+            METRICS.record('EthernetGetValue', self.address, channel, start,
+                           True)
+            raise
+        METRICS.record('EthernetGetValue', self.address, channel, start)
+        return value
 
-    def _convert(self, response, event):
-        if
-        self.socket.send(self._COMMANDS['CONVERT'] + arg)
-        self._converting = True
+    def set_channel(self, channel_number, data_type, wires):
+        calculator = self.calculators[channel_number]
+        calculator.data_type = data_type
+        calculator.wires = wires
+        calculator.measurements = None
 
-    def get_info(self):
-        if not self._info:
-            self._read_eeprom()
+    async def convert(self, channels=None):
+        """start converting channels which are not OFF
 
-        if self._info and key in self._info:
-            return self._info.get(key)
+        :param channels: dict of channels by number, with data_type and wires
+        """
+        if channels:
+            for number, channel in channels.items():
+                self.set_channel(number, channel.data_type, channel.wires)
+        self._converting = self._send_convert() != 0x00
 
-    def _read_eeprom(self):
-        self.socket.send(COMMANDS['EPROM'])
-        data = self.socket.recv(256)
-        if data[:7] != b'Eeprom=':
-            raise PicoException(PicoStatus.PICO_EEPROM_CORRUPT, data)
+    def _send_convert(self):
+        arg = 0x00
+        for number, calculator in self.calculators.items():
+            if calculator.data_type != DataTypes.OFF:
+                arg |= 2**(number - 1)
+        # The unit starts streaming measurements, there is no response to
+        # wait for
+        self.transport.sendto(self.COMMANDS['CONVERT'] + bytes([arg]))
+        return arg
+
+    def get_info(self, keys=None):
+        info = dict(self._info)
+        info['calibrations'] = [calculator.calibration for calculator
+                                in self.calculators.values()]
+        if keys is not None:
+            info = {key: value for key, value in info.items() if key in keys}
+        return info
 
+    async def _read_eeprom(self):
+        data = await self.request(self.COMMANDS['EPROM'], b'Eeprom=')
         data = data[7:]
-        self._info['batch_and_serial'] = data[19:29].decode()
-        self._info['cal_date'] = data[29:37].decode()
+        if len(data) < 59:
+            raise PicoException(PicoStatus.PICO_EEPROM_CORRUPT, self.address)
+
+        self._info['batch_and_serial'] = data[19:29].decode().strip()
+        self._info['cal_date'] = data[29:37].decode().strip()
         calibrations = (
             int.from_bytes(data[37:41], 'little', signed=False),
             int.from_bytes(data[41:45], 'little', signed=False),
             int.from_bytes(data[45:49], 'little', signed=False),
             int.from_bytes(data[49:53], 'little', signed=False)
         )
-        self._info['mac_address'] = data[53:59]
-
-        for channel in self.channels.values():
-            channel.calibration = calibrations[channel.number - 1]
-
-    def set_mains(self, sixty_hertz):
-        value = 0x00
-        if sixty_hertz:
-            value = 0xFF
-        event = threading.Event()
-        self._commands.put(
-            (self._COMMANDS['FREQ'] + value, self._set_mains, event)
-        )
-        event.wait()
+        self._info['mac_address'] = data[53:59].hex(':')
 
-    def _set_mains(self, response, event):
-        if response != b'Mains Changed':
-            self.exception = PicoException(
-                PicoStatus.PICO_CONFIG_FAIL, self._id,
-                f'Response is {response}, but should be "Mains Changed"'
-            )
-            raise self.exception
+        for number, calculator in self.calculators.items():
+            calculator.calibration = calibrations[number - 1]
 
-        event.set()
+    async def set_mains(self, sixty_hertz):
+        value = b'\xff' if sixty_hertz else b'\x00'
+        await self.request(self.COMMANDS['FREQ'] + value, b'Mains Changed')
 
 
 class EthernetInterface:
+    """Interface between connection and PT104 using Ethernet
+
+    Units are identified by their 'ip:port' address.
+    """
     _CONNECTIONS = {}
+    TIMEOUT = 10
+
+    def __init__(self, cache=None):
+        """
+        :param cache: :class:`PT104.cache.InfoCache` updated with the
+            EEPROM of the opened units. The EEPROM is read at every opening,
+            its one response holds the calibration date and calibrations.
+        """
+        self.cache = cache
+
+    def _run(self, coroutine):
+        future = asyncio.run_coroutine_threadsafe(coroutine, get_event_loop())
+        return future.result(self.TIMEOUT)
 
     def _get_conn(self, address):
         connection = self._CONNECTIONS.get(address)
         if connection is None:
             raise PicoException(PicoStatus.PICO_NOT_FOUND, address)
+        if connection.exception:
+            raise connection.exception
+        return connection
 
     def open_unit(self, address):
-        connection = Connection(address)
+        if address in self._CONNECTIONS:
+            return address
+        connection = Connection(address, self.cache)
+        self._run(connection.open())
         self._CONNECTIONS[address] = connection
         return address
 
     def close_unit(self, address):
         connection = self._CONNECTIONS.pop(address)
-        connection.close()
+        self._run(connection.close())
 
     def convert(self, address, channels):
         conn = self._get_conn(address)
-        conn.convert(channels)
-        if conn.exception:
-            raise conn.exception
+        self._run(conn.convert(channels))
+
+    def set_channel(self, address, channel_number, data_type, wires):
+        conn = self._get_conn(address)
+        conn.set_channel(channel_number, data_type, wires)
+        self._run(conn.convert())
 
     def get_value(self, address, channel, low_pass_filter=False):
         conn = self._get_conn(address)
-        value = conn.get_value(channel)
-        if conn.exception:
-            raise conn.exception
-        return value
+        return conn.get_value(channel, low_pass_filter)
 
     def set_mains(self, address, sixty_hertz=False):
         conn = self._get_conn(address)
-        conn.set_mains(sixty_hertz)
-        if conn.exception:
-            raise conn.exception
+        self._run(conn.set_mains(sixty_hertz))
 
-    def get_unit_info(self, address):
+    def get_unit_info(self, address, keys=None):
         conn = self._get_conn(address)
-        info = conn.get_info()
-        if conn.exception:
-            raise conn.exception
-        return info
+        return conn.get_info(keys)
+
+    get_info = get_unit_info
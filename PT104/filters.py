@@ -0,0 +1,323 @@
+""" Incremental digital filters of channel samples
+
+Example::
+
+    bank = FilterBank()
+    bank.add(1, 'ema', EMA(alpha=0.2))
+    bank.add(1, 'median', Pipeline(MovingMedian(5), MovingAverage(10)))
+    bank.add(1, 'savgol', SavitzkyGolay(21, order=2))
+    unit.start_acquisition()
+    bank.attach(unit)
+    ...
+    print(bank.latest(1, 'ema'), bank.latest(1, 'savgol'))
+
+Every filter updates its output with each new sample on windows allocated
+once, so any number of filtered views of a channel are computed from the
+same acquisition without querying the unit again.
+"""
+import heapq
+import threading
+from array import array
+from math import comb
+
+
+class EMA:
+    """Exponential moving average
+
+    :param alpha: weight of the new sample, between 0 and 1
+    """
+    def __init__(self, alpha):
+        if not 0 < alpha <= 1:
+            raise ValueError('alpha must be in (0, 1]')
+        self.alpha = alpha
+        self.value = None
+
+    def reset(self):
+        self.value = None
+
+    def update(self, value):
+        if self.value is None:
+            self.value = value
+        else:
+            self.value += self.alpha * (value - self.value)
+        return self.value
+
+
+class _Window:
+    """Preallocated ring of the last ``size`` samples"""
+    def __init__(self, size):
+        if size < 1:
+            raise ValueError('window size must be positive')
+        self.size = size
+        self._samples = array('d', bytes(8 * size))
+        self._count = 0
+
+    def reset(self):
+        self._count = 0
+
+    @property
+    def is_full(self):
+        return self._count >= self.size
+
+    def push(self, value):
+        """store value and return the sample it replaces or None"""
+        index = self._count % self.size
+        old = self._samples[index] if self.is_full else None
+        self._samples[index] = value
+        self._count += 1
+        return old
+
+
+class MovingAverage(_Window):
+    """Mean of the last ``size`` samples, O(1) per sample"""
+    def __init__(self, size):
+        super().__init__(size)
+        self._sum = 0.0
+
+    def reset(self):
+        super().reset()
+        self._sum = 0.0
+
+    def update(self, value):
+        old = self.push(value)
+        if old is not None:
+            self._sum -= old
+        self._sum += value
+        if self._count % (64 * self.size) == 0:
+            # Cancel rounding errors accumulated by the running sum
+            self._sum = sum(self._samples)
+        return self._sum / min(self._count, self.size)
+
+
+class MovingMedian(_Window):
+    """Median of the last ``size`` samples, O(log size) per sample
+
+    The window is split in two heaps, a max heap of the lower half and a
+    min heap of the upper half. Outgoing samples are only counted as
+    removed and popped once they reach the top of their heap, the heaps
+    are rebuilt from the window when removed samples fill half of them.
+    """
+    def __init__(self, size):
+        super().__init__(size)
+        self.reset()
+
+    def reset(self):
+        super().reset()
+        self._low = []   # negated samples
+        self._high = []
+        self._low_count = 0
+        self._high_count = 0
+        self._removed = {}
+
+    def update(self, value):
+        old = self.push(value)
+        if old is not None:
+            self._remove(old)
+        if self._low and value <= -self._low[0]:
+            heapq.heappush(self._low, -value)
+            self._low_count += 1
+        else:
+            heapq.heappush(self._high, value)
+            self._high_count += 1
+        self._balance()
+        if len(self._low) + len(self._high) > 2 * self.size:
+            self._rebuild()
+
+        if (self._low_count + self._high_count) % 2:
+            return -self._low[0]
+        return (self._high[0] - self._low[0]) / 2
+
+    def _remove(self, value):
+        self._removed[value] = self._removed.get(value, 0) + 1
+        if value <= -self._low[0]:
+            self._low_count -= 1
+            if value == -self._low[0]:
+                self._prune(self._low, -1)
+        else:
+            self._high_count -= 1
+            if value == self._high[0]:
+                self._prune(self._high, 1)
+
+    def _prune(self, heap, sign):
+        """pop removed samples off the top of heap"""
+        removed = self._removed
+        while heap:
+            value = sign * heap[0]
+            count = removed.get(value)
+            if not count:
+                return
+            if count == 1:
+                del removed[value]
+            else:
+                removed[value] = count - 1
+            heapq.heappop(heap)
+
+    def _balance(self):
+        # The lower half keeps the extra sample of odd windows
+        if self._low_count > self._high_count + 1:
+            heapq.heappush(self._high, -heapq.heappop(self._low))
+            self._low_count -= 1
+            self._high_count += 1
+            self._prune(self._low, -1)
+        elif self._low_count < self._high_count:
+            heapq.heappush(self._low, -heapq.heappop(self._high))
+            self._low_count += 1
+            self._high_count -= 1
+            self._prune(self._high, 1)
+
+    def _rebuild(self):
+        count = min(self._count, self.size)
+        samples = sorted(self._samples[:count])
+        middle = (count + 1) // 2
+        self._low = [-sample for sample in reversed(samples[:middle])]
+        self._high = samples[middle:]
+        self._low_count = len(self._low)
+        self._high_count = len(self._high)
+        self._removed = {}
+
+
+def _solve(matrix, vector):
+    """solution of a small linear system by Gauss-Jordan elimination"""
+    size = len(vector)
+    rows = [list(row) + [value] for row, value in zip(matrix, vector)]
+    for column in range(size):
+        pivot = max(range(column, size),
+                    key=lambda row: abs(rows[row][column]))
+        rows[column], rows[pivot] = rows[pivot], rows[column]
+        for row in range(size):
+            if row != column:
+                factor = rows[row][column] / rows[column][column]
+                for index in range(column, size + 1):
+                    rows[row][index] -= factor * rows[column][index]
+    return [rows[row][size] / rows[row][row] for row in range(size)]
+
+
+class SavitzkyGolay(_Window):
+    """Least squares polynomial fit of the last ``size`` samples, evaluated
+    at the newest one, so it adds no delay
+
+    The moments sum(i**k * y_i) of the window are shifted with the binomial
+    theorem when a sample comes in, each sample costs O(order**2)
+    whatever the window size. Samples are passed through until the window
+    is full.
+
+    :param size: samples of the window, greater than order
+    :param order: order of the fitted polynomial
+    """
+    def __init__(self, size, order=2):
+        if size <= order:
+            raise ValueError('window size must be greater than order')
+        super().__init__(size)
+        self.order = order
+        gram = [[sum(i**(j + k) for i in range(size))
+                 for k in range(order + 1)] for j in range(order + 1)]
+        self._weights = _solve(gram, [(size - 1)**k
+                                      for k in range(order + 1)])
+        self._shift = [[comb(k, j) * (-1)**(k - j) for j in range(k + 1)]
+                       for k in range(order + 1)]
+        self._powers = [(size - 1)**k for k in range(order + 1)]
+        self._moments = [0.0] * (order + 1)
+
+    def reset(self):
+        super().reset()
+        self._moments = [0.0] * (self.order + 1)
+
+    def update(self, value):
+        old = self.push(value)
+        if old is None:
+            if not self.is_full:
+                return value
+            self._recompute()
+        elif self._count % self.size == 0:
+            # Cancel rounding errors amplified by the shifts, amortized it
+            # costs O(order) per sample
+            self._recompute()
+        else:
+            moments = self._moments
+            moments[0] -= old
+            self._moments = [
+                sum(factor * moments[j]
+                    for j, factor in enumerate(self._shift[k])) +
+                self._powers[k] * value
+                for k in range(self.order + 1)
+            ]
+        return sum(weight * moment
+                   for weight, moment in zip(self._weights, self._moments))
+
+    def _recompute(self):
+        start = self._count % self.size
+        samples = self._samples[start:] + self._samples[:start]
+        self._moments = [sum(i**k * sample
+                             for i, sample in enumerate(samples))
+                         for k in range(self.order + 1)]
+
+
+class Pipeline:
+    """Filters applied one after the other"""
+    def __init__(self, *stages):
+        self.stages = stages
+
+    def reset(self):
+        for stage in self.stages:
+            stage.reset()
+
+    def update(self, value):
+        for stage in self.stages:
+            value = stage.update(value)
+        return value
+
+
+class FilterBank:
+    """Named filters of the channels of a unit
+
+    Filters receive every sample of their channel, read the last output with
+    :meth:`latest`.
+    """
+    def __init__(self):
+        self._filters = {}
+        self._latest = {}
+        self._lock = threading.Lock()
+
+    def add(self, number, name, stage):
+        """filter samples of channel number as view name
+
+        :param stage: filter or Pipeline
+        """
+        with self._lock:
+            self._filters.setdefault(number, {})[name] = stage
+
+    def remove(self, number, name):
+        with self._lock:
+            del self._filters[number][name]
+            self._latest.pop((number, name), None)
+
+    def update(self, number, timestamp, value):
+        """feed a sample of a channel to its filters"""
+        with self._lock:
+            for name, stage in self._filters.get(number, {}).items():
+                self._latest[number, name] = (timestamp, stage.update(value))
+
+    def latest(self, number, name):
+        """last output of a filter as (timestamp, value) or None"""
+        return self._latest.get((number, name))
+
+    def reset(self):
+        """restart every filter, e.g. after a channel setup has changed"""
+        with self._lock:
+            for filters in self._filters.values():
+                for stage in filters.values():
+                    stage.reset()
+            self._latest = {}
+
+    def attach(self, unit):
+        """filter every sample acquired by unit, attaching again has no
+        effect, see :meth:`PT104.PT104.subscribe`"""
+        def listener(number, timestamp, value, status):
+            if not status:
+                self.update(number, timestamp, value)
+
+        return unit.subscribe(self, listener)
+
+    def detach(self, unit):
+        """stop filtering the samples acquired by unit"""
+        unit.unsubscribe(self)
@@ -0,0 +1,270 @@
+""" Concurrent polling of many PT104 units
+
+Example::
+
+    fleet = Fleet([PT104(serial, interface) for serial in serials])
+    fleet.start()
+    for sample in fleet.samples():
+        print(sample.unit, sample.channel, sample.value)
+    print(fleet.stats())
+    fleet.stop()
+
+Many units can be brought up concurrently with::
+
+    fleet = Fleet.bring_up(interface, serials,
+                           channels={1: (DataTypes.PT100, Wires.WIRES_4)})
+    print(fleet.timings)
+"""
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from queue import Queue, Empty
+import logging
+from . import PT104, PicoException
+from .usb import USBdriver, USBinterface
+
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+Sample = namedtuple('Sample', ['timestamp', 'unit', 'channel', 'value'])
+
+
+class UnitStats:
+    def __init__(self):
+        self.samples = 0
+        self.errors = 0
+        self.dropped = 0
+        self.lag = 0.0
+        self.max_lag = 0.0
+
+
+class Fleet:
+    """Polls a set of PT104 units concurrently from a thread pool
+
+    Every unit reads all its active channels once per conversion cycle, the
+    samples of all units are merged in a single stream. With fewer workers
+    than units, the workers take the units in turn, a unit is never polled
+    by two workers at once.
+
+    :param units: PT104 units to poll
+    :param max_workers: threads polling units, one per unit by default
+    :param queue_size: samples kept until :meth:`samples` delivers them,
+        the oldest are dropped when it is full
+    """
+    IDLE_TIME = 0.1
+
+    def __init__(self, units, max_workers=None, queue_size=10000):
+        self.units = list(units)
+        self.timings = {}
+        self.max_workers = max_workers or len(self.units)
+        self._queue = Queue(maxsize=queue_size)
+        self._pending = Queue()
+        self._put_lock = threading.Lock()
+        self._stats = {unit: UnitStats() for unit in self.units}
+        self._stop_event = threading.Event()
+        self._executor = None
+        self._futures = []
+        self._start_time = None
+
+    @classmethod
+    def bring_up(cls, interface, ids, channels=None, sixty_hertz=None,
+                 max_workers=8, max_concurrent_opens=None):
+        """Connects, configures and gets info of many units concurrently
+
+        Every unit is brought up by a single worker, so calls on the same
+        handle never overlap, while different units progress in parallel.
+
+        :param interface: interface of the units
+        :param ids: serial numbers or addresses of the units
+        :param channels: dict of (data_type, wires) by channel number to
+            activate on every unit
+        :param sixty_hertz: mains frequency to set, untouched if None
+        :param max_workers: units brought up at the same time
+        :param max_concurrent_opens: limit of simultaneous open calls, 0 for
+            no limit. By default the units of the usbpt104 library are
+            opened one at a time, the library is not known to open units
+            concurrently, and other units without limit.
+        :return: Fleet of the units brought up, with per unit step timings
+            in :attr:`timings`. Failed units have their exception under
+            'error' and are not part of the fleet.
+        """
+        if max_concurrent_opens is None:
+            max_concurrent_opens = 1 if _uses_usb_library(interface) else 0
+        open_limit = (threading.Semaphore(max_concurrent_opens)
+                      if max_concurrent_opens else None)
+
+        def bring_up_unit(id):
+            unit = PT104(id, interface)
+            timings = {}
+            start = last = time.perf_counter()
+
+            def step(name):
+                nonlocal last
+                now = time.perf_counter()
+                timings[name] = now - last
+                last = now
+
+            try:
+                if open_limit:
+                    with open_limit:
+                        unit.connect()
+                else:
+                    unit.connect()
+                step('open')
+                if channels:
+                    unit.configure(channels)
+                step('channels')
+                if sixty_hertz is not None:
+                    unit.set_mains(sixty_hertz)
+                step('mains')
+                unit.info
+                step('info')
+            except Exception as e:
+                logger.warning(f'Bring up of {id} failed: {e!r}')
+                timings['error'] = e
+                if unit.is_connected:
+                    try:
+                        unit.disconnect()
+                    except Exception as close_error:
+                        logger.warning(f'Closing {id} failed: {close_error!r}')
+                unit = None
+            timings['total'] = time.perf_counter() - start
+            return unit, timings
+
+        with ThreadPoolExecutor(max_workers=max_workers,
+                                thread_name_prefix='BringUp') as executor:
+            results = list(executor.map(bring_up_unit, ids))
+
+        fleet = cls([unit for unit, _ in results if unit is not None])
+        fleet.timings = {id: timings
+                         for id, (_, timings) in zip(ids, results)}
+        return fleet
+
+    @property
+    def is_running(self):
+        return self._executor is not None
+
+    def start(self):
+        if self.is_running:
+            return
+        self._stop_event.clear()
+        self._start_time = time.time()
+        self._pending = Queue()
+        for unit in self.units:
+            self._pending.put(unit)
+        workers = min(self.max_workers, len(self.units))
+        self._executor = ThreadPoolExecutor(max_workers=max(workers, 1),
+                                            thread_name_prefix='Fleet')
+        self._futures = [self._executor.submit(self._work)
+                         for _ in range(workers)]
+
+    def stop(self):
+        if not self.is_running:
+            return
+        self._stop_event.set()
+        self._executor.shutdown(wait=True)
+        self._executor = None
+
+    def _work(self):
+        while not self._stop_event.is_set():
+            try:
+                unit = self._pending.get(timeout=self.IDLE_TIME)
+            except Empty:
+                continue
+            try:
+                self._poll(unit)
+            finally:
+                # Back in turn, for this worker or another one
+                self._pending.put(unit)
+
+    def _poll(self, unit):
+        stats = self._stats[unit]
+        if not unit.active_channels_count:
+            self._stop_event.wait(self.IDLE_TIME)
+            return
+        try:
+            timestamp, values = unit.read_all()
+        except PicoException as e:
+            stats.errors += 1
+            logger.warning(f'Polling of {unit.id} failed: {e}')
+            self._stop_event.wait(self.IDLE_TIME)
+            return
+        except Exception:
+            # Keep the worker, the failure may be temporary
+            stats.errors += 1
+            logger.exception(f'Polling of {unit.id} failed')
+            self._stop_event.wait(self.IDLE_TIME)
+            return
+        for number, value in values.items():
+            self._put((stats, Sample(timestamp, unit.id, number, value)))
+
+    def _put(self, item):
+        # Only producers add samples, so once one is dropped under the lock
+        # there is room for the new one
+        with self._put_lock:
+            if self._queue.full():
+                try:
+                    dropped_stats, _ = self._queue.get_nowait()
+                    dropped_stats.dropped += 1
+                except Empty:
+                    pass
+            self._queue.put_nowait(item)
+
+    def samples(self, timeout=None):
+        """yields samples of all units in arrival order
+
+        Returns once the fleet is stopped and the queued samples are
+        delivered.
+
+        :param timeout: stop when no sample arrives within timeout seconds
+        """
+        while self.is_running or not self._queue.empty():
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while True:
+                wait = self.IDLE_TIME
+                if deadline is not None:
+                    wait = min(wait, deadline - time.monotonic())
+                try:
+                    stats, sample = self._queue.get(timeout=max(wait, 0))
+                    break
+                except Empty:
+                    if not self.is_running or (deadline is not None and
+                                               time.monotonic() >= deadline):
+                        return
+            stats.samples += 1
+            stats.lag = time.time() - sample.timestamp
+            stats.max_lag = max(stats.max_lag, stats.lag)
+            yield sample
+
+    def stats(self):
+        """per unit count of delivered and dropped samples, errors,
+        throughput and lag
+
+        Throughput is in samples per second since start, lag is the delay
+        between a sample reading and its delivery by :meth:`samples`.
+        """
+        elapsed_time = time.time() - self._start_time if self._start_time else 0
+        return {
+            unit.id: {
+                'samples': stats.samples,
+                'errors': stats.errors,
+                'dropped': stats.dropped,
+                'throughput': (stats.samples / elapsed_time
+                               if elapsed_time else 0.0),
+                'lag': stats.lag,
+                'max_lag': stats.max_lag
+            }
+            for unit, stats in self._stats.items()
+        }
+
+
+def _uses_usb_library(interface):
+    """whether the units of interface are opened by the usbpt104 library"""
+    if not isinstance(interface, USBinterface):
+        return False
+    # The library is the default driver, loaded on first use
+    return interface._driver is None or isinstance(interface._driver,
+                                                   USBdriver)
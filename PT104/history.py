@@ -0,0 +1,258 @@
+""" Memory mapped history of channel samples
+
+Example::
+
+    store = HistoryStore('/var/lib/pt104')
+    unit.start_acquisition()
+    store.attach(unit)
+    ...
+    samples = store.query('AY429/026', 3, start=monday, stop=tuesday)
+    print(samples['timestamp'], samples['value'])
+
+Every channel has its own directory of append-only segment files. A segment
+is a 16 bytes header, magic and record count, followed by a fixed number of
+16 bytes (timestamp, value) records. The first timestamp of every segment
+is kept as a sparse index, a query binary searches the index for the
+segments and then the timestamps inside them, and returns numpy views of
+the mapped files.
+"""
+import bisect
+import mmap
+import os
+import struct
+import threading
+import logging
+from .PT import np, _require_numpy
+
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+MAGIC = b'PT104HS1'
+_HEADER = struct.Struct('<8sQ')
+_RECORD = struct.Struct('<dd')
+
+
+def _dtype():
+    return np.dtype([('timestamp', '<f8'), ('value', '<f8')])
+
+
+class _Segment:
+    def __init__(self, path, capacity=None):
+        """open segment at path, or create it with capacity records"""
+        self.path = path
+        if capacity is not None:
+            with open(path, 'wb') as segment_file:
+                segment_file.truncate(_HEADER.size + capacity * _RECORD.size)
+                segment_file.write(_HEADER.pack(MAGIC, 0))
+        with open(path, 'r+b') as segment_file:
+            self._map = mmap.mmap(segment_file.fileno(), 0)
+        magic, self.count = _HEADER.unpack_from(self._map)
+        if magic != MAGIC:
+            self._map.close()
+            raise ValueError(f'{path} is not a history segment')
+        self.capacity = (len(self._map) - _HEADER.size) // _RECORD.size
+
+    @property
+    def is_full(self):
+        return self.count >= self.capacity
+
+    def timestamp(self, index):
+        return _RECORD.unpack_from(
+            self._map, _HEADER.size + index * _RECORD.size
+        )[0]
+
+    def append(self, timestamp, value):
+        _RECORD.pack_into(self._map, _HEADER.size + self.count * _RECORD.size,
+                          timestamp, value)
+        # The record is written before it is counted
+        self.count += 1
+        _HEADER.pack_into(self._map, 0, MAGIC, self.count)
+
+    def view(self):
+        """read only numpy view of the records of the segment"""
+        view = np.frombuffer(self._map, _dtype(), self.count, _HEADER.size)
+        view.flags.writeable = False
+        return view
+
+    def flush(self):
+        self._map.flush()
+
+    def close(self):
+        try:
+            self._map.close()
+        except BufferError:
+            # Views returned by queries still use the map, it is closed
+            # once they are released
+            pass
+
+
+class ChannelHistory:
+    """Append-only samples of a channel
+
+    :param directory: directory of the segment files
+    :param segment_records: records per segment file
+    """
+    def __init__(self, directory, segment_records=2**20):
+        self.directory = directory
+        self.segment_records = segment_records
+        self._lock = threading.Lock()
+        self._segments = []
+        self._starts = []
+        os.makedirs(directory, exist_ok=True)
+        for name in sorted(os.listdir(directory)):
+            if name.endswith('.seg'):
+                segment = _Segment(os.path.join(directory, name))
+                if segment.count:
+                    self._segments.append(segment)
+                    self._starts.append(segment.timestamp(0))
+                else:
+                    segment.close()
+                    os.remove(segment.path)
+
+    def __len__(self):
+        return sum(segment.count for segment in self._segments)
+
+    @property
+    def last_timestamp(self):
+        if not self._segments:
+            return None
+        segment = self._segments[-1]
+        return segment.timestamp(segment.count - 1)
+
+    def append(self, timestamp, value):
+        """store a sample, timestamps must not decrease"""
+        with self._lock:
+            last_timestamp = self.last_timestamp
+            if last_timestamp is not None and timestamp < last_timestamp:
+                raise ValueError(f'Sample at {timestamp} is older than last '
+                                 f'sample at {last_timestamp}')
+            if not self._segments or self._segments[-1].is_full:
+                self._add_segment(timestamp)
+            self._segments[-1].append(timestamp, value)
+
+    def _add_segment(self, timestamp):
+        index = len(self._segments)
+        if self._segments:
+            index = int(os.path.basename(self._segments[-1].path)[:-4]) + 1
+        path = os.path.join(self.directory, f'{index:08d}.seg')
+        self._segments.append(_Segment(path, self.segment_records))
+        self._starts.append(timestamp)
+
+    def views(self, start=None, stop=None):
+        """zero copy views of the samples with start <= timestamp < stop
+
+        :return: list of numpy structured arrays, one per segment, with
+            'timestamp' and 'value' fields
+        """
+        _require_numpy()
+        with self._lock:
+            first = 0
+            if start is not None:
+                first = max(bisect.bisect_left(self._starts, start) - 1, 0)
+            last = len(self._segments)
+            if stop is not None:
+                last = bisect.bisect_left(self._starts, stop)
+            segments = self._segments[first:last]
+            views = [segment.view() for segment in segments]
+
+        result = []
+        for view in views:
+            timestamps = view['timestamp']
+            begin = (0 if start is None else
+                     np.searchsorted(timestamps, start, 'left'))
+            end = (len(view) if stop is None else
+                   np.searchsorted(timestamps, stop, 'left'))
+            if end > begin:
+                result.append(view[begin:end])
+        return result
+
+    def query(self, start=None, stop=None):
+        """samples with start <= timestamp < stop
+
+        :return: numpy structured array with 'timestamp' and 'value' fields,
+            a view of the mapped file unless the range spans many segments
+        """
+        views = self.views(start, stop)
+        if not views:
+            return np.empty(0, _dtype())
+        if len(views) == 1:
+            return views[0]
+        return np.concatenate(views)
+
+    def flush(self):
+        with self._lock:
+            for segment in self._segments[-1:]:
+                segment.flush()
+
+    def close(self):
+        with self._lock:
+            for segment in self._segments:
+                segment.close()
+            self._segments = []
+            self._starts = []
+
+
+class HistoryStore:
+    """Histories of the channels of many units under a directory
+
+    :param directory: root directory of the store
+    :param segment_records: records per segment file
+    """
+    def __init__(self, directory, segment_records=2**20):
+        self.directory = directory
+        self.segment_records = segment_records
+        self._channels = {}
+        self._lock = threading.Lock()
+
+    def channel(self, unit_id, number):
+        """ChannelHistory of a channel of a unit"""
+        key = (unit_id, number)
+        with self._lock:
+            history = self._channels.get(key)
+            if history is None:
+                directory = os.path.join(self.directory,
+                                         unit_id.replace('/', '_'),
+                                         f'ch{number}')
+                history = ChannelHistory(directory, self.segment_records)
+                self._channels[key] = history
+        return history
+
+    def append(self, unit_id, number, timestamp, value):
+        self.channel(unit_id, number).append(timestamp, value)
+
+    def query(self, unit_id, number, start=None, stop=None):
+        """samples of a channel with start <= timestamp < stop, see
+        :meth:`ChannelHistory.query`"""
+        return self.channel(unit_id, number).query(start, stop)
+
+    def attach(self, unit):
+        """store every sample acquired by unit, attaching again has no
+        effect, see :meth:`PT104.PT104.subscribe`"""
+        def store(number, timestamp, value, status):
+            if status:
+                return
+            try:
+                self.append(unit.id, number, timestamp, value)
+            except ValueError as e:
+                logger.warning(f'{unit.id} channel {number} not stored: {e}')
+
+        return unit.subscribe(self, store)
+
+    def detach(self, unit):
+        """stop storing the samples acquired by unit"""
+        unit.unsubscribe(self)
+
+    def flush(self):
+        with self._lock:
+            histories = list(self._channels.values())
+        for history in histories:
+            history.flush()
+
+    def close(self):
+        with self._lock:
+            histories = list(self._channels.values())
+            self._channels = {}
+        for history in histories:
+            history.close()
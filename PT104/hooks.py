@@ -0,0 +1,128 @@
+""" Tracing hooks of PT104 operations
+
+Example::
+
+    from PT104.hooks import HOOKS
+
+    def trace(operation, unit_id, channel, duration, status):
+        print(f'{operation} {unit_id} {channel}: {duration:.6f} s', status)
+
+    hook = HOOKS.register(post=trace, operations=['get_value'],
+                          sample_rate=0.01)
+    ...
+    HOOKS.unregister(hook)
+
+Hooked operations are ``connect``, ``activate_channel``,
+``deactivate_channel``, ``get_value``, ``set_mains`` and ``disconnect`` of
+:class:`PT104.PT104`. Pre callbacks receive the operation, unit id and
+channel number, or None. Post callbacks receive the duration in seconds and
+the PicoStatus of the operation as well. While no hook is registered an
+operation only checks :attr:`HookRegistry.active`.
+"""
+import random
+import threading
+import time
+import logging
+from . import PicoException, PicoStatus
+
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+OPERATIONS = ('connect', 'activate_channel', 'deactivate_channel',
+              'get_value', 'set_mains', 'disconnect')
+
+
+class Hook:
+    """Callbacks registered for some operations
+
+    :param pre: called before the operation
+    :param post: called after the operation, even if it failed
+    :param operations: names of the hooked operations, all by default
+    :param sample_rate: fraction of the calls to hook, between 0 and 1
+    """
+    def __init__(self, pre=None, post=None, operations=None, sample_rate=1.0):
+        if not 0 < sample_rate <= 1:
+            raise ValueError('sample_rate must be in (0, 1]')
+        operations = OPERATIONS if operations is None else tuple(operations)
+        unknown = set(operations) - set(OPERATIONS)
+        if unknown:
+            raise ValueError(f'Operations {sorted(unknown)} can not be hooked')
+        self.pre = pre
+        self.post = post
+        self.operations = frozenset(operations)
+        self.sample_rate = sample_rate
+
+    def is_sampled(self, operation):
+        return (operation in self.operations and
+                (self.sample_rate >= 1 or random.random() < self.sample_rate))
+
+
+class HookRegistry:
+    """Hooks of the PT104 operations"""
+    def __init__(self):
+        self.active = False
+        self._hooks = ()
+        self._lock = threading.Lock()
+
+    def register(self, pre=None, post=None, operations=None, sample_rate=1.0):
+        """add a hook, see :class:`Hook`
+
+        :return: the hook, to unregister it
+        """
+        hook = Hook(pre, post, operations, sample_rate)
+        with self._lock:
+            # Operations iterate the tuple without lock, it is replaced and
+            # never modified
+            self._hooks = self._hooks + (hook,)
+            self.active = True
+        return hook
+
+    def unregister(self, hook):
+        with self._lock:
+            self._hooks = tuple(registered for registered in self._hooks
+                                if registered is not hook)
+            self.active = bool(self._hooks)
+
+    def clear(self):
+        with self._lock:
+            self._hooks = ()
+            self.active = False
+
+    def call(self, operation, unit_id, channel, function, *args):
+        """run function with the hooks of operation sampled for this call"""
+        hooks = [hook for hook in self._hooks if hook.is_sampled(operation)]
+        if not hooks:
+            return function(*args)
+
+        for hook in hooks:
+            if hook.pre is not None:
+                self._run(hook.pre, operation, unit_id, channel)
+        status = PicoStatus.PICO_OK
+        start = time.perf_counter()
+        try:
+            return function(*args)
+        except PicoException as e:
+            status = e.status
+            raise
+        except Exception:
+            status = PicoStatus.PICO_OPERATION_FAILED
+            raise
+        finally:
+            duration = time.perf_counter() - start
+            for hook in hooks:
+                if hook.post is not None:
+                    self._run(hook.post, operation, unit_id, channel,
+                              duration, status)
+
+    @staticmethod
+    def _run(callback, *args):
+        # A failing tracer must not break the operation it traces
+        try:
+            callback(*args)
+        except Exception:
+            logger.exception(f'Hook {callback} failed')
+
+
+HOOKS = HookRegistry()
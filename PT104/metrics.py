@@ -0,0 +1,241 @@
+""" Latency instrumentation of driver calls and conversion waits
+
+Example::
+
+    from PT104.metrics import METRICS
+
+    METRICS.enable()
+    ...  # use the units
+    for (operation, unit, channel), stats in METRICS.snapshot().items():
+        print(operation, unit, channel, stats['count'], stats['p99'])
+    print(METRICS.to_prometheus())
+
+Instrumented code checks :attr:`Metrics.enabled` and only reads the clock
+when it is set, so disabled instrumentation costs an attribute lookup.
+Each thread records in its own counters and histograms, without locks, and
+a snapshot merges them. Those of finished threads are merged into one set,
+so threads coming and going do not add up.
+
+Histograms are log-linear like HDR histograms, latencies in nanoseconds
+are counted in 16 linear buckets per power of two, so any percentile is
+known within 1/16 of its value.
+"""
+import threading
+import time
+import weakref
+
+
+SUB_BUCKET_BITS = 4
+SUB_BUCKETS = 2**SUB_BUCKET_BITS
+# Up to 2**40 ns, about 18 minutes
+BUCKETS = SUB_BUCKETS * (40 - SUB_BUCKET_BITS + 1)
+
+# Upper bounds in seconds of the exported Prometheus buckets
+PROMETHEUS_BUCKETS = (1e-5, 2e-5, 5e-5, 1e-4, 2e-4, 5e-4, 1e-3, 2e-3, 5e-3,
+                      1e-2, 2e-2, 5e-2, 0.1, 0.2, 0.5, 1, 2, 5, 10)
+
+PERCENTILES = (50, 90, 99, 99.9)
+
+
+def bucket_index(nanoseconds):
+    """index of the histogram bucket counting a latency"""
+    if nanoseconds < SUB_BUCKETS:
+        return max(int(nanoseconds), 0)
+    shift = int(nanoseconds).bit_length() - SUB_BUCKET_BITS - 1
+    index = (shift + 1) * SUB_BUCKETS + (int(nanoseconds) >> shift) - \
+        SUB_BUCKETS
+    return min(index, BUCKETS - 1)
+
+
+def bucket_bounds(index):
+    """lowest and highest latency in nanoseconds counted by a bucket"""
+    if index < SUB_BUCKETS:
+        return index, index
+    shift = index // SUB_BUCKETS - 1
+    low = (SUB_BUCKETS + index % SUB_BUCKETS) << shift
+    return low, low + (1 << shift) - 1
+
+
+class _Series:
+    __slots__ = ('count', 'errors', 'total', 'max', 'histogram')
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total = 0
+        self.max = 0
+        self.histogram = [0] * BUCKETS
+
+    def record(self, nanoseconds, error):
+        self.count += 1
+        if error:
+            self.errors += 1
+        self.total += nanoseconds
+        if nanoseconds > self.max:
+            self.max = nanoseconds
+        self.histogram[bucket_index(nanoseconds)] += 1
+
+    def merge(self, other):
+        self.count += other.count
+        self.errors += other.errors
+        self.total += other.total
+        self.max = max(self.max, other.max)
+        self.histogram = [mine + theirs for mine, theirs
+                          in zip(self.histogram, other.histogram)]
+
+    def percentile(self, percent):
+        """latency in seconds below which percent of the calls are"""
+        if not self.count:
+            return None
+        rank = percent / 100 * self.count
+        seen = 0
+        for index, count in enumerate(self.histogram):
+            seen += count
+            if count and seen >= rank:
+                return min(bucket_bounds(index)[1], self.max) * 1e-9
+        return self.max * 1e-9
+
+
+def _merge_into(merged, store):
+    # Other threads may add series while the store is copied
+    for key, series in list(store.items()):
+        total = merged.get(key)
+        if total is None:
+            total = merged[key] = _Series()
+        total.merge(series)
+
+
+def _escape(value):
+    """label value escaped as the Prometheus text format requires"""
+    return (str(value).replace('\\', '\\\\').replace('"', '\\"')
+            .replace('\n', '\\n'))
+
+
+class Metrics:
+    """Counters and latency histograms by operation, unit and channel"""
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self._local = threading.local()
+        # (weak reference to the thread, its store) of recording threads
+        self._stores = []
+        # Series of finished threads
+        self._retired = {}
+        self._lock = threading.Lock()
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        with self._lock:
+            for _, store in self._stores:
+                store.clear()
+            self._retired = {}
+
+    def _get_store(self):
+        store = getattr(self._local, 'store', None)
+        if store is None:
+            store = self._local.store = {}
+            with self._lock:
+                self._retire()
+                self._stores.append(
+                    (weakref.ref(threading.current_thread()), store)
+                )
+        return store
+
+    def _retire(self):
+        """merge the stores of finished threads, with lock"""
+        stores = []
+        for thread_ref, store in self._stores:
+            thread = thread_ref()
+            if thread is not None and thread.is_alive():
+                stores.append((thread_ref, store))
+                continue
+            _merge_into(self._retired, store)
+        self._stores = stores
+
+    def record(self, operation, unit, channel, start, error=False):
+        """count a call which began at ``time.perf_counter_ns()`` start
+
+        :param unit: id of the unit
+        :param channel: channel number or None
+        :param error: the call failed, e.g. a non zero PicoStatus
+        """
+        elapsed = time.perf_counter_ns() - start
+        store = self._get_store()
+        key = (operation, unit, channel)
+        series = store.get(key)
+        if series is None:
+            series = store[key] = _Series()
+        series.record(elapsed, error)
+
+    def _merge(self):
+        merged = {}
+        with self._lock:
+            self._retire()
+            _merge_into(merged, self._retired)
+            stores = [store for _, store in self._stores]
+        for store in stores:
+            _merge_into(merged, store)
+        return merged
+
+    def snapshot(self):
+        """statistics of every operation recorded
+
+        :return: dict by (operation, unit, channel) of dicts with count,
+            errors, total, mean, max and percentiles p50, p90, p99 and p99.9,
+            times in seconds
+        """
+        snapshot = {}
+        for key, series in self._merge().items():
+            stats = {
+                'count': series.count,
+                'errors': series.errors,
+                'total': series.total * 1e-9,
+                'mean': series.total * 1e-9 / series.count,
+                'max': series.max * 1e-9,
+            }
+            for percent in PERCENTILES:
+                stats[f'p{percent:g}'] = series.percentile(percent)
+            snapshot[key] = stats
+        return snapshot
+
+    def to_prometheus(self, prefix='pt104'):
+        """statistics in Prometheus text exposition format"""
+        name = f'{prefix}_operation_duration_seconds'
+        lines = [f'# HELP {name} Duration of PT104 driver calls and waits',
+                 f'# TYPE {name} histogram']
+        errors = []
+        for (operation, unit, channel), series in sorted(
+                self._merge().items(), key=lambda item: str(item[0])):
+            labels = (f'operation="{_escape(operation)}",'
+                      f'unit="{_escape(unit)}"')
+            if channel is not None:
+                labels += f',channel="{_escape(channel)}"'
+            cumulative = 0
+            index = 0
+            for bound in PROMETHEUS_BUCKETS:
+                limit = bound * 1e9
+                while (index < BUCKETS and
+                       bucket_bounds(index)[1] <= limit):
+                    cumulative += series.histogram[index]
+                    index += 1
+                lines.append(f'{name}_bucket{{{labels},le="{bound:g}"}} '
+                             f'{cumulative}')
+            lines.append(f'{name}_bucket{{{labels},le="+Inf"}} '
+                         f'{series.count}')
+            lines.append(f'{name}_sum{{{labels}}} {series.total * 1e-9:.9f}')
+            lines.append(f'{name}_count{{{labels}}} {series.count}')
+            errors.append(f'{prefix}_operation_errors_total{{{labels}}} '
+                          f'{series.errors}')
+        if errors:
+            lines.append(f'# HELP {prefix}_operation_errors_total Failed '
+                         'PT104 driver calls')
+            lines.append(f'# TYPE {prefix}_operation_errors_total counter')
+            lines.extend(errors)
+        return '\n'.join(lines) + '\n'
+
+
+METRICS = Metrics()
@@ -0,0 +1,190 @@
+""" Multi-resolution aggregates of channel samples
+
+Example::
+
+    rollups = RollupEngine()
+    unit.start_acquisition()
+    rollups.attach(unit)
+    ...
+    for aggregate in rollups.query(unit.id, 1, start, stop, points=500):
+        print(aggregate.start, aggregate.min, aggregate.mean, aggregate.max)
+
+Each channel keeps count, min, max, mean and variance of 1 second, 1 minute,
+1 hour and 1 day buckets. Every sample updates the current bucket of each
+resolution in constant time, finished buckets are kept in fixed size rings
+so memory is bounded.
+"""
+import threading
+from collections import deque, namedtuple
+import logging
+
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+Aggregate = namedtuple('Aggregate', 'start count min max mean variance')
+
+# Bucket seconds and number of buckets kept
+RESOLUTIONS = (
+    (1, 3600),            # 1 hour of seconds
+    (60, 1440),           # 1 day of minutes
+    (3600, 24 * 366),     # 1 year of hours
+    (86400, 366 * 10)     # 10 years of days
+)
+
+
+class _Level:
+    def __init__(self, resolution, size):
+        self.resolution = resolution
+        self.size = size
+        self.buckets = deque(maxlen=size)
+        # End of the last bucket dropped from the ring
+        self.dropped_until = None
+        self._bucket = None
+
+    def covers(self, start, stop):
+        """whether the kept buckets can hold every aggregate from start to
+        stop"""
+        if stop - start > self.resolution * self.size:
+            return False
+        return self.dropped_until is None or start >= self.dropped_until
+
+    def add(self, timestamp, value):
+        start = timestamp - timestamp % self.resolution
+        bucket = self._bucket
+        if bucket is None or bucket[0] != start:
+            if bucket is not None:
+                if start < bucket[0]:
+                    return False
+                if len(self.buckets) == self.size:
+                    self.dropped_until = self.buckets[0][0] + self.resolution
+                self.buckets.append(bucket)
+            self._bucket = [start, 1, value, value, value, 0.0]
+            return True
+        # Welford's update of mean and sum of squared deviations
+        count = bucket[1] + 1
+        delta = value - bucket[4]
+        mean = bucket[4] + delta / count
+        bucket[1] = count
+        if value < bucket[2]:
+            bucket[2] = value
+        if value > bucket[3]:
+            bucket[3] = value
+        bucket[4] = mean
+        bucket[5] += delta * (value - mean)
+        return True
+
+    def query(self, start=None, stop=None):
+        buckets = list(self.buckets)
+        if self._bucket is not None:
+            buckets.append(list(self._bucket))
+        return [
+            Aggregate(bucket[0], bucket[1], bucket[2], bucket[3], bucket[4],
+                      bucket[5] / bucket[1])
+            for bucket in buckets
+            if ((start is None or bucket[0] + self.resolution > start) and
+                (stop is None or bucket[0] < stop))
+        ]
+
+
+class ChannelRollup:
+    """Aggregates of the samples of a channel at several resolutions
+
+    :param resolutions: (bucket seconds, buckets kept) pairs from finest to
+        coarsest
+    """
+    def __init__(self, resolutions=RESOLUTIONS):
+        self.levels = [_Level(resolution, size)
+                       for resolution, size in resolutions]
+        self._lock = threading.Lock()
+
+    @property
+    def resolutions(self):
+        return [level.resolution for level in self.levels]
+
+    def add(self, timestamp, value):
+        """aggregate a sample, samples older than the current bucket of a
+        resolution are ignored by it"""
+        with self._lock:
+            for level in self.levels:
+                if not level.add(timestamp, value):
+                    logger.debug(f'Sample at {timestamp} too old for '
+                                 f'{level.resolution} s buckets')
+
+    def select(self, start, stop, points):
+        """coarsest resolution with at least points buckets between start
+        and stop, the finest one if none has enough
+
+        Only resolutions keeping buckets for the whole range are selected,
+        the one kept longest if none does.
+        """
+        with self._lock:
+            levels = [level for level in self.levels
+                      if level.covers(start, stop)]
+        if not levels:
+            return self.levels[-1].resolution
+        selected = levels[0]
+        for level in levels:
+            if (stop - start) / level.resolution >= points:
+                selected = level
+        return selected.resolution
+
+    def query(self, start=None, stop=None, points=None, resolution=None):
+        """aggregates of the buckets overlapping start <= time < stop
+
+        :param points: wanted number of aggregates, selects the resolution,
+            see :meth:`select`. Needs start and stop.
+        :param resolution: bucket seconds, the finest one by default
+        :return: list of Aggregate, oldest first
+        """
+        if points is not None:
+            resolution = self.select(start, stop, points)
+        with self._lock:
+            for level in self.levels:
+                if resolution is None or level.resolution == resolution:
+                    return level.query(start, stop)
+        raise ValueError(f'There are not {resolution} s aggregates')
+
+
+class RollupEngine:
+    """Rollups of the channels of many units
+
+    :param resolutions: see :class:`ChannelRollup`
+    """
+    def __init__(self, resolutions=RESOLUTIONS):
+        self.resolutions = resolutions
+        self._channels = {}
+        self._lock = threading.Lock()
+
+    def channel(self, unit_id, number):
+        """ChannelRollup of a channel of a unit"""
+        key = (unit_id, number)
+        with self._lock:
+            rollup = self._channels.get(key)
+            if rollup is None:
+                rollup = ChannelRollup(self.resolutions)
+                self._channels[key] = rollup
+        return rollup
+
+    def add(self, unit_id, number, timestamp, value):
+        self.channel(unit_id, number).add(timestamp, value)
+
+    def query(self, unit_id, number, start=None, stop=None, points=None,
+              resolution=None):
+        """see :meth:`ChannelRollup.query`"""
+        return self.channel(unit_id, number).query(start, stop, points,
+                                                   resolution)
+
+    def attach(self, unit):
+        """aggregate every sample acquired by unit, attaching again has no
+        effect, see :meth:`PT104.PT104.subscribe`"""
+        def aggregate(number, timestamp, value, status):
+            if not status:
+                self.add(unit.id, number, timestamp, value)
+
+        return unit.subscribe(self, aggregate)
+
+    def detach(self, unit):
+        """stop aggregating the samples acquired by unit"""
+        unit.unsubscribe(self)
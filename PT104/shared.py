@@ -0,0 +1,146 @@
+""" Latest value of every channel in shared memory
+
+Example::
+
+    # acquiring process
+    unit.start_acquisition(publish='pt104_AY429_026')
+
+    # any number of local reader processes
+    from PT104.shared import TableReader
+
+    table = TableReader('pt104_AY429_026')
+    reading = table.read(1)
+    if reading:
+        print(reading.timestamp, reading.value)
+
+The table has a header row and one row per channel of four 8 bytes words:
+sequence, timestamp, value and status. The writer makes the sequence odd
+while it updates a row and even again once done, a reader retries when the
+sequence is odd or changes while it reads the row (seqlock). Readers only
+touch the shared buffer, there is no system call nor copy per reading.
+"""
+from collections import namedtuple
+from multiprocessing import shared_memory
+import os
+import threading
+import time
+
+
+Reading = namedtuple('Reading', 'sequence timestamp value status')
+
+MAGIC = 0x50543130345348  # 'PT104SH'
+VERSION = 1
+_WORDS = 4
+_ROW_SIZE = 8 * _WORDS
+
+
+class _Table:
+    def _map(self, shm):
+        self._shm = shm
+        self._words = shm.buf.cast('Q')
+        self._floats = shm.buf.cast('d')
+
+    @property
+    def name(self):
+        return self._shm.name
+
+    @property
+    def channels(self):
+        return range(1, self._words[2] + 1)
+
+    def close(self):
+        if self._shm is None:
+            return
+        self._words.release()
+        self._floats.release()
+        self._shm.close()
+        self._shm = None
+
+
+class TablePublisher(_Table):
+    """Writer of the shared table, a listener of
+    :class:`PT104.acquisition.Acquisition`
+
+    :param name: name of the shared memory block, a random one by default
+    :param channels: number of channels of the table
+    """
+    def __init__(self, name=None, channels=4):
+        self._map(shared_memory.SharedMemory(
+            name, create=True, size=_ROW_SIZE * (channels + 1)
+        ))
+        self._lock = threading.Lock()
+        self._words[1] = VERSION
+        self._words[2] = channels
+        # Readers check the magic number last, once the header is complete
+        self._words[0] = MAGIC
+
+    def __call__(self, number, timestamp, value, status):
+        self.write(number, timestamp, value, status)
+
+    def write(self, number, timestamp, value, status=0):
+        index = number * _WORDS
+        with self._lock:
+            self._words[index] += 1
+            self._floats[index + 1] = timestamp
+            self._floats[index + 2] = value
+            self._words[index + 3] = int(status)
+            self._words[index] += 1
+
+    def unlink(self):
+        """close and remove the shared memory block"""
+        shm = self._shm
+        self.close()
+        if shm is not None:
+            shm.unlink()
+
+
+class TableReader(_Table):
+    """Maps the table of a TablePublisher of another, or the same, process
+
+    :param name: name of the shared memory block
+    """
+    RETRIES = 1000
+
+    def __init__(self, name):
+        shm = shared_memory.SharedMemory(name)
+        if os.name == 'posix':
+            # Readers must not remove the block of the publisher at exit
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(shm._name, 'shared_memory')
+        self._map(shm)
+        if self._words[0] != MAGIC or self._words[1] != VERSION:
+            self.close()
+            raise ValueError(f'{name} is not a PT104 table')
+
+    def read(self, number):
+        """last reading of channel or None if it has not any yet
+
+        :raises TimeoutError: the publisher did not complete its update
+        """
+        if number not in self.channels:
+            raise IndexError(f'Channel {number} is not in the table')
+        index = number * _WORDS
+        words = self._words
+        floats = self._floats
+        for _ in range(self.RETRIES):
+            sequence = words[index]
+            if not sequence & 1:
+                timestamp = floats[index + 1]
+                value = floats[index + 2]
+                status = words[index + 3]
+                if words[index] == sequence:
+                    if not sequence:
+                        return None
+                    return Reading(sequence // 2, timestamp, value, status)
+            # The publisher is updating the row, let it run
+            time.sleep(0)
+        raise TimeoutError(f'Channel {number} of {self.name} is locked')
+
+    def read_all(self):
+        """last reading of every channel with readings, by channel number"""
+        readings = {}
+        for number in self.channels:
+            reading = self.read(number)
+            if reading is not None:
+                readings[number] = reading
+        return readings
@@ -0,0 +1,304 @@
+""" Hardware free replacement of the usbpt104 shared library
+
+Example::
+
+    from PT104 import PT104, DataTypes
+    from PT104.simulator import SimulatedDriver
+    from PT104.usb import USBinterface
+
+    driver = SimulatedDriver(units=2, noise=0.005)
+    interface = USBinterface(driver=driver)
+    unit = PT104(driver.serials[0], interface)
+    unit.channels[1].data_type = DataTypes.PT100
+    unit.channels[1].activate()
+    print(unit.channels[1].value)
+
+The simulated units convert their active channels one after the other,
+taking ``conversion_time`` seconds each like the real PT-104 does.
+"""
+import random
+import threading
+import time
+from . import DataTypes, PicoInfo, PicoStatus, CommunicationType
+from .usb import FACTORS
+
+
+def _value(arg):
+    """plain python value of a ctypes instance or a python object"""
+    return getattr(arg, 'value', arg)
+
+
+def _deref(ref):
+    """object referenced by ``ctypes.byref``"""
+    return getattr(ref, '_obj', ref)
+
+
+def _write_string(buffer, text):
+    encoded = text.encode()[:len(buffer) - 1]
+    buffer.value = encoded
+    return len(encoded)
+
+
+class SimulatedUnit:
+    """Virtual PT-104 unit
+
+    :param batch_and_serial: serial number reported by the unit
+    :param signals: measured value by channel number, in the units given by
+        :attr:`PT104.Channel.units`. Either a number or a callable receiving
+        the conversion time. 20.0 for every channel by default.
+    :param noise: standard deviation of a gaussian noise or a callable
+        receiving a ``random.Random`` and returning the noise to add
+    :param conversion_time: seconds to convert one channel
+    :param open_time: seconds the unit takes to open
+    :param seed: seed of the noise generator
+    """
+    def __init__(self, batch_and_serial, signals=None, noise=0.0,
+                 conversion_time=0.75, open_time=0.0, seed=None):
+        self.batch_and_serial = batch_and_serial
+        self.signals = signals or {}
+        self.noise = noise
+        self.conversion_time = conversion_time
+        self.open_time = open_time
+        self.cal_date = '01Jan25'
+        self.sixty_hertz = False
+        self.is_open = False
+        self._random = random.Random(seed)
+        self._channels = {number: DataTypes.OFF for number in range(1, 5)}
+        self._wires = {number: 2 for number in range(1, 5)}
+        self._cycle_start = time.monotonic()
+        self._conversions = {}
+
+    def set_channel(self, number, data_type, wires):
+        self._channels[number] = DataTypes(data_type)
+        self._wires[number] = wires
+        # The unit restarts its conversion cycle when reconfigured
+        self._cycle_start = time.monotonic()
+        self._conversions = {}
+
+    @property
+    def active_channels(self):
+        return [number for number, data_type in self._channels.items()
+                if data_type != DataTypes.OFF]
+
+    def _last_conversion(self, number):
+        """index and end time of the last finished conversion of a channel"""
+        active_channels = self.active_channels
+        if number not in active_channels:
+            return None, None
+        cycle = len(active_channels) * self.conversion_time
+        slot_end = (active_channels.index(number) + 1) * self.conversion_time
+        elapsed_time = time.monotonic() - self._cycle_start
+        if elapsed_time < slot_end:
+            return None, None
+        index = int((elapsed_time - slot_end) // cycle)
+        return index, self._cycle_start + slot_end + index * cycle
+
+    def _signal(self, number, conversion_time):
+        signal = self.signals.get(number, 20.0)
+        if callable(signal):
+            signal = signal(conversion_time)
+        if callable(self.noise):
+            return signal + self.noise(self._random)
+        if self.noise:
+            return self._random.gauss(signal, self.noise)
+        return signal
+
+    def get_value(self, number):
+        """raw value of the last conversion or None if there is none yet"""
+        index, conversion_time = self._last_conversion(number)
+        if index is None:
+            return None
+        conversion = self._conversions.get(number)
+        if conversion is None or conversion[0] != index:
+            value = self._signal(number, conversion_time)
+            factor = FACTORS[self._channels[number]]
+            conversion = (index, int(round(value / factor)))
+            self._conversions[number] = conversion
+        return conversion[1]
+
+    def get_info(self, info):
+        return {
+            PicoInfo.PICO_DRIVER_VERSION: 'Simulated 1.0',
+            PicoInfo.PICO_USB_VERSION: '2.0',
+            PicoInfo.PICO_HARDWARE_VERSION: '1',
+            PicoInfo.PICO_VARIANT_INFO: 'PT104',
+            PicoInfo.PICO_BATCH_AND_SERIAL: self.batch_and_serial,
+            PicoInfo.PICO_CAL_DATE: self.cal_date,
+            PicoInfo.PICO_KERNEL_DRIVER_VERSION: 'Simulated 1.0',
+            PicoInfo.PICO_MAC_ADDRESS: '00:00:00:00:00:00'
+        }[PicoInfo(info)]
+
+
+class SimulatedLibrary:
+    """Same call surface as the ``UsbPt104*`` functions of libusbpt104
+
+    Every function returns a PicoStatus code and writes its results in the
+    ctypes arguments, as the shared library does.
+    """
+    def __init__(self, units):
+        self.units = {unit.batch_and_serial: unit for unit in units}
+        self._handles = {}
+        self._next_handle = 1
+        self._errors = {}
+        self._lock = threading.Lock()
+
+    def inject_error(self, function_name, status, count=1):
+        """next ``count`` calls to function return status without effect
+
+        :param function_name: e.g. 'UsbPt104GetValue'
+        :param status: PicoStatus to return
+        """
+        self._errors[function_name] = [status] * count
+
+    def _injected_error(self, function_name):
+        errors = self._errors.get(function_name)
+        if errors:
+            return errors.pop()
+        return PicoStatus.PICO_OK
+
+    def _get_unit(self, handle):
+        return self._handles.get(_value(handle))
+
+    def UsbPt104Enumerate(self, details, length, communication_type):
+        status = self._injected_error('UsbPt104Enumerate')
+        if status:
+            return status
+        if not _value(communication_type) & CommunicationType.CT_USB:
+            _write_string(details, '')
+            return PicoStatus.PICO_OK
+        _write_string(details, ','.join(f'USB:{serial}'
+                                        for serial in self.units))
+        return PicoStatus.PICO_OK
+
+    def UsbPt104OpenUnit(self, handle, serial):
+        status = self._injected_error('UsbPt104OpenUnit')
+        if status:
+            return status
+        serial = _value(serial)
+        if isinstance(serial, bytes):
+            serial = serial.decode()
+        with self._lock:
+            if serial is None:
+                candidates = [unit for unit in self.units.values()
+                              if not unit.is_open]
+                unit = candidates[0] if candidates else None
+            else:
+                unit = self.units.get(serial)
+            if unit is None or unit.is_open:
+                return PicoStatus.PICO_NOT_FOUND
+
+            unit.is_open = True
+            unit_handle = self._next_handle
+            self._next_handle += 1
+        if unit.open_time:
+            time.sleep(unit.open_time)
+        self._handles[unit_handle] = unit
+        _deref(handle).value = unit_handle
+        return PicoStatus.PICO_OK
+
+    def UsbPt104CloseUnit(self, handle):
+        status = self._injected_error('UsbPt104CloseUnit')
+        if status:
+            return status
+        with self._lock:
+            unit = self._handles.pop(_value(handle), None)
+        if unit is None:
+            return PicoStatus.PICO_INVALID_HANDLE
+        unit.is_open = False
+        return PicoStatus.PICO_OK
+
+    def UsbPt104SetChannel(self, handle, channel, data_type, wires):
+        status = self._injected_error('UsbPt104SetChannel')
+        if status:
+            return status
+        unit = self._get_unit(handle)
+        if unit is None:
+            return PicoStatus.PICO_INVALID_HANDLE
+        channel = int(_value(channel))
+        if channel not in range(1, 5):
+            return PicoStatus.PICO_INVALID_CHANNEL
+        unit.set_channel(channel, int(_value(data_type)), int(_value(wires)))
+        return PicoStatus.PICO_OK
+
+    def UsbPt104GetValue(self, handle, channel, value, filtered):
+        status = self._injected_error('UsbPt104GetValue')
+        if status:
+            return status
+        unit = self._get_unit(handle)
+        if unit is None:
+            return PicoStatus.PICO_INVALID_HANDLE
+        channel = int(_value(channel))
+        if channel not in range(1, 5):
+            return PicoStatus.PICO_INVALID_CHANNEL
+        measurement = unit.get_value(channel)
+        if measurement is None:
+            return PicoStatus.PICO_NO_SAMPLES_AVAILABLE
+        _deref(value).value = measurement
+        return PicoStatus.PICO_OK
+
+    def UsbPt104GetUnitInfo(self, handle, string, string_length,
+                            required_size, info):
+        status = self._injected_error('UsbPt104GetUnitInfo')
+        if status:
+            return status
+        unit = self._get_unit(handle)
+        if unit is None:
+            return PicoStatus.PICO_INVALID_HANDLE
+        text = unit.get_info(_value(info))
+        _deref(required_size).value = len(text) + 1
+        _write_string(string, text)
+        return PicoStatus.PICO_OK
+
+    def UsbPt104SetMains(self, handle, sixty_hertz):
+        status = self._injected_error('UsbPt104SetMains')
+        if status:
+            return status
+        unit = self._get_unit(handle)
+        if unit is None:
+            return PicoStatus.PICO_INVALID_HANDLE
+        unit.sixty_hertz = bool(_value(sixty_hertz))
+        return PicoStatus.PICO_OK
+
+    def UsbPt104IpDetails(self, handle, enabled, address, length, port,
+                          action):
+        status = self._injected_error('UsbPt104IpDetails')
+        if status:
+            return status
+        unit = self._get_unit(handle)
+        if unit is None:
+            return PicoStatus.PICO_INVALID_HANDLE
+        # Simulated units have not ethernet port
+        _deref(enabled).value = 0
+        _deref(length).value = _write_string(address, '')
+        _deref(port).value = 0
+        return PicoStatus.PICO_OK
+
+
+class SimulatedDriver:
+    """Drop in replacement of :class:`PT104.usb.USBdriver`
+
+    :param units: number of virtual units or a list of SimulatedUnit
+    :param conversion_time: seconds to convert one channel
+    :param noise: noise model of the generated units, see SimulatedUnit
+    :param open_time: seconds each generated unit takes to open
+    :param seed: seed of the noise of the generated units
+    """
+    def __init__(self, units=1, conversion_time=0.75, noise=0.0,
+                 open_time=0.0, seed=None):
+        if isinstance(units, int):
+            units = [
+                SimulatedUnit(f'SIM{index // 1000:02d}/{index % 1000:03d}',
+                              noise=noise, conversion_time=conversion_time,
+                              open_time=open_time,
+                              seed=None if seed is None else seed + index)
+                for index in range(units)
+            ]
+        self.lib = SimulatedLibrary(units)
+
+    @property
+    def serials(self):
+        return list(self.lib.units)
+
+    @property
+    def units(self):
+        return list(self.lib.units.values())
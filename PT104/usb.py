@@ -1,7 +1,10 @@
 import ctypes as c
+import threading
+import time
 from ctypes.util import find_library
 from . import (PicoException, Channels, PicoInfo, CommunicationType, DataTypes,
                PicoStatus)
+from .metrics import METRICS
 
 
 class Singleton(type):
@@ -12,6 +15,21 @@ class Singleton(type):
         return cls._instances[cls]
 
 
+# Scale of raw device values to Temperature in °C, Resistance in mOhm and
+# Voltage in mV
+FACTORS = {
+    DataTypes.OFF: 0,
+    DataTypes.PT100: 1E-3,
+    DataTypes.PT1000: 1E-3,
+    DataTypes.RESISTANCE_TO_375R: 1E-3,
+    DataTypes.RESISTANCE_TO_10K: 1.0,
+    DataTypes.DIFFERENTIAL_TO_115MV: 1E-9,
+    DataTypes.DIFFERENTIAL_TO_2500MV: 1E-8,
+    DataTypes.SINGLE_ENDED_TO_115MV: 1E-9,
+    DataTypes.SINGLE_ENDED_TO_2500MV: 1E-8
+}
+
+
 class USBdriver(metaclass=Singleton):
     def __init__(self):
         # load the shared library
@@ -56,35 +74,98 @@ class USBdriver(metaclass=Singleton):
 
 
 
+class ChannelReader:
+    """Reads the last value of a channel with every call argument prebuilt
+
+    Handle, channel, output buffer, function pointer and scale factor are
+    resolved once, :meth:`read` only calls the driver and scales the value.
+    The reader does not wait for new conversions, and keeps the scale of
+    the data type the channel had when it was created. Each reader owns its
+    output buffer, do not share one between threads.
+    """
+    def __init__(self, lib, batch_and_serial, handle, channel, factor,
+                 low_pass_filter=False):
+        self.batch_and_serial = batch_and_serial
+        self.channel = channel
+        function = getattr(lib, 'UsbPt104GetValue')
+        func_ptr = getattr(lib, '_FuncPtr', None)
+        if func_ptr is not None:
+            # Own function pointer with plain ctypes argument types, to skip
+            # the enum conversion of the shared declaration
+            function = func_ptr(('UsbPt104GetValue', lib))
+            function.argtypes = [c.c_short, c.c_int, c.POINTER(c.c_long),
+                                 c.c_short]
+        self._function = function
+        self._measurement = c.c_long()
+        self._args = (c.c_short(handle.value), c.c_int(channel),
+                      c.byref(self._measurement),
+                      c.c_short(1 if low_pass_filter else 0))
+        self._factor = factor
+
+    def read(self):
+        timed = METRICS.enabled
+        if timed:
+            start = time.perf_counter_ns()
+        status = self._function(*self._args)
+        if timed:
+            METRICS.record('UsbPt104GetValue', self.batch_and_serial,
+                           self.channel, start, status != 0)
+        if status != 0:
+            raise PicoException(status, self.batch_and_serial,
+                                f'Channel: {self.channel}')
+        return self._measurement.value * self._factor
+
+
 class USBinterface:
     class __USBinterface:
         """Interface between connection and PT104 using a USB
         """
-        _HANDLES = {}
-        _FACTORS = {}
-
-        def __init__(self):
-            self.driver = USBdriver()
-            devices = self.discover_devices()
-            devices = [device[4:] for device in devices if device[:4] == 'USB:']
-            while devices:
-                self.open_unit(devices.pop())
-
-
-
-        def discover_devices(self, communication_type=CommunicationType.CT_USB):
+        DISCOVERY_TTL = 10
+
+        def __init__(self, driver=None):
+            # Nothing is loaded or opened until used, units are opened when
+            # a PT104 connects
+            self._driver = driver
+            self._HANDLES = {}
+            self._FACTORS = {}
+            self._discovered = {}
+            # Units may be opened and closed from several threads
+            self._lock = threading.Lock()
+            # Units being opened, other openings of the same unit wait
+            self._opening = set()
+            self._opened = threading.Condition(self._lock)
+
+        @property
+        def driver(self):
+            """driver of the interface, the shared library is loaded on
+            first use"""
+            if self._driver is None:
+                self._driver = USBdriver()
+            return self._driver
+
+        def discover_devices(self, communication_type=CommunicationType.CT_USB,
+                             refresh=False):
             """This function returns a list of all the attached PT-104 devices of the specified port type
 
+            Results are cached for ``DISCOVERY_TTL`` seconds.
+
             :param communication_type: type of the devices to discover (COMMUNICATION_TYPE)
-            :return: string
+            :param refresh: enumerate again even if the cache is still valid
+            :return: list of strings
             """
+            cached = self._discovered.get(communication_type)
+            if (cached and not refresh and
+                    time.monotonic() - cached[0] < self.DISCOVERY_TTL):
+                return list(cached[1])
+
             enum_len = c.c_ulong(256)
             enum_string = c.create_string_buffer(256)
 
             self.driver.lib.UsbPt104Enumerate(enum_string, enum_len,
                                           communication_type)
             enum  = enum_string.value.decode().split(',')
-            return enum
+            self._discovered[communication_type] = (time.monotonic(), enum)
+            return list(enum)
 
         def _get_handle(self, batch_and_serial):
             handle = self._HANDLES.get(batch_and_serial)
@@ -93,23 +174,42 @@ class USBinterface:
             return handle
 
         def open_unit(self, batch_and_serial):
-            if batch_and_serial in self._HANDLES:
-                return batch_and_serial
-
+            with self._lock:
+                # Different units open concurrently, the same unit once
+                while batch_and_serial in self._opening:
+                    self._opened.wait()
+                if batch_and_serial in self._HANDLES:
+                    return batch_and_serial
+                self._opening.add(batch_and_serial)
+            try:
+                return self._open_unit(batch_and_serial)
+            finally:
+                with self._lock:
+                    self._opening.discard(batch_and_serial)
+                    self._opened.notify_all()
+
+        def _open_unit(self, batch_and_serial):
             handle = c.c_short()
             serial = (batch_and_serial.encode() if type(batch_and_serial) is str
                       else batch_and_serial)
+            timed = METRICS.enabled
+            if timed:
+                start = time.perf_counter_ns()
             status = self.driver.lib.UsbPt104OpenUnit(c.byref(handle), serial)
+            if timed:
+                METRICS.record('UsbPt104OpenUnit', batch_and_serial, None,
+                               start, status != 0)
             if status != 0:
                 raise PicoException(status, batch_and_serial)
 
-            handles = [handle.value for handle in  self._HANDLES.values()]
-            if handle.value in handles:  # Handle is repeated driver
-                raise PicoException(PicoStatus.PICO_NOT_FOUND, batch_and_serial)
-            else:
+            with self._lock:
+                handles = [handle.value for handle in  self._HANDLES.values()]
+                if handle.value in handles:  # Handle is repeated driver
+                    raise PicoException(PicoStatus.PICO_NOT_FOUND,
+                                        batch_and_serial)
+                self._FACTORS[batch_and_serial] = [1] * 4
                 self._HANDLES[batch_and_serial] = handle
 
-            self._FACTORS[batch_and_serial] = [1] * 4
             return batch_and_serial
 
         def get_ip_details(self, batch_and_serial):
@@ -140,15 +240,29 @@ class USBinterface:
 
         def close_unit(self, batch_and_serial):
             handle = self._get_handle(batch_and_serial)
+            timed = METRICS.enabled
+            if timed:
+                start = time.perf_counter_ns()
             status = self.driver.lib.UsbPt104CloseUnit(handle)
+            if timed:
+                METRICS.record('UsbPt104CloseUnit', batch_and_serial, None,
+                               start, status != 0)
             if status != 0:
-                raise PicoException(status)
+                raise PicoException(status, batch_and_serial)
+            with self._lock:
+                del self._HANDLES[batch_and_serial]
 
         def set_channel(self, batch_and_serial, channel_number, data_type, wires):
             handle = self._get_handle(batch_and_serial)
+            timed = METRICS.enabled
+            if timed:
+                start = time.perf_counter_ns()
             status = self.driver.lib.UsbPt104SetChannel(
                 handle, channel_number, data_type, wires
             )
+            if timed:
+                METRICS.record('UsbPt104SetChannel', batch_and_serial,
+                               channel_number, start, status != 0)
             if status != 0:
                 raise PicoException(status, batch_and_serial,
                                     f'Setting channel {channel_number}')
@@ -160,34 +274,36 @@ class USBinterface:
         def get_value(self, batch_and_serial, channel, low_pass_filter=False):
             measurement = c.c_long()
             handle = self._get_handle(batch_and_serial)
+            timed = METRICS.enabled
+            if timed:
+                start = time.perf_counter_ns()
             status_channel = self.driver.lib.UsbPt104GetValue(
                 handle, channel, c.byref(measurement), low_pass_filter
             )
+            if timed:
+                METRICS.record('UsbPt104GetValue', batch_and_serial, channel,
+                               start, status_channel != 0)
             if status_channel != 0:
                 raise PicoException(status_channel, batch_and_serial)
 
             return measurement.value * self._FACTORS[batch_and_serial][channel - 1]
 
+        def get_reader(self, batch_and_serial, channel, low_pass_filter=False):
+            """fast path reader of a channel, see ChannelReader"""
+            return ChannelReader(
+                self.driver.lib, batch_and_serial,
+                self._get_handle(batch_and_serial), channel,
+                self._FACTORS[batch_and_serial][channel - 1], low_pass_filter
+            )
+
         def _get_factor(self, data_type):
             """scales the value from the device.
 
-            :param value: value to convert as float
-            :param channel: channel number (Channels)
-            :return: Temperature in °C, Resistance in mOhm, Voltage in mV
+            :param data_type: data type of the channel (DataTypes)
+            :return: factor to get Temperature in °C, Resistance in mOhm,
+                Voltage in mV
             """
-            if data_type in [DataTypes.PT100, DataTypes.PT1000,
-                             DataTypes.RESISTANCE_TO_375R]:
-                return 1E-3
-            if data_type == DataTypes.RESISTANCE_TO_10K:
-                return 1.0
-            if data_type in [DataTypes.DIFFERENTIAL_TO_115MV,
-                             DataTypes.SINGLE_ENDED_TO_115MV]:
-                return 1E-9  # mV
-            if data_type in [DataTypes.DIFFERENTIAL_TO_2500MV,
-                             DataTypes.SINGLE_ENDED_TO_2500MV]:
-                return 1E-8  # mV
-            if data_type == DataTypes.OFF:
-                return 0
+            return FACTORS[data_type]
 
         def set_mains(self, batch_and_serial, sixty_hertz=False):
             handle = self._get_handle(batch_and_serial)
@@ -195,7 +311,13 @@ class USBinterface:
                 sixty_hertz = c.c_ushort(1)
             else:
                 sixty_hertz = c.c_ushort(0)
-            self.driver.lib.UsbPt104SetMains(handle, sixty_hertz)
+            timed = METRICS.enabled
+            if timed:
+                start = time.perf_counter_ns()
+            status = self.driver.lib.UsbPt104SetMains(handle, sixty_hertz)
+            if timed:
+                METRICS.record('UsbPt104SetMains', batch_and_serial, None,
+                               start, status != 0)
 
         def _get_info(self, handle, info_id):
             info_len = c.c_short(256)
@@ -205,7 +327,11 @@ class USBinterface:
                                             c.byref(req_len), info_id)
             return info_string.value.decode()
 
-        def get_info(self, batch_and_serial):
+        def get_info(self, batch_and_serial, keys=None):
+            """info of the unit
+
+            :param keys: only query these keys, all of them by default
+            """
             handle = self._get_handle(batch_and_serial)
             info = {
                 'driver_version': PicoInfo.PICO_DRIVER_VERSION,
@@ -218,12 +344,24 @@ class USBinterface:
             }
 
             return {key: self._get_info(handle, value)
-                    for key, value in info.items()}
+                    for key, value in info.items()
+                    if keys is None or key in keys}
 
     instance = None
-    def __init__(self):
-        if not USBinterface.instance:
-            USBinterface.instance = USBinterface.__USBinterface()
+    def __init__(self, driver=None):
+        """
+        :param driver: driver exposing the ``lib.UsbPt104*`` functions, the
+            usbpt104 shared library by default. Passing a different driver,
+            e.g. :class:`PT104.simulator.SimulatedDriver`, replaces the
+            current instance.
+        """
+        if (not USBinterface.instance or
+                (driver is not None and
+                 USBinterface.instance._driver is not driver)):
+            USBinterface.instance = USBinterface.__USBinterface(driver)
+        # Keep the instance this wrapper was created with even if a later
+        # wrapper replaces it
+        self.instance = USBinterface.instance
 
     def __getattr__(self, name):
         return getattr(self.instance, name)
@@ -0,0 +1,50 @@
+""" Parsing and conversion of Ethernet measurement frames
+
+Run from the repository root with ``python -m benchmarks.bench_ethernet``
+
+Frames are generated by the emulator, no socket is involved.
+"""
+from PT104 import DataTypes, Wires
+from PT104.emulator import EmulatedUnit
+from PT104.ethernet import FrameDecoder, ChannelCalculator, get_values, np
+from .common import result, rate, print_results
+
+
+FRAMES = 10000
+
+
+def collect(quick=False):
+    frames = FRAMES // 10 if quick else FRAMES
+    unit = EmulatedUnit(resistances={number: 100 + number
+                                     for number in range(1, 5)},
+                        noise=0.01, seed=0)
+    capture = b''.join(unit.get_frame(index % 4 + 1, index)
+                       for index in range(frames))
+    decoder = FrameDecoder(size=frames)
+    results = {
+        'ethernet.decode': result(rate(
+            lambda: decoder.decode_many(capture), frames
+        ), 'frames/s'),
+    }
+
+    calculator = ChannelCalculator(1000, DataTypes.PT100, Wires.WIRES_4)
+    calculator.measurements = decoder.latest(1)
+    results['ethernet.channel_value'] = result(rate(
+        calculator.get_value, number=frames
+    ), 'conversions/s')
+    if np is not None:
+        raw = decoder.window(1)
+        count = len(raw) // 4
+        results['ethernet.values_vectorized'] = result(rate(
+            lambda: get_values(raw, 1000, DataTypes.PT100, Wires.WIRES_4),
+            count
+        ), 'conversions/s')
+    return results
+
+
+def run():
+    print_results(collect())
+
+
+if __name__ == '__main__':
+    run()
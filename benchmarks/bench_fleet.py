@@ -0,0 +1,71 @@
+""" End to end throughput of a Fleet of simulated units
+
+Run from the repository root with ``python -m benchmarks.bench_fleet``
+
+Every unit converts its four channels with a short conversion time, the
+throughput is the rate of samples delivered by :meth:`Fleet.samples`.
+"""
+import time
+from PT104 import PT104, DataTypes
+from PT104.fleet import Fleet
+from PT104.simulator import SimulatedDriver
+from PT104.usb import USBinterface
+from .common import result, print_results
+
+
+UNIT_COUNTS = (1, 10, 100)
+CONVERSION_TIME = 0.001
+DURATION = 2
+
+
+def measure(unit_count, duration):
+    driver = SimulatedDriver(units=unit_count,
+                             conversion_time=CONVERSION_TIME)
+    interface = USBinterface(driver=driver)
+    units = []
+    for serial in driver.serials:
+        unit = PT104(serial, interface)
+        unit.scheduler.CONVERSION_TIME = CONVERSION_TIME
+        unit.scheduler.MIN_WARM_UP = 5 * CONVERSION_TIME
+        unit.scheduler.WARM_UP_FACTOR = 0
+        for channel in unit.channels.values():
+            channel.data_type = DataTypes.PT100
+            channel.activate()
+        units.append(unit)
+
+    fleet = Fleet(units, max_workers=unit_count)
+    fleet.start()
+    samples = 0
+    sampled_units = set()
+    start = time.perf_counter()
+    for sample in fleet.samples(timeout=1):
+        samples += 1
+        sampled_units.add(sample.unit)
+        if time.perf_counter() - start > duration:
+            break
+    elapsed = time.perf_counter() - start
+    fleet.stop()
+    for unit in units:
+        unit.disconnect()
+    if len(sampled_units) != unit_count:
+        raise RuntimeError(f'Only {len(sampled_units)} of {unit_count} '
+                           f'units produced samples')
+    return samples / elapsed
+
+
+def collect(quick=False):
+    unit_counts = UNIT_COUNTS[:2] if quick else UNIT_COUNTS
+    duration = DURATION / 4 if quick else DURATION
+    return {
+        f'fleet.units_{unit_count}': result(measure(unit_count, duration),
+                                            'samples/s')
+        for unit_count in unit_counts
+    }
+
+
+def run():
+    print_results(collect())
+
+
+if __name__ == '__main__':
+    run()
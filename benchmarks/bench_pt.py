@@ -0,0 +1,57 @@
+""" Conversions of PtCalculator, forward and inverse
+
+Run from the repository root with ``python -m benchmarks.bench_pt``
+"""
+import random
+from PT104.PT import PtCalculator, np
+from .common import result, rate, print_results
+
+
+SAMPLES = 10000
+
+
+def collect(quick=False):
+    samples = SAMPLES // 10 if quick else SAMPLES
+    generator = random.Random(0)
+    calculator = PtCalculator(100)
+    temperatures = [generator.uniform(-200, 850) for _ in range(samples)]
+    resistances = [calculator.get_resistance(t) for t in temperatures]
+    calculator.lookup_temperature(100)  # builds the table out of the timing
+
+    results = {
+        'pt.forward': result(rate(
+            lambda: [calculator.get_resistance(t) for t in temperatures],
+            samples
+        ), 'conversions/s'),
+        'pt.inverse': result(rate(
+            lambda: [calculator.get_temperature(r) for r in resistances],
+            samples
+        ), 'conversions/s'),
+        'pt.inverse_table': result(rate(
+            lambda: [calculator.lookup_temperature(r) for r in resistances],
+            samples
+        ), 'conversions/s'),
+        'pt.inverse_table_error': result(max(
+            abs(calculator.lookup_temperature(r) -
+                calculator.get_temperature(r))
+            for r in resistances
+        ), '°C', 'lower'),
+    }
+    if np is not None:
+        array = np.array(resistances)
+        results['pt.inverse_vectorized'] = result(rate(
+            lambda: calculator.get_temperatures(array), samples
+        ), 'conversions/s')
+        array = np.array(temperatures)
+        results['pt.forward_vectorized'] = result(rate(
+            lambda: calculator.get_resistances(array), samples
+        ), 'conversions/s')
+    return results
+
+
+def run():
+    print_results(collect())
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,65 @@
+""" Read path of a channel: Channel.value, USBinterface.get_value and a
+prebuilt ChannelReader
+
+Run from the repository root with ``python -m benchmarks.bench_reader``
+
+It runs against the simulated driver, and then against a driver call
+returning immediately to isolate the overhead of the python side of each
+path. Neither shows the latency of the hardware. Channel.value runs with a
+conversion time of zero, so it measures the scheduling overhead only.
+"""
+import time
+from PT104 import PT104, DataTypes
+from PT104.simulator import SimulatedDriver
+from PT104.usb import USBinterface
+from .common import result, rate, print_results
+
+
+CALLS = 100000
+
+
+def collect(quick=False):
+    calls = CALLS // 10 if quick else CALLS
+    driver = SimulatedDriver(units=1, conversion_time=0.001)
+    interface = USBinterface(driver=driver)
+    unit = PT104(driver.serials[0], interface)
+    unit.scheduler.CONVERSION_TIME = 0
+    unit.scheduler.MIN_WARM_UP = 0
+    unit.scheduler.WARM_UP_FACTOR = 0
+    unit.channels[1].data_type = DataTypes.PT100
+    unit.channels[1].activate()
+    time.sleep(0.01)  # first conversion
+
+    results = {}
+    results.update(_compare(unit, 'reader.simulated', calls))
+    driver.lib.UsbPt104GetValue = lambda *args: 0
+    results.update(_compare(unit, 'reader.immediate', calls))
+    unit.disconnect()
+    return results
+
+
+def _compare(unit, prefix, calls):
+    reader = unit.channels[1].get_reader()
+    serial = unit.id
+    get_value = unit.interface.get_value
+    channel = unit.channels[1]
+
+    return {
+        f'{prefix}.channel_value': result(rate(
+            lambda: channel.value, number=calls // 10, repeat=3
+        ), 'calls/s'),
+        f'{prefix}.get_value': result(rate(
+            lambda: get_value(serial, 1), number=calls, repeat=3
+        ), 'calls/s'),
+        f'{prefix}.channel_reader': result(rate(
+            reader.read, number=calls, repeat=3
+        ), 'calls/s'),
+    }
+
+
+def run():
+    print_results(collect())
+
+
+if __name__ == '__main__':
+    run()
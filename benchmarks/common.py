@@ -0,0 +1,27 @@
+""" Helpers shared by the benchmarks """
+import timeit
+
+
+def result(value, unit, better='higher'):
+    """one measurement of a benchmark
+
+    :param better: 'higher' or 'lower', direction of an improvement
+    """
+    return {'value': value, 'unit': unit, 'better': better}
+
+
+def rate(function, items=1, number=1, repeat=5):
+    """best rate of items processed per second by function
+
+    :param items: items processed by a call of function
+    :param number: calls per timing
+    """
+    best = min(timeit.repeat(function, number=number, repeat=repeat))
+    return items * number / best
+
+
+def print_results(results):
+    for name, measurement in results.items():
+        value = measurement['value']
+        text = f'{value:,.0f}' if abs(value) >= 100 else f'{value:.3g}'
+        print(f'{name:<40} {text:>14} {measurement["unit"]}')
@@ -0,0 +1,109 @@
+""" Runs every benchmark and writes the results as JSON
+
+Run from the repository root with::
+
+    python -m benchmarks.run --output results.json
+    python -m benchmarks.run --compare results.json
+
+The JSON file keeps the commit, python version and platform next to the
+results, so runs of different commits can be compared. With ``--compare``
+the run fails when a result is worse than the baseline by more than the
+threshold. Quick runs are only compared with quick baselines.
+"""
+import argparse
+import datetime
+import importlib
+import json
+import platform
+import subprocess
+import sys
+from .common import print_results
+
+
+BENCHMARKS = ('bench_pt', 'bench_reader', 'bench_ethernet', 'bench_fleet')
+
+
+def _commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'],
+                              capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def collect(names=BENCHMARKS, quick=False):
+    results = {}
+    for name in names:
+        module = importlib.import_module(f'{__package__}.{name}')
+        results.update(module.collect(quick))
+    return {
+        'commit': _commit(),
+        'date': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'quick': quick,
+        'results': results
+    }
+
+
+def compare(baseline, run, threshold):
+    """print changes against baseline
+
+    :return: names of the results worse than threshold
+    """
+    regressions = []
+    for name, measurement in run['results'].items():
+        previous = baseline['results'].get(name)
+        if previous is None or not previous['value']:
+            continue
+        ratio = measurement['value'] / previous['value']
+        if measurement['better'] == 'lower':
+            change = 1 / ratio - 1 if ratio else float('inf')
+        else:
+            change = ratio - 1
+        flag = ''
+        if change < -threshold:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        print(f'{name:<40} {change:+8.1%}{flag}')
+    return regressions
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--output', help='JSON file to write the results')
+    parser.add_argument('--compare', help='JSON file of a baseline run')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='relative change considered a regression')
+    parser.add_argument('--quick', action='store_true',
+                        help='smaller workloads, e.g. for CI smoke runs')
+    parser.add_argument('--only', nargs='+', choices=BENCHMARKS,
+                        default=BENCHMARKS, help='benchmarks to run')
+    args = parser.parse_args(args)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+        if bool(baseline.get('quick')) != args.quick:
+            parser.error(f'{args.compare} is a '
+                         f'{"quick" if baseline.get("quick") else "full"} '
+                         f'run, it can not be compared with a '
+                         f'{"quick" if args.quick else "full"} run')
+
+    run = collect(args.only, args.quick)
+    print_results(run['results'])
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(run, output, indent=2)
+    if baseline is not None:
+        print(f'\nchanges from {baseline.get("commit")}')
+        if compare(baseline, run, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -27,6 +27,7 @@ setup(
     platforms=['OS Independent'],
     classifiers=CLASSIFIERS,
     install_requires=[],
+    extras_require={'numpy': ['numpy']},
     packages=find_packages(exclude=["project", "project.*"]),
     include_package_data=True,
     test_suite='runtests.main',
@@ -0,0 +1,68 @@
+import pytest
+from PT104.PT import PtCalculator
+
+
+np = pytest.importorskip('numpy')
+
+
+class A_PtCalculator:
+    def should_convert_temperatures_in_batch_like_scalar_path(self):
+        calculator = PtCalculator(100)
+        temperatures = np.linspace(-200, 850, 2001)
+        resistances = calculator.get_resistances(temperatures)
+
+        batch = calculator.get_temperatures(resistances)
+        scalar = [calculator.get_temperature(r) for r in resistances]
+
+        assert np.max(np.abs(batch - scalar)) < 1e-7
+        assert np.max(np.abs(batch - temperatures)) < 1e-7
+
+    def should_convert_resistances_in_batch_like_scalar_path(self):
+        calculator = PtCalculator(1000)
+        temperatures = [-150.5, -0.1, 0, 25.3, 600]
+
+        batch = calculator.get_resistances(temperatures)
+
+        for temperature, resistance in zip(temperatures, batch):
+            assert resistance == calculator.get_resistance(temperature)
+
+    def should_return_nominal_resistance_at_zero_degrees(self):
+        calculator = PtCalculator(100)
+
+        assert calculator.get_temperatures([100.0])[0] == 0
+
+    def should_lookup_temperatures_within_table_accuracy(self):
+        calculator = PtCalculator(1000, table_accuracy=1e-3)
+
+        for temperature in np.linspace(-199.9, 849.9, 997):
+            resistance = calculator.get_resistance(temperature)
+            assert abs(calculator.lookup_temperature(resistance) -
+                       temperature) < 1e-3
+
+    def should_share_table_between_pt100_and_pt1000(self):
+        assert PtCalculator(100).table is PtCalculator(1000).table
+
+    def should_raise_when_resistance_is_out_of_table(self):
+        calculator = PtCalculator(100)
+        try:
+            calculator.lookup_temperature(1000)
+            assert False
+        except ValueError:
+            pass
+
+    def should_reject_resistances_out_of_range_like_scalar_path(self):
+        calculator = PtCalculator(100)
+        resistance = 8 * calculator.r_0
+
+        with pytest.raises(Exception, match='Not found temperature'):
+            calculator.get_temperature(resistance)
+        with pytest.raises(Exception, match='Not found temperature'):
+            calculator.get_temperatures([100, resistance])
+
+    def should_keep_deprecated_derivative_name(self):
+        calculator = PtCalculator(100)
+
+        with pytest.deprecated_call():
+            value = calculator.get__dresistance__dtemperature(25)
+
+        assert value == calculator.get_dresistance_dtemperature(25)
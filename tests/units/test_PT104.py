@@ -1,6 +1,8 @@
 from unittest.mock import Mock, patch
 import time
-from PT104 import PT104, DataTypes, Channel, PicoException, PicoStatus
+import threading
+from PT104 import (PT104, DataTypes, Wires, Channel, PicoException,
+                   PicoStatus, ConversionScheduler)
 
 
 class A_Channel:
@@ -188,3 +190,165 @@ class A_PT104:
         assert pt104.is_converting
         assert value == interface.get_value.return_value
         interface.get_value.assert_called_with(id, 1, True)
+
+
+class A_ConversionScheduler:
+    def _create_scheduler(self, active_channels_count=2):
+        logger = Mock()
+        logger.active_channels_count = active_channels_count
+        scheduler = ConversionScheduler(logger)
+        scheduler.CONVERSION_TIME = 0.05
+        scheduler.MIN_WARM_UP = 0.1
+        scheduler.WARM_UP_FACTOR = 0
+        return scheduler
+
+    def should_wait_for_warm_up_and_then_one_cycle(self):
+        scheduler = self._create_scheduler()
+        scheduler.warm_up(1)
+
+        start = time.time()
+        scheduler.wait(1)
+        assert round(time.time() - start, 1) == 0.1
+
+        start = time.time()
+        scheduler.wait(1)
+        assert round(time.time() - start, 2) == 0.1
+
+    def should_schedule_channels_independently(self):
+        scheduler = self._create_scheduler()
+        scheduler.warm_up(1)
+        scheduler.wait(1)
+        scheduler.warm_up(2)
+
+        assert scheduler.next_query(1) < scheduler.next_query(2)
+
+    def should_wake_waiter_when_channel_is_discarded(self):
+        scheduler = self._create_scheduler()
+        scheduler.MIN_WARM_UP = 10
+        scheduler.warm_up(1)
+        errors = []
+
+        def wait():
+            try:
+                scheduler.wait(1)
+            except PicoException as p:
+                errors.append(p.status)
+
+        thread = threading.Thread(target=wait)
+        thread.start()
+        time.sleep(0.05)
+        scheduler.discard(1)
+        thread.join(1)
+
+        assert errors == [PicoStatus.PICO_INVALID_CHANNEL]
+
+
+class A_PT104_reading_all_channels:
+    def _create_unit(self):
+        interface = Mock()
+        interface.get_value.side_effect = lambda id, number, lpf: number * 10
+        pt104 = PT104('tracking', interface)
+        pt104.scheduler.CONVERSION_TIME = 0.05
+        pt104.scheduler.MIN_WARM_UP = 0
+        pt104.scheduler.WARM_UP_FACTOR = 0
+        for number in (1, 2, 3):
+            pt104.channels[number].data_type = DataTypes.PT100
+            pt104.channels[number].activate()
+        return pt104
+
+    def should_read_all_active_channels_within_one_cycle(self):
+        pt104 = self._create_unit()
+        pt104.read_all()
+
+        start = time.time()
+        timestamp, values = pt104.read_all()
+
+        assert values == {1: 10, 2: 20, 3: 30}
+        assert time.time() - start < 2 * 3 * 0.05
+        assert timestamp >= start
+
+    def should_read_a_subset_of_channels(self):
+        pt104 = self._create_unit()
+
+        timestamp, values = pt104.read_all(channels=[3, 1])
+
+        assert values == {1: 10, 3: 30}
+
+    def should_refuse_reading_inactive_channels(self):
+        pt104 = self._create_unit()
+        try:
+            pt104.read_all(channels=[4])
+            assert False
+        except PicoException as p:
+            assert p.status == PicoStatus.PICO_INVALID_CHANNEL
+
+
+class A_PT104_configuring_channels:
+    def _create_unit(self):
+        interface = Mock()
+        interface.open_unit.return_value = 'configuring'
+        pt104 = PT104('configuring', interface)
+        pt104.scheduler.MIN_WARM_UP = 1
+        pt104.scheduler.WARM_UP_FACTOR = 0
+        return pt104
+
+    def should_set_channels_with_a_single_warm_up(self):
+        pt104 = self._create_unit()
+
+        changed = pt104.configure({
+            1: (DataTypes.PT100, Wires.WIRES_4),
+            2: (DataTypes.PT1000, Wires.WIRES_3)
+        })
+
+        assert changed == [1, 2]
+        assert pt104.interface.set_channel.call_count == 2
+        pt104.interface.set_channel.assert_called_with(
+            'configuring', 2, DataTypes.PT1000, Wires.WIRES_3
+        )
+        assert pt104.active_channels_count == 2
+        assert pt104.scheduler.next_query(1) == pt104.scheduler.next_query(2)
+
+    def should_only_send_changed_channels(self):
+        pt104 = self._create_unit()
+        pt104.configure({1: (DataTypes.PT100, Wires.WIRES_4),
+                         2: (DataTypes.PT100, Wires.WIRES_4)})
+        pt104.interface.set_channel.reset_mock()
+
+        assert pt104.configure({1: (DataTypes.PT100, Wires.WIRES_4)}) == []
+        changed = pt104.configure({1: (DataTypes.PT100, Wires.WIRES_4),
+                                   2: DataTypes.OFF,
+                                   3: DataTypes.PT1000})
+
+        assert changed == [2, 3]
+        assert [call.args for call in
+                pt104.interface.set_channel.call_args_list] == [
+            ('configuring', 2, DataTypes.OFF, Wires.WIRES_4),
+            ('configuring', 3, DataTypes.PT1000, Wires.WIRES_2)
+        ]
+        assert not pt104.channels[2].is_active
+        assert pt104.scheduler.next_query(2) is None
+        assert pt104.scheduler.next_query(1) == pt104.scheduler.next_query(3)
+
+    def should_restore_channels_when_unit_refuses_a_setup(self):
+        pt104 = self._create_unit()
+        pt104.configure({1: (DataTypes.PT100, Wires.WIRES_4)})
+
+        def set_channel(id, number, data_type, wires):
+            if number == 3 and data_type != DataTypes.OFF:
+                raise PicoException(PicoStatus.PICO_INVALID_PARAMETER, id)
+        pt104.interface.set_channel.side_effect = set_channel
+
+        try:
+            pt104.configure({1: (DataTypes.PT1000, Wires.WIRES_3),
+                             3: (DataTypes.PT100, Wires.WIRES_4)})
+            assert False
+        except PicoException as p:
+            assert p.status == PicoStatus.PICO_INVALID_PARAMETER
+
+        assert pt104.channels[1].data_type == DataTypes.PT100
+        assert pt104.channels[1].wires == Wires.WIRES_4
+        assert pt104.channels[1].is_active
+        assert not pt104.channels[3].is_active
+        pt104.interface.set_channel.assert_called_with(
+            'configuring', 3, DataTypes.OFF, Wires.WIRES_2
+        )
@@ -0,0 +1,155 @@
+from unittest.mock import Mock
+import time
+from PT104 import PT104, DataTypes
+from PT104.acquisition import RingBuffer
+
+
+class A_RingBuffer:
+    def should_keep_only_last_samples(self):
+        buffer = RingBuffer(3)
+        assert buffer.latest() is None
+
+        for index in range(5):
+            buffer.append(index, index * 10)
+
+        assert len(buffer) == 3
+        assert buffer.count == 5
+        assert buffer.latest() == (4, 40)
+        timestamps, values = buffer.window()
+        assert list(timestamps) == [2, 3, 4]
+        assert list(values) == [20, 30, 40]
+
+    def should_slice_window_by_count_and_time(self):
+        buffer = RingBuffer(4)
+        for index in range(6):
+            buffer.append(index, index)
+
+        assert list(buffer.window(count=2)[0]) == [4, 5]
+        assert list(buffer.window(since=3.5)[1]) == [4, 5]
+
+
+class An_Acquisition:
+    def should_fill_channel_buffers_in_background(self):
+        interface = Mock()
+        interface.get_value.side_effect = lambda id, number, lpf: number
+        pt104 = PT104('tracking', interface)
+        pt104.scheduler.CONVERSION_TIME = 0.01
+        pt104.scheduler.MIN_WARM_UP = 0
+        pt104.scheduler.WARM_UP_FACTOR = 0
+        for number in (1, 2):
+            pt104.channels[number].data_type = DataTypes.PT100
+            pt104.channels[number].activate()
+
+        pt104.start_acquisition(size=10)
+        time.sleep(0.3)
+        buffers = pt104.acquisition.buffers
+        pt104.stop_acquisition()
+
+        assert buffers[1].latest()[1] == 1
+        assert buffers[2].latest()[1] == 2
+        assert buffers[3].latest() is None
+        assert pt104.acquisition is None
+
+    def should_serve_latest_sample_without_waiting(self):
+        interface = Mock()
+        interface.get_value.side_effect = lambda id, number, lpf: number
+        pt104 = PT104('tracking', interface)
+        pt104.scheduler.CONVERSION_TIME = 0.01
+        pt104.scheduler.MIN_WARM_UP = 0
+        pt104.scheduler.WARM_UP_FACTOR = 0
+        pt104.channels[2].data_type = DataTypes.PT100
+        pt104.channels[2].activate()
+
+        pt104.start_acquisition(size=10)
+        time.sleep(0.3)
+        start = time.time()
+        timestamp, value = pt104.channels[2].latest
+        elapsed_time = time.time() - start
+        timestamps, values = pt104.channels[2].window()
+        pt104.stop_acquisition()
+
+        assert value == 2
+        assert elapsed_time < 0.01
+        assert len(values) == 10
+
+    def should_keep_polling_after_unexpected_errors(self):
+        interface = Mock()
+        values = iter([ValueError('bad reply')])
+
+        def get_value(id, number, lpf):
+            error = next(values, None)
+            if error:
+                raise error
+            return number
+
+        interface.get_value.side_effect = get_value
+        pt104 = PT104('tracking', interface)
+        pt104.scheduler.CONVERSION_TIME = 0.01
+        pt104.scheduler.MIN_WARM_UP = 0
+        pt104.scheduler.WARM_UP_FACTOR = 0
+        pt104.channels[1].data_type = DataTypes.PT100
+        pt104.channels[1].activate()
+
+        pt104.start_acquisition(size=10)
+        time.sleep(0.3)
+
+        assert pt104.acquisition.is_alive()
+        assert pt104.channels[1].latest[1] == 1
+        pt104.stop_acquisition()
+
+    def should_keep_unit_listeners_across_restarts(self):
+        interface = Mock()
+        interface.get_value.side_effect = lambda id, number, lpf: number
+        pt104 = PT104('tracking', interface)
+        pt104.scheduler.CONVERSION_TIME = 0.01
+        pt104.scheduler.MIN_WARM_UP = 0
+        pt104.scheduler.WARM_UP_FACTOR = 0
+        pt104.channels[1].data_type = DataTypes.PT100
+        pt104.channels[1].activate()
+        samples = []
+        pt104.listeners.append(lambda *sample: samples.append(sample))
+
+        pt104.start_acquisition(size=10)
+        pt104.stop_acquisition()
+        samples.clear()
+        pt104.start_acquisition(size=10)
+        time.sleep(0.1)
+        pt104.stop_acquisition()
+
+        assert samples
+        assert samples[-1][2] == 1
+
+    def should_stop_during_first_warm_up(self):
+        interface = Mock()
+        interface.get_value.side_effect = lambda id, number, lpf: number
+        pt104 = PT104('tracking', interface)
+        pt104.scheduler.CONVERSION_TIME = 0.01
+        pt104.scheduler.MIN_WARM_UP = 0.3
+        pt104.scheduler.WARM_UP_FACTOR = 0
+        pt104.channels[1].data_type = DataTypes.PT100
+        pt104.channels[1].activate()
+
+        pt104.start_acquisition(size=10)
+        time.sleep(0.05)
+        acquisition = pt104.acquisition
+        pt104.stop_acquisition()
+
+        assert not acquisition.is_alive()
+
+    def should_stop_promptly_while_waiting_for_a_conversion(self):
+        interface = Mock()
+        interface.get_value.side_effect = lambda id, number, lpf: number
+        pt104 = PT104('tracking', interface)
+        pt104.scheduler.MIN_WARM_UP = 5
+        pt104.channels[1].data_type = DataTypes.PT100
+        pt104.channels[1].activate()
+
+        pt104.start_acquisition(size=10)
+        time.sleep(0.05)
+        acquisition = pt104.acquisition
+        start = time.time()
+        pt104.stop_acquisition()
+
+        assert time.time() - start < 0.5
+        assert not acquisition.is_alive()
+        assert interface.get_value.call_count == 0
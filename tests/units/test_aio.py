@@ -0,0 +1,95 @@
+from unittest.mock import Mock
+import asyncio
+import time
+from PT104 import PT104, DataTypes
+from PT104.aio import AsyncPT104
+
+
+def _create_unit():
+    interface = Mock()
+    interface.get_value.side_effect = lambda id, number, lpf: number * 10
+    unit = PT104('tracking', interface)
+    unit.scheduler.CONVERSION_TIME = 0.02
+    unit.scheduler.MIN_WARM_UP = 0.05
+    unit.scheduler.WARM_UP_FACTOR = 0
+    return AsyncPT104(unit)
+
+
+async def _activate(unit, numbers):
+    await unit.connect()
+    for number in numbers:
+        unit.channels[number].data_type = DataTypes.PT100
+        await unit.channels[number].activate()
+
+
+class An_AsyncPT104:
+    def should_read_channel_after_warm_up(self):
+        async def run():
+            unit = _create_unit()
+            await _activate(unit, [1])
+            start = time.time()
+            value = await unit.channels[1].read()
+            return value, time.time() - start
+
+        value, elapsed_time = asyncio.run(run())
+
+        assert value == 10
+        assert elapsed_time >= 0.04
+
+    def should_read_all_channels(self):
+        async def run():
+            unit = _create_unit()
+            await _activate(unit, [1, 2, 4])
+            return await unit.read_all()
+
+        timestamp, values = asyncio.run(run())
+
+        assert values == {1: 10, 2: 20, 4: 40}
+
+    def should_stream_samples_of_active_channels(self):
+        async def run():
+            unit = _create_unit()
+            await _activate(unit, [1, 3])
+            samples = []
+            async for sample in unit.stream():
+                samples.append(sample)
+                if len(samples) == 6:
+                    break
+            return samples
+
+        samples = asyncio.run(run())
+
+        assert [number for _, number, _ in samples] == [1, 3] * 3
+        timestamps = [timestamp for timestamp, _, _ in samples]
+        assert timestamps == sorted(timestamps)
+
+    def should_wait_for_channels_to_stream(self):
+        async def run():
+            unit = _create_unit()
+            await _activate(unit, [])
+
+            async def first_sample():
+                async for sample in unit.stream():
+                    return sample
+
+            streaming = asyncio.ensure_future(first_sample())
+            await asyncio.sleep(0.05)
+            await _activate(unit, [2])
+            return await asyncio.wait_for(streaming, 1)
+
+        _, number, value = asyncio.run(run())
+
+        assert (number, value) == (2, 20)
+
+    def should_drive_many_units_from_one_loop(self):
+        async def run():
+            units = [_create_unit() for _ in range(20)]
+            for unit in units:
+                await _activate(unit, [1, 2])
+            return await asyncio.gather(*[unit.read_all() for unit in units])
+
+        start = time.time()
+        results = asyncio.run(run())
+
+        assert all(values == {1: 10, 2: 20} for _, values in results)
+        assert time.time() - start < 1
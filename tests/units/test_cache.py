@@ -0,0 +1,71 @@
+from PT104 import PT104
+from PT104.cache import InfoCache
+from PT104.emulator import EthernetEmulator, EmulatedUnit
+from PT104.ethernet import EthernetInterface
+from PT104.simulator import SimulatedDriver
+from PT104.usb import USBinterface
+
+
+class An_InfoCache:
+    def should_persist_entries_by_batch_and_serial(self, tmp_path):
+        path = str(tmp_path / 'units.json')
+        InfoCache(path).put({'batch_and_serial': 'AA1/1', 'cal_date': 'x'},
+                            alias='10.0.0.1:25')
+
+        cache = InfoCache(path)
+        assert cache.get('AA1/1')['cal_date'] == 'x'
+        assert cache.get('10.0.0.1:25')['batch_and_serial'] == 'AA1/1'
+        assert cache.get('BB2/2') is None
+
+    def should_invalidate_entry_when_cal_date_changes(self, tmp_path):
+        cache = InfoCache(str(tmp_path / 'units.json'))
+        cache.put({'batch_and_serial': 'AA1/1', 'cal_date': 'x'})
+
+        assert cache.get('AA1/1', cal_date='y') is None
+        assert cache.get('AA1/1') is None
+
+    def should_skip_info_queries_of_cached_usb_units(self, tmp_path):
+        cache = InfoCache(str(tmp_path / 'units.json'))
+        driver = SimulatedDriver(units=1)
+        interface = USBinterface(driver=driver)
+        get_unit_info = driver.lib.UsbPt104GetUnitInfo
+        calls = []
+        driver.lib.UsbPt104GetUnitInfo = (
+            lambda *args: calls.append(args) or get_unit_info(*args)
+        )
+        unit = PT104(driver.serials[0], interface, cache=cache)
+        unit.connect()
+        assert unit.info['variant_info'] == 'PT104'
+        assert len(calls) == 8
+        unit.disconnect()
+
+        unit.connect()
+        assert unit.info['variant_info'] == 'PT104'
+        assert len(calls) == 9
+
+        driver.units[0].cal_date = '02Feb26'
+        unit.disconnect()
+        unit.connect()
+        assert unit.info['cal_date'] == '02Feb26'
+        assert len(calls) == 17
+
+    def should_update_cached_ethernet_units_when_opened(self, tmp_path):
+        cache = InfoCache(str(tmp_path / 'units.json'))
+        emulator = EthernetEmulator()
+        emulator.start()
+        emulated_unit = EmulatedUnit('EMU03/001', calibrations=(5, 6, 7, 8))
+        address = emulator.add_unit(emulated_unit)
+        interface = EthernetInterface(cache=cache)
+
+        interface.open_unit(address)
+        interface.close_unit(address)
+        assert cache.get(address)['calibrations'] == [5, 6, 7, 8]
+
+        emulated_unit.calibrations = (1, 2, 3, 4)
+        emulated_unit.cal_date = '03MAR26'
+        interface.open_unit(address)
+        assert interface.get_info(address)['calibrations'] == [1, 2, 3, 4]
+        assert cache.get(address)['cal_date'] == '03MAR26'
+        assert cache.get(address)['calibrations'] == [1, 2, 3, 4]
+        interface.close_unit(address)
+        emulator.stop()
@@ -0,0 +1,181 @@
+import json
+import socket
+import threading
+import time
+import pytest
+from PT104 import (PT104, ConversionScheduler, DataTypes, PicoException,
+                   PicoStatus)
+from PT104.daemon import AcquisitionDaemon, DaemonInterface
+from PT104.simulator import SimulatedDriver
+from PT104.usb import USBinterface
+
+
+CONVERSION_TIME = 0.02
+
+
+@pytest.fixture
+def daemon(tmp_path, monkeypatch):
+    monkeypatch.setattr(ConversionScheduler, 'CONVERSION_TIME',
+                        CONVERSION_TIME)
+    monkeypatch.setattr(ConversionScheduler, 'MIN_WARM_UP',
+                        5 * CONVERSION_TIME)
+    monkeypatch.setattr(ConversionScheduler, 'WARM_UP_FACTOR', 0)
+    driver = SimulatedDriver(units=2, conversion_time=CONVERSION_TIME)
+    driver.units[0].signals = {1: 21.5, 2: 30.0}
+    driver.units[1].signals = {1: 40.0}
+    daemon = AcquisitionDaemon(str(tmp_path / 'pt104.sock'),
+                               USBinterface(driver=driver))
+    daemon.start()
+    daemon.clients = []
+    yield daemon
+    for unit in daemon.clients:
+        unit.disconnect()
+    daemon.stop()
+
+
+def _create_unit(daemon, batch_and_serial, channels=(1,)):
+    unit = PT104(batch_and_serial, DaemonInterface(daemon.path))
+    for number in channels:
+        unit.channels[number].data_type = DataTypes.PT100
+        unit.channels[number].activate()
+    daemon.clients.append(unit)
+    return unit
+
+
+class An_AcquisitionDaemon:
+    def should_share_a_unit_between_clients(self, daemon):
+        first = _create_unit(daemon, 'SIM00/000')
+        second = _create_unit(daemon, 'SIM00/000', channels=(2,))
+
+        assert first.channels[1].value == pytest.approx(21.5)
+        assert second.channels[2].value == pytest.approx(30.0)
+        assert second.info['batch_and_serial'] == 'SIM00/000'
+        assert list(daemon.units) == ['SIM00/000']
+
+    def should_close_unit_when_no_client_uses_it(self, daemon):
+        first = _create_unit(daemon, 'SIM00/000')
+        second = DaemonInterface(daemon.path)
+        second.open_unit('SIM00/000')
+
+        first.disconnect()
+        assert 'SIM00/000' in daemon.units
+        second.close()
+        time.sleep(0.2)
+        assert daemon.units == {}
+
+    def should_close_unit_of_client_leaving_while_it_opens(self, daemon):
+        daemon.interface.driver.units[0].open_time = 0.2
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(daemon.path)
+        sock.sendall(b'["open_unit", ["SIM00/000"]]\n')
+        time.sleep(0.05)
+        sock.close()
+
+        time.sleep(0.5)
+        assert daemon.units == {}
+
+    def should_serve_batched_queries(self, daemon):
+        first = _create_unit(daemon, 'SIM00/000', channels=(1, 2))
+        second = _create_unit(daemon, 'SIM00/001')
+        first.channels[1].value
+        second.channels[1].value
+        interface = DaemonInterface(daemon.path)
+        interface.open_unit('SIM00/000')
+        interface.open_unit('SIM00/001')
+
+        values = interface.get_values(
+            [('SIM00/000', 1), ('SIM00/000', 2), ('SIM00/001', 1),
+             ('SIM00/001', 3)], return_exceptions=True
+        )
+
+        assert values[:3] == [pytest.approx(21.5), pytest.approx(30.0),
+                              pytest.approx(40.0)]
+        assert values[3].status == PicoStatus.PICO_NO_SAMPLES_AVAILABLE
+        with pytest.raises(PicoException):
+            interface.get_values([('SIM00/001', 3)])
+
+    def should_refuse_units_not_opened_by_client(self, daemon):
+        _create_unit(daemon, 'SIM00/000')
+        interface = DaemonInterface(daemon.path)
+
+        with pytest.raises(PicoException) as error:
+            interface.get_value('SIM00/000', 1)
+        assert error.value.status == PicoStatus.PICO_INVALID_HANDLE
+        assert interface.discover_devices() == ['USB:SIM00/000',
+                                                'USB:SIM00/001']
+
+    def should_serve_clients_while_a_unit_opens(self, daemon):
+        first = _create_unit(daemon, 'SIM00/000')
+        first.channels[1].value
+        daemon.interface.driver.units[1].open_time = 0.5
+        slow = DaemonInterface(daemon.path)
+        opening = threading.Thread(target=slow.open_unit, args=('SIM00/001',))
+        opening.start()
+        time.sleep(0.1)
+
+        start = time.time()
+        assert first.interface.get_values([('SIM00/000', 1)]) == [
+            pytest.approx(21.5)
+        ]
+        assert time.time() - start < 0.2
+        opening.join()
+        slow.close()
+
+    def should_serve_clients_while_another_does_not_read(self, daemon):
+        first = _create_unit(daemon, 'SIM00/000')
+        first.channels[1].value
+        stalled = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        stalled.connect(daemon.path)
+        stalled.setblocking(False)
+        request = b'["discover_devices", [1]]\n' * 1000
+        try:
+            for _ in range(100):
+                stalled.send(request)
+        except BlockingIOError:
+            pass
+
+        start = time.time()
+        assert first.interface.get_values([('SIM00/000', 1)]) == [
+            pytest.approx(21.5)
+        ]
+        assert time.time() - start < 0.5
+        stalled.close()
+
+    def should_refuse_values_without_acquisition(self, daemon):
+        unit = _create_unit(daemon, 'SIM00/000')
+        unit.channels[1].value
+        daemon.units['SIM00/000'].stop_acquisition()
+
+        with pytest.raises(PicoException) as error:
+            unit.interface.get_value('SIM00/000', 1)
+        assert error.value.status == PicoStatus.PICO_OPERATION_FAILED
+
+    def should_refuse_to_replace_a_running_daemon(self, daemon):
+        with pytest.raises(FileExistsError):
+            AcquisitionDaemon(daemon.path, daemon.interface)
+
+
+    def should_replace_stale_socket(self, tmp_path):
+        path = str(tmp_path / 'pt104.sock')
+        stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        stale.bind(path)
+        stale.close()
+
+        daemon = AcquisitionDaemon(path, USBinterface(driver=SimulatedDriver()))
+        daemon.start()
+        assert DaemonInterface(path).discover_devices() == ['USB:SIM00/000']
+        daemon.stop()
+
+    def should_answer_malformed_requests(self, daemon):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(daemon.path)
+        reader = sock.makefile('rb')
+
+        for request in (b'["get_value", []]', b'["get_value", 3]',
+                        b'["open_unit", [1, 2, 3]]', b'["unknown", []]',
+                        b'not json'):
+            sock.sendall(request + b'\n')
+            assert json.loads(reader.readline())[0] == 'error'
+        assert daemon.is_alive()
+        reader.close()
+        sock.close()
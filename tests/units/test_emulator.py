@@ -0,0 +1,78 @@
+import socket
+import struct
+from PT104.emulator import EthernetEmulator, EmulatedUnit
+
+
+def _client(address):
+    host, port = address.split(':')
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.settimeout(1)
+    sock.connect((host, int(port)))
+    return sock
+
+
+def _request(sock, data):
+    sock.send(data)
+    return sock.recv(1024)
+
+
+class An_EthernetEmulator:
+    def setup_method(self, method):
+        self.emulator = EthernetEmulator()
+        self.emulator.start()
+
+    def teardown_method(self, method):
+        self.emulator.stop()
+
+    def should_answer_commands_of_locking_client(self):
+        unit = EmulatedUnit('EMU00/001', calibrations=(1, 2, 3, 4),
+                            cal_date='02FEB25')
+        sock = _client(self.emulator.add_unit(unit))
+
+        assert _request(sock, b'lock') == b'Lock Success'
+        assert _request(sock, b'\x34') == b'Alive'
+        assert _request(sock, b'\x30\xff') == b'Mains Changed'
+        assert unit.sixty_hertz
+        eeprom = _request(sock, b'\x32')
+        assert eeprom[:7] == b'Eeprom='
+        assert eeprom[7 + 19:7 + 29] == b'EMU00/001 '
+        assert eeprom[7 + 29:7 + 37] == b'02FEB25 '
+        assert struct.unpack('<4I', eeprom[7 + 37:7 + 53]) == (1, 2, 3, 4)
+        assert _request(sock, b'\x33') == b'Unlocked'
+
+    def should_refuse_lock_of_second_client(self):
+        address = self.emulator.add_unit(EmulatedUnit())
+        first, second = _client(address), _client(address)
+
+        assert _request(first, b'lock') == b'Lock Success'
+        assert _request(second, b'lock') == b'Lock Failed'
+
+    def should_stream_frames_of_active_channels(self):
+        unit = EmulatedUnit(resistances={1: 110.0, 3: 50.0},
+                            conversion_time=0.01)
+        sock = _client(self.emulator.add_unit(unit))
+        _request(sock, b'lock')
+
+        assert _request(sock, b'\x31\x05') == b'Converting'
+        frames = [sock.recv(1024) for _ in range(4)]
+
+        for frame, (number, resistance) in zip(frames, [(1, 110.0),
+                                                       (3, 50.0)] * 2):
+            h0, m0, h1, m1, h2, m2, h3, m3 = struct.unpack('>BIBIBIBI',
+                                                           frame)
+            assert h0 // 4 == number - 1
+            assert abs(1000 * (m3 - m2) / (m1 - m0) - resistance) < 1e-3
+
+    def should_serve_many_units_and_drop_frames(self):
+        units = [EmulatedUnit(conversion_time=0.01, loss=0.5, seed=index)
+                 for index in range(10)]
+        socks = [_client(self.emulator.add_unit(unit)) for unit in units]
+        for sock in socks:
+            _request(sock, b'lock')
+            _request(sock, b'\x31\x0f')
+
+        for sock in socks:
+            for _ in range(5):
+                assert len(sock.recv(1024)) == 20
+
+        assert all(unit.frames_dropped for unit in units)
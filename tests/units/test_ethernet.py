@@ -0,0 +1,212 @@
+from unittest.mock import patch
+import socket
+import time
+import numpy as np
+from PT104 import PT104, DataTypes, Wires, PicoException, PicoStatus
+from PT104.PT import PtCalculator
+from PT104.emulator import EthernetEmulator, EmulatedUnit
+from PT104.ethernet import (EthernetInterface, ChannelCalculator, Connection,
+                            FrameDecoder, get_values)
+
+
+class A_ChannelCalculator:
+    def should_convert_measurements_to_temperature(self):
+        resistance = PtCalculator(100).get_resistance(21.0)
+        calculator = ChannelCalculator(1000, DataTypes.PT100, Wires.WIRES_4)
+        calculator.measurements = (0, 1000000, 5, 5 + resistance * 1000)
+
+        assert abs(calculator.get_value() - 21.0) < 1e-6
+
+    def should_convert_measurements_to_resistance(self):
+        calculator = ChannelCalculator(1000, DataTypes.RESISTANCE_TO_375R,
+                                       Wires.WIRES_2)
+        calculator.measurements = (0, 1000, 0, 100)
+
+        assert calculator.get_value() == 100000
+
+    def should_raise_without_measurements(self):
+        calculator = ChannelCalculator(1000, DataTypes.PT100)
+        try:
+            calculator.get_value()
+            assert False
+        except PicoException as p:
+            assert p.status == PicoStatus.PICO_NO_SAMPLES_AVAILABLE
+
+
+class A_batch_conversion:
+    def _raw(self, resistances, calibration=1000):
+        raw = np.zeros((len(resistances), 4))
+        raw[:, 0] = 1000
+        raw[:, 1] = 1000 + 2**23
+        raw[:, 2] = 500
+        raw[:, 3] = 500 + np.round(np.asarray(resistances) / calibration *
+                                   2**23)
+        return raw
+
+    def should_match_scalar_calculator(self):
+        temperatures = np.linspace(-190, 800, 1000)
+        resistances = PtCalculator(100).get_resistances(temperatures)
+        raw = self._raw(resistances)
+        calculator = ChannelCalculator(1000, DataTypes.PT100, Wires.WIRES_4)
+
+        values = calculator.get_values(raw)
+
+        for measurements, value in zip(raw, values):
+            calculator.measurements = tuple(measurements)
+            assert abs(calculator.get_value() - value) < 1e-6
+
+    def should_convert_resistances_in_every_wire_mode(self):
+        raw = [[0, 1000, 100, 200], [0, 1000, 100, 300]]
+
+        four_wires = get_values(raw, 1000, DataTypes.RESISTANCE_TO_375R,
+                                Wires.WIRES_4)
+        three_wires = get_values(raw, 1000, DataTypes.RESISTANCE_TO_375R,
+                                 Wires.WIRES_3)
+
+        assert list(four_wires) == [100000, 200000]
+        assert list(three_wires) == [1000000, 1100000]
+
+    def should_accept_flat_decoder_windows(self):
+        decoder = FrameDecoder()
+        unit = EmulatedUnit(resistances={1: 110.0})
+        decoder.decode_many(b''.join(unit.get_frame(1, 0) for _ in range(3)))
+
+        values = get_values(decoder.window(1), 1000, DataTypes.PT100,
+                            Wires.WIRES_4)
+
+        assert np.allclose(values, PtCalculator(100).get_temperature(110.0),
+                           atol=1e-3)
+
+
+class A_FrameDecoder:
+    def _frame(self, number, resistance):
+        unit = EmulatedUnit(resistances={number: resistance})
+        return unit.get_frame(number, 0)
+
+    def should_decode_frame_into_channel_buffer(self):
+        decoder = FrameDecoder()
+
+        number = decoder.decode(self._frame(3, 100.0))
+
+        m0, m1, m2, m3 = decoder.latest(3)
+        assert number == 3
+        assert abs(1000 * (m3 - m2) / (m1 - m0) - 100.0) < 1e-3
+        assert decoder.latest(1) is None
+
+    def should_decode_bursts_keeping_last_measurements(self):
+        decoder = FrameDecoder(size=3)
+        burst = b''.join(self._frame(1, resistance)
+                         for resistance in (100, 101, 102, 103, 104))
+
+        assert decoder.decode_many(burst) == 5
+
+        window = decoder.window(1)
+        assert decoder.counts[1] == 5
+        assert [round(1000 * (window[index + 3] - window[index + 2]) /
+                      (window[index + 1] - window[index]), 3)
+                for index in range(0, 12, 4)] == [102, 103, 104]
+
+    def should_receive_into_reusable_buffer(self):
+        decoder = FrameDecoder()
+        sender, receiver = socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+        sender.send(self._frame(2, 50.0) + self._frame(4, 60.0))
+
+        assert decoder.recv_into(receiver) == 2
+        assert decoder.counts == {1: 0, 2: 1, 3: 0, 4: 1}
+        sender.close()
+        receiver.close()
+
+
+class An_EthernetInterface:
+    def setup_method(self, method):
+        self.emulator = EthernetEmulator()
+        self.emulator.start()
+
+    def teardown_method(self, method):
+        self.emulator.stop()
+
+    def should_read_temperatures_from_unit(self):
+        resistance = PtCalculator(100).get_resistance(20.0)
+        emulated_unit = EmulatedUnit('EMU01/002', resistances={2: resistance},
+                                     conversion_time=0.01)
+        address = self.emulator.add_unit(emulated_unit)
+        interface = EthernetInterface()
+        unit = PT104(address, interface)
+        unit.scheduler.CONVERSION_TIME = 0.01
+        unit.scheduler.MIN_WARM_UP = 0.1
+        unit.scheduler.WARM_UP_FACTOR = 0
+
+        unit.connect()
+        assert unit.info['batch_and_serial'] == 'EMU01/002'
+        unit.set_mains(True)
+        assert emulated_unit.sixty_hertz
+        unit.channels[2].data_type = DataTypes.PT100
+        unit.channels[2].wires = Wires.WIRES_4
+        unit.channels[2].activate()
+
+        assert abs(unit.channels[2].value - 20.0) < 1e-3
+        unit.disconnect()
+        assert not emulated_unit.is_locked
+
+    def should_share_one_event_loop_between_units(self):
+        interface = EthernetInterface()
+        addresses = [self.emulator.add_unit(EmulatedUnit(f'EMU02/{index:03d}'))
+                     for index in range(20)]
+
+        for address in addresses:
+            interface.open_unit(address)
+        for address in addresses:
+            interface.close_unit(address)
+
+        assert all(not unit.is_locked for unit in self.emulator.units.values())
+
+    @patch.object(Connection, 'TIMEOUT', 0.1)
+    def should_raise_when_unit_does_not_respond(self):
+        address = self.emulator.add_unit(EmulatedUnit())
+        self.emulator.units[address].handle = lambda *args: None
+        interface = EthernetInterface()
+
+        try:
+            interface.open_unit(address)
+            assert False
+        except PicoException as p:
+            assert p.status == PicoStatus.PICO_NOT_RESPONDING
+
+    def should_raise_busy_when_unit_is_locked_by_another_client(self):
+        address = self.emulator.add_unit(EmulatedUnit())
+        other = EthernetInterface()
+        other.open_unit(address)
+        connection = EthernetInterface._CONNECTIONS.pop(address)
+        interface = EthernetInterface()
+
+        start = time.time()
+        try:
+            interface.open_unit(address)
+            assert False
+        except PicoException as p:
+            assert p.status == PicoStatus.PICO_BUSY
+        assert time.time() - start < Connection.TIMEOUT
+        assert address not in EthernetInterface._CONNECTIONS
+        other._run(connection.close())
+
+    @patch.object(Connection, 'ALIVE_INTERVAL', 0.05)
+    @patch.object(Connection, 'TIMEOUT', 0.05)
+    def should_reconnect_when_keep_alive_fails(self):
+        address = self.emulator.add_unit(EmulatedUnit())
+        unit = self.emulator.units[address]
+        handle = unit.handle
+        interface = EthernetInterface()
+        interface.open_unit(address)
+
+        unit.handle = lambda *args: None
+        time.sleep(0.3)
+        try:
+            interface.get_value(address, 1)
+            assert False
+        except PicoException as p:
+            assert p.status == PicoStatus.PICO_NOT_RESPONDING
+
+        unit.handle = handle
+        time.sleep(0.3)
+        assert interface._get_conn(address).exception is None
+        interface.close_unit(address)
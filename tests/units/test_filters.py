@@ -0,0 +1,119 @@
+from unittest.mock import Mock
+import random
+import statistics
+import time
+import numpy as np
+import pytest
+from PT104 import PT104, DataTypes
+from PT104.filters import (EMA, MovingAverage, MovingMedian, SavitzkyGolay,
+                           Pipeline, FilterBank)
+
+
+def _samples(count=500, seed=1):
+    generator = random.Random(seed)
+    return [20 + index * 0.01 + generator.gauss(0, 0.1)
+            for index in range(count)]
+
+
+class A_filter:
+    def should_compute_exponential_moving_average(self):
+        ema = EMA(alpha=0.5)
+
+        assert ema.update(10) == 10
+        assert ema.update(20) == 15
+        assert ema.update(20) == 17.5
+        with pytest.raises(ValueError):
+            EMA(alpha=0)
+
+    def should_compute_moving_average_and_median(self):
+        samples = _samples()
+        average = MovingAverage(7)
+        median = MovingMedian(6)
+
+        for index, sample in enumerate(samples):
+            assert average.update(sample) == pytest.approx(
+                statistics.mean(samples[max(0, index - 6):index + 1])
+            )
+            assert median.update(sample) == statistics.median(
+                samples[max(0, index - 5):index + 1]
+            )
+
+    def should_compute_median_of_repeated_samples(self):
+        samples = [float(index * 7 % 5) for index in range(500)]
+        median = MovingMedian(8)
+
+        for index, sample in enumerate(samples):
+            assert median.update(sample) == statistics.median(
+                samples[max(0, index - 7):index + 1]
+            )
+        assert len(median._low) + len(median._high) <= 2 * 8 + 1
+
+    def should_fit_polynomial_to_window(self):
+        samples = _samples()
+        savgol = SavitzkyGolay(11, order=3)
+
+        for index, sample in enumerate(samples):
+            value = savgol.update(sample)
+            if index < 10:
+                assert value == sample
+                continue
+            window = samples[index - 10:index + 1]
+            fit = np.polyval(np.polyfit(range(11), window, 3), 10)
+            assert value == pytest.approx(fit, abs=1e-8)
+
+    def should_chain_stages_in_pipelines(self):
+        pipeline = Pipeline(MovingMedian(3), EMA(alpha=1))
+
+        assert [pipeline.update(value) for value in (1, 100, 2, 3)] == [
+            1, 50.5, 2, 3
+        ]
+        pipeline.reset()
+        assert pipeline.update(7) == 7
+
+
+class A_FilterBank:
+    def should_filter_samples_acquired_by_a_unit(self):
+        interface = Mock()
+        interface.open_unit.return_value = 'filtering'
+        interface.get_value.side_effect = lambda id, number, lpf: number
+        pt104 = PT104('filtering', interface)
+        pt104.scheduler.CONVERSION_TIME = 0.01
+        pt104.scheduler.MIN_WARM_UP = 0
+        pt104.scheduler.WARM_UP_FACTOR = 0
+        pt104.channels[2].data_type = DataTypes.PT100
+        pt104.channels[2].activate()
+        bank = FilterBank()
+        bank.add(2, 'ema', EMA(0.1))
+        bank.add(2, 'median', MovingMedian(5))
+
+        bank.attach(pt104)
+        time.sleep(0.2)
+        buffer = pt104.acquisition.buffers[2]
+        pt104.stop_acquisition()
+
+        assert bank.latest(2, 'ema')[1] == pytest.approx(2)
+        assert bank.latest(2, 'median') == buffer.latest()
+        assert interface.get_value.call_count == buffer.count
+        assert bank.latest(1, 'ema') is None
+
+    def should_filter_samples_once_when_attached_twice(self):
+        interface = Mock()
+        interface.open_unit.return_value = 'filtering'
+        interface.get_value.side_effect = lambda id, number, lpf: number
+        pt104 = PT104('filtering', interface)
+        pt104.scheduler.CONVERSION_TIME = 0.01
+        pt104.scheduler.MIN_WARM_UP = 0
+        pt104.scheduler.WARM_UP_FACTOR = 0
+        pt104.channels[2].data_type = DataTypes.PT100
+        pt104.channels[2].activate()
+        bank = FilterBank()
+        stage = Mock()
+        stage.update.side_effect = lambda value: value
+        bank.add(2, 'counting', stage)
+
+        bank.attach(pt104)
+        bank.attach(pt104)
+        time.sleep(0.2)
+        pt104.stop_acquisition()
+
+        assert stage.update.call_count == interface.get_value.call_count
@@ -0,0 +1,194 @@
+from unittest.mock import Mock
+import threading
+import time
+from PT104 import PT104, DataTypes, Wires, PicoStatus
+from PT104.fleet import Fleet
+from PT104.simulator import SimulatedDriver
+from PT104.usb import USBdriver, USBinterface
+
+
+def _create_unit(id):
+    interface = Mock()
+    interface.open_unit.return_value = id
+    interface.get_value.side_effect = lambda id, number, lpf: number
+    unit = PT104(id, interface)
+    unit.scheduler.CONVERSION_TIME = 0.01
+    unit.scheduler.MIN_WARM_UP = 0
+    unit.scheduler.WARM_UP_FACTOR = 0
+    unit.connect()
+    for number in (1, 2):
+        unit.channels[number].data_type = DataTypes.PT100
+        unit.channels[number].activate()
+    return unit
+
+
+class A_Fleet:
+    def should_merge_samples_of_all_units(self):
+        units = [_create_unit(f'unit{index}') for index in range(5)]
+        fleet = Fleet(units)
+
+        fleet.start()
+        samples = []
+        for sample in fleet.samples(timeout=1):
+            samples.append(sample)
+            if len(samples) == 100:
+                break
+        fleet.stop()
+
+        assert {sample.unit for sample in samples} == {unit.id
+                                                       for unit in units}
+        assert {sample.channel for sample in samples} == {1, 2}
+        assert all(sample.value == sample.channel for sample in samples)
+
+    def should_report_throughput_and_lag_per_unit(self):
+        units = [_create_unit(f'unit{index}') for index in range(3)]
+        fleet = Fleet(units, max_workers=3)
+
+        fleet.start()
+        for index, sample in enumerate(fleet.samples(timeout=1)):
+            if index == 60:
+                break
+        fleet.stop()
+        stats = fleet.stats()
+
+        assert set(stats) == {'unit0', 'unit1', 'unit2'}
+        assert sum(unit['samples'] for unit in stats.values()) == 61
+        assert all(unit['throughput'] > 0 for unit in stats.values())
+        assert all(unit['max_lag'] >= unit['lag'] >= 0
+                   for unit in stats.values())
+
+    def should_poll_every_unit_with_fewer_workers(self):
+        units = [_create_unit(f'unit{index}') for index in range(6)]
+        fleet = Fleet(units, max_workers=2)
+
+        fleet.start()
+        seen = set()
+        for sample in fleet.samples(timeout=1):
+            seen.add(sample.unit)
+            if len(seen) == len(units):
+                break
+        fleet.stop()
+
+        assert seen == {unit.id for unit in units}
+
+    def should_keep_polling_after_unexpected_errors(self):
+        failing = _create_unit('failing')
+        failing.interface.get_value.side_effect = OSError('device gone')
+        units = [failing, _create_unit('unit1')]
+        fleet = Fleet(units, max_workers=1)
+
+        fleet.start()
+        samples = []
+        for sample in fleet.samples(timeout=1):
+            samples.append(sample)
+            if len(samples) == 10:
+                break
+        fleet.stop()
+
+        assert len(samples) == 10
+        assert {sample.unit for sample in samples} == {'unit1'}
+        assert fleet.stats()['failing']['errors'] > 0
+
+    def should_start_without_units(self):
+        fleet = Fleet([])
+
+        fleet.start()
+        assert list(fleet.samples(timeout=0.1)) == []
+        fleet.stop()
+
+    def should_stop_delivering_samples_when_stopped(self):
+        fleet = Fleet([_create_unit('unit0')])
+        fleet.start()
+        threading.Timer(0.2, fleet.stop).start()
+
+        start = time.time()
+        samples = list(fleet.samples())
+
+        assert samples
+        assert time.time() - start < 1
+
+    def should_drop_oldest_samples_when_queue_is_full(self):
+        fleet = Fleet([_create_unit('unit0')], queue_size=4)
+
+        fleet.start()
+        time.sleep(0.2)
+        fleet.stop()
+        samples = list(fleet.samples(timeout=0.1))
+
+        assert len(samples) == 4
+        assert fleet.stats()['unit0']['dropped'] > 0
+
+
+class A_Fleet_bring_up:
+    def should_bring_up_units_concurrently(self):
+        driver = SimulatedDriver(units=10, open_time=0.1)
+        interface = USBinterface(driver=driver)
+
+        start = time.time()
+        fleet = Fleet.bring_up(interface, driver.serials,
+                               channels={1: (DataTypes.PT100, Wires.WIRES_4),
+                                         2: (DataTypes.PT1000, Wires.WIRES_3)},
+                               sixty_hertz=True, max_workers=10)
+        elapsed_time = time.time() - start
+
+        assert elapsed_time < 0.5
+        assert [unit.id for unit in fleet.units] == driver.serials
+        assert all(unit.active_channels_count == 2 for unit in fleet.units)
+        assert all(unit.sixty_hertz for unit in driver.units)
+        assert all(unit._info for unit in fleet.units)
+        for timings in fleet.timings.values():
+            assert timings['open'] >= 0.1
+            assert set(timings) == {'open', 'channels', 'mains', 'info',
+                                    'total'}
+
+    def should_report_units_failing_to_open(self):
+        driver = SimulatedDriver(units=2)
+        interface = USBinterface(driver=driver)
+
+        fleet = Fleet.bring_up(interface, driver.serials + ['MISSING'],
+                               max_concurrent_opens=1)
+
+        assert len(fleet.units) == 2
+        error = fleet.timings['MISSING']['error']
+        assert error.status == PicoStatus.PICO_NOT_FOUND
+
+    def should_close_units_failing_after_opening(self):
+        driver = SimulatedDriver(units=2)
+        driver.lib.inject_error('UsbPt104SetChannel',
+                                PicoStatus.PICO_NOT_RESPONDING)
+        interface = USBinterface(driver=driver)
+
+        fleet = Fleet.bring_up(interface, driver.serials,
+                               channels={1: (DataTypes.PT100, Wires.WIRES_4)},
+                               max_workers=1)
+
+        assert len(fleet.units) == 1
+        failed = [serial for serial, timings in fleet.timings.items()
+                  if 'error' in timings]
+        assert len(failed) == 1
+        assert not driver.units[driver.serials.index(failed[0])].is_open
+
+    def should_close_units_failing_with_unexpected_errors(self):
+        driver = SimulatedDriver(units=2)
+        driver.lib.UsbPt104SetMains = Mock(side_effect=RuntimeError('bug'))
+        interface = USBinterface(driver=driver)
+
+        fleet = Fleet.bring_up(interface, driver.serials, sixty_hertz=True)
+
+        assert fleet.units == []
+        for timings in fleet.timings.values():
+            assert isinstance(timings['error'], RuntimeError)
+        assert not any(unit.is_open for unit in driver.units)
+
+    def should_open_units_of_usb_library_one_at_a_time(self):
+        driver = Mock(spec=USBdriver)
+        driver.lib = SimulatedDriver(units=3, open_time=0.1).lib
+        interface = USBinterface(driver=driver)
+
+        start = time.time()
+        fleet = Fleet.bring_up(interface, list(driver.lib.units),
+                               max_workers=3)
+        elapsed_time = time.time() - start
+
+        assert len(fleet.units) == 3
+        assert elapsed_time >= 0.3
@@ -0,0 +1,118 @@
+from unittest.mock import Mock
+import time
+import pytest
+from PT104 import PT104, DataTypes
+from PT104.history import HistoryStore
+
+
+def _fill(history, count):
+    for index in range(count):
+        history.append(float(index), index * 10.0)
+
+
+class A_ChannelHistory:
+    def should_answer_range_queries_across_segments(self, tmp_path):
+        store = HistoryStore(str(tmp_path), segment_records=4)
+        history = store.channel('AY429/026', 3)
+        _fill(history, 10)
+
+        samples = store.query('AY429/026', 3, start=2.5, stop=7)
+        assert list(samples['timestamp']) == [3, 4, 5, 6]
+        assert list(samples['value']) == [30, 40, 50, 60]
+        assert len(store.query('AY429/026', 3)) == 10
+        assert len(store.query('AY429/026', 3, start=20)) == 0
+        assert len(list((tmp_path / 'AY429_026' / 'ch3').iterdir())) == 3
+
+    def should_return_views_of_mapped_segments(self, tmp_path):
+        store = HistoryStore(str(tmp_path), segment_records=8)
+        history = store.channel('unit', 1)
+        _fill(history, 6)
+
+        samples = history.query(start=1, stop=4)
+        assert not samples.flags.owndata
+        assert not samples.flags.writeable
+        assert list(samples['value']) == [10, 20, 30]
+
+    def should_reopen_and_keep_appending(self, tmp_path):
+        store = HistoryStore(str(tmp_path), segment_records=4)
+        _fill(store.channel('unit', 1), 6)
+        store.close()
+
+        store = HistoryStore(str(tmp_path), segment_records=4)
+        history = store.channel('unit', 1)
+        assert len(history) == 6
+        history.append(6.0, 60.0)
+        assert list(history.query(start=5)['value']) == [50, 60]
+
+    def should_refuse_older_samples(self, tmp_path):
+        history = HistoryStore(str(tmp_path)).channel('unit', 1)
+        history.append(10.0, 1.0)
+
+        with pytest.raises(ValueError):
+            history.append(9.0, 1.0)
+
+
+class A_HistoryStore:
+    def should_store_samples_acquired_by_a_unit(self, tmp_path):
+        interface = Mock()
+        interface.open_unit.return_value = 'storing'
+        interface.get_value.side_effect = lambda id, number, lpf: number
+        pt104 = PT104('storing', interface)
+        pt104.scheduler.CONVERSION_TIME = 0.01
+        pt104.scheduler.MIN_WARM_UP = 0
+        pt104.scheduler.WARM_UP_FACTOR = 0
+        pt104.channels[2].data_type = DataTypes.PT100
+        pt104.channels[2].activate()
+        store = HistoryStore(str(tmp_path))
+
+        store.attach(pt104)
+        time.sleep(0.2)
+        pt104.stop_acquisition()
+
+        samples = store.query('storing', 2)
+        assert len(samples) > 5
+        assert set(samples['value']) == {2}
+
+    def should_store_samples_once_when_attached_twice(self, tmp_path):
+        interface = Mock()
+        interface.open_unit.return_value = 'storing'
+        interface.get_value.side_effect = lambda id, number, lpf: number
+        pt104 = PT104('storing', interface)
+        pt104.scheduler.CONVERSION_TIME = 0.01
+        pt104.scheduler.MIN_WARM_UP = 0
+        pt104.scheduler.WARM_UP_FACTOR = 0
+        pt104.channels[2].data_type = DataTypes.PT100
+        pt104.channels[2].activate()
+        store = HistoryStore(str(tmp_path))
+
+        store.attach(pt104)
+        store.attach(pt104)
+        time.sleep(0.2)
+        pt104.stop_acquisition()
+
+        samples = store.query('storing', 2)
+        assert len(samples) == interface.get_value.call_count
+
+    def should_stop_storing_when_detached(self, tmp_path):
+        interface = Mock()
+        interface.open_unit.return_value = 'storing'
+        interface.get_value.side_effect = lambda id, number, lpf: number
+        pt104 = PT104('storing', interface)
+        pt104.scheduler.CONVERSION_TIME = 0.01
+        pt104.scheduler.MIN_WARM_UP = 0
+        pt104.scheduler.WARM_UP_FACTOR = 0
+        pt104.channels[2].data_type = DataTypes.PT100
+        pt104.channels[2].activate()
+        store = HistoryStore(str(tmp_path))
+
+        store.attach(pt104)
+        time.sleep(0.1)
+        store.detach(pt104)
+        # Let a notification in progress complete
+        time.sleep(0.02)
+        count = len(store.query('storing', 2))
+        time.sleep(0.1)
+        pt104.stop_acquisition()
+
+        assert len(store.query('storing', 2)) == count
+        assert pt104.listeners == []
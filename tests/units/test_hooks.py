@@ -0,0 +1,94 @@
+from unittest.mock import Mock
+import pytest
+from PT104 import PT104, DataTypes, PicoException, PicoStatus
+from PT104.hooks import HOOKS, HookRegistry
+
+
+@pytest.fixture
+def hooks():
+    yield HOOKS
+    HOOKS.clear()
+
+
+def _create_unit():
+    interface = Mock()
+    interface.open_unit.return_value = 'hooked'
+    interface.get_value.return_value = 21.5
+    return PT104('hooked', interface)
+
+
+class A_HookRegistry:
+    def should_call_pre_and_post_callbacks_of_operations(self, hooks):
+        calls = []
+        hooks.register(
+            pre=lambda *args: calls.append(('pre',) + args),
+            post=lambda *args: calls.append(('post',) + args)
+        )
+        unit = _create_unit()
+
+        unit.connect()
+        unit.channels[2].data_type = DataTypes.PT100
+        unit.channels[2].activate()
+        assert unit.get_value(2) == 21.5
+        unit.set_mains(True)
+        unit.disconnect()
+
+        # Units of other tests may be collected meanwhile
+        calls = [call for call in calls if call[2] == 'hooked']
+        assert [call[:4] for call in calls if call[0] == 'pre'] == [
+            ('pre', 'connect', 'hooked', None),
+            ('pre', 'activate_channel', 'hooked', 2),
+            ('pre', 'get_value', 'hooked', 2),
+            ('pre', 'set_mains', 'hooked', None),
+            ('pre', 'disconnect', 'hooked', None),
+        ]
+        posts = [call for call in calls if call[0] == 'post']
+        assert len(posts) == 5
+        assert all(call[4] >= 0 and call[5] == PicoStatus.PICO_OK
+                   for call in posts)
+
+    def should_report_status_of_failed_operations(self, hooks):
+        posts = []
+        hooks.register(post=lambda *args: posts.append(args),
+                       operations=['get_value', 'set_mains'])
+        unit = _create_unit()
+        unit.interface.get_value.side_effect = PicoException(
+            PicoStatus.PICO_NOT_RESPONDING, 'hooked'
+        )
+
+        with pytest.raises(PicoException):
+            unit.get_value(1)
+        unit.set_mains()
+
+        assert [(post[0], post[4]) for post in posts] == [
+            ('get_value', PicoStatus.PICO_NOT_RESPONDING),
+            ('set_mains', PicoStatus.PICO_OK)
+        ]
+
+    def should_sample_hooked_calls(self, hooks):
+        posts = []
+        hooks.register(post=lambda *args: posts.append(args),
+                       operations=['get_value'], sample_rate=0.1)
+        unit = _create_unit()
+
+        for _ in range(2000):
+            unit.get_value(1)
+
+        assert 100 < len(posts) < 300
+
+    def should_be_inactive_without_hooks(self):
+        registry = HookRegistry()
+        assert not registry.active
+
+        hook = registry.register(post=print)
+        assert registry.active
+        registry.unregister(hook)
+        assert not registry.active
+        with pytest.raises(ValueError):
+            registry.register(post=print, operations=['read'])
+
+    def should_survive_failing_hooks(self, hooks):
+        hooks.register(pre=lambda *args: 1 / 0)
+        unit = _create_unit()
+
+        assert unit.get_value(1) == 21.5
@@ -0,0 +1,133 @@
+import threading
+import time
+import pytest
+from PT104 import PT104, DataTypes, PicoException, PicoStatus
+from PT104.metrics import Metrics, METRICS, bucket_index, bucket_bounds
+from PT104.emulator import EthernetEmulator, EmulatedUnit
+from PT104.ethernet import EthernetInterface
+from PT104.simulator import SimulatedDriver
+from PT104.usb import USBinterface
+
+
+@pytest.fixture
+def metrics():
+    METRICS.reset()
+    METRICS.enable()
+    yield METRICS
+    METRICS.disable()
+    METRICS.reset()
+
+
+class A_Metrics:
+    def should_bucket_latencies_with_bounded_relative_error(self):
+        for nanoseconds in (0, 15, 16, 17, 1000, 123456789):
+            low, high = bucket_bounds(bucket_index(nanoseconds))
+            assert low <= nanoseconds <= high
+            assert high - low <= max(nanoseconds / 16, 0)
+
+    def should_merge_series_recorded_by_many_threads(self):
+        metrics = Metrics(enabled=True)
+
+        def record():
+            for _ in range(100):
+                metrics.record('op', 'unit', 1, time.perf_counter_ns())
+            metrics.record('op', 'unit', 1, time.perf_counter_ns(), True)
+
+        threads = [threading.Thread(target=record) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        stats = metrics.snapshot()[('op', 'unit', 1)]
+        assert stats['count'] == 404
+        assert stats['errors'] == 4
+        assert 0 <= stats['p50'] <= stats['p99'] <= stats['max']
+
+    def should_merge_series_of_finished_threads(self):
+        metrics = Metrics(enabled=True)
+
+        for _ in range(50):
+            thread = threading.Thread(
+                target=metrics.record,
+                args=('op', 'unit', 1, time.perf_counter_ns())
+            )
+            thread.start()
+            thread.join()
+        metrics.record('op', 'unit', 1, time.perf_counter_ns())
+
+        assert len(metrics._stores) <= 2
+        assert metrics.snapshot()[('op', 'unit', 1)]['count'] == 51
+
+    def should_escape_prometheus_label_values(self):
+        metrics = Metrics(enabled=True)
+        metrics.record('op', 'a\\b"c\nd', None, time.perf_counter_ns())
+
+        assert 'unit="a\\\\b\\"c\\nd"' in metrics.to_prometheus()
+
+    def should_export_prometheus_histograms(self):
+        metrics = Metrics(enabled=True)
+        start = time.perf_counter_ns() - 3_000_000
+        metrics.record('UsbPt104GetValue', 'AY429/026', 1, start)
+
+        text = metrics.to_prometheus()
+
+        assert ('pt104_operation_duration_seconds_bucket{operation='
+                '"UsbPt104GetValue",unit="AY429/026",channel="1",le="0.002"} '
+                '0') in text
+        assert ('pt104_operation_duration_seconds_bucket{operation='
+                '"UsbPt104GetValue",unit="AY429/026",channel="1",le="0.005"} '
+                '1') in text
+        assert ('pt104_operation_errors_total{operation="UsbPt104GetValue",'
+                'unit="AY429/026",channel="1"} 0') in text
+
+
+class An_instrumented_unit:
+    def should_time_driver_calls_and_conversion_waits(self, metrics):
+        driver = SimulatedDriver(units=1, conversion_time=0.01)
+        interface = USBinterface(driver=driver)
+        unit = PT104(driver.serials[0], interface)
+        unit.scheduler.CONVERSION_TIME = 0.01
+        unit.scheduler.MIN_WARM_UP = 0.05
+        unit.scheduler.WARM_UP_FACTOR = 0
+        unit.channels[1].data_type = DataTypes.PT100
+        unit.channels[1].activate()
+        unit.channels[1].value
+        driver.lib.inject_error('UsbPt104GetValue',
+                                PicoStatus.PICO_NOT_RESPONDING)
+        with pytest.raises(PicoException):
+            unit.channels[1].value
+        unit.disconnect()
+
+        snapshot = metrics.snapshot()
+        assert snapshot[('UsbPt104OpenUnit', 'SIM00/000', None)]['count'] == 1
+        assert snapshot[('UsbPt104SetChannel', 'SIM00/000', 1)]['count'] == 1
+        get_value = snapshot[('UsbPt104GetValue', 'SIM00/000', 1)]
+        assert get_value['count'] == 2 and get_value['errors'] == 1
+        wait = snapshot[('wait_for_conversion', 'SIM00/000', 1)]
+        assert wait['count'] == 2 and wait['max'] >= 0.04
+
+    def should_not_record_when_disabled(self):
+        METRICS.reset()
+        driver = SimulatedDriver(units=1)
+        interface = USBinterface(driver=driver)
+        unit = PT104(driver.serials[0], interface)
+        unit.connect()
+        unit.disconnect()
+
+        assert METRICS.snapshot() == {}
+
+    def should_time_ethernet_commands(self, metrics):
+        emulator = EthernetEmulator()
+        emulator.start()
+        address = emulator.add_unit(EmulatedUnit('EMU04/001'))
+        interface = EthernetInterface()
+
+        interface.open_unit(address)
+        interface.close_unit(address)
+        emulator.stop()
+
+        snapshot = metrics.snapshot()
+        assert snapshot[('EthernetLock', address, None)]['count'] == 1
+        assert snapshot[('EthernetEprom', address, None)]['errors'] == 0
+        assert snapshot[('EthernetUnlock', address, None)]['count'] == 1
@@ -0,0 +1,102 @@
+from unittest.mock import Mock
+import statistics
+import time
+import pytest
+from PT104 import PT104, DataTypes
+from PT104.rollup import ChannelRollup, RollupEngine
+
+
+class A_ChannelRollup:
+    def should_aggregate_samples_by_resolution(self):
+        rollup = ChannelRollup()
+        values = [float(value % 7) for value in range(180)]
+        for index, value in enumerate(values):
+            rollup.add(1000 * 60 + index * 0.5, value)
+
+        seconds = rollup.query(resolution=1)
+        minutes = rollup.query(resolution=60)
+        assert len(seconds) == 90
+        assert len(minutes) == 2
+        assert minutes[0].start == 60000
+        assert minutes[0].count == 120
+        assert minutes[0].min == 0 and minutes[0].max == 6
+        assert minutes[0].mean == pytest.approx(statistics.mean(values[:120]))
+        assert minutes[0].variance == pytest.approx(
+            statistics.pvariance(values[:120])
+        )
+
+    def should_keep_a_bounded_number_of_buckets(self):
+        rollup = ChannelRollup(resolutions=((1, 5), (10, 5)))
+        for index in range(100):
+            rollup.add(float(index), 1.0)
+
+        assert len(rollup.query(resolution=1)) == 6
+        assert [aggregate.start for aggregate in
+                rollup.query(resolution=10)] == [40, 50, 60, 70, 80, 90]
+
+    def should_pick_coarsest_resolution_with_enough_points(self):
+        rollup = ChannelRollup()
+        rollup.add(0.0, 1.0)
+        day = 86400
+
+        # 1 day of minutes is kept, hours are the finest for a week
+        assert rollup.select(0, 7 * day, points=500) == 3600
+        assert rollup.select(0, 7 * day, points=100) == 3600
+        assert rollup.select(0, 7 * day, points=5) == 86400
+        assert rollup.select(0, 60, points=500) == 1
+        assert rollup.query(0, day, points=10) == rollup.query(
+            0, day, resolution=3600
+        )
+        with pytest.raises(ValueError):
+            rollup.query(resolution=2)
+
+    def should_not_select_resolutions_missing_dropped_buckets(self):
+        rollup = ChannelRollup(resolutions=[(1, 10), (10, 100)])
+        for second in range(30):
+            rollup.add(float(second), 1.0)
+
+        assert rollup.select(25, 30, points=5) == 1
+        assert rollup.select(5, 10, points=5) == 10
+        assert rollup.select(0, 5000, points=5) == 10
+
+
+class A_RollupEngine:
+    def should_aggregate_samples_acquired_by_a_unit(self):
+        interface = Mock()
+        interface.open_unit.return_value = 'aggregating'
+        interface.get_value.side_effect = lambda id, number, lpf: number
+        pt104 = PT104('aggregating', interface)
+        pt104.scheduler.CONVERSION_TIME = 0.01
+        pt104.scheduler.MIN_WARM_UP = 0
+        pt104.scheduler.WARM_UP_FACTOR = 0
+        pt104.channels[2].data_type = DataTypes.PT100
+        pt104.channels[2].activate()
+        rollups = RollupEngine()
+
+        rollups.attach(pt104)
+        time.sleep(0.2)
+        pt104.stop_acquisition()
+
+        aggregate, = rollups.query('aggregating', 2, resolution=86400)
+        assert aggregate.count > 5
+        assert aggregate.mean == 2 and aggregate.variance == 0
+
+    def should_aggregate_samples_once_when_attached_twice(self):
+        interface = Mock()
+        interface.open_unit.return_value = 'aggregating'
+        interface.get_value.side_effect = lambda id, number, lpf: number
+        pt104 = PT104('aggregating', interface)
+        pt104.scheduler.CONVERSION_TIME = 0.01
+        pt104.scheduler.MIN_WARM_UP = 0
+        pt104.scheduler.WARM_UP_FACTOR = 0
+        pt104.channels[2].data_type = DataTypes.PT100
+        pt104.channels[2].activate()
+        rollups = RollupEngine()
+
+        rollups.attach(pt104)
+        rollups.attach(pt104)
+        time.sleep(0.2)
+        pt104.stop_acquisition()
+
+        aggregate, = rollups.query('aggregating', 2, resolution=86400)
+        assert aggregate.count == interface.get_value.call_count
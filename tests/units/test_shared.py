@@ -0,0 +1,107 @@
+from unittest.mock import Mock
+import multiprocessing
+import time
+import uuid
+import pytest
+from PT104 import PT104, DataTypes, PicoException, PicoStatus
+from PT104.shared import TablePublisher, TableReader
+
+
+def _name():
+    return f'pt104_test_{uuid.uuid4().hex[:8]}'
+
+
+def _read_in_child(name, queue):
+    table = TableReader(name)
+    queue.put(tuple(table.read(1)))
+    table.close()
+
+
+class A_TablePublisher:
+    def should_publish_last_reading_of_each_channel(self):
+        publisher = TablePublisher(_name())
+        reader = TableReader(publisher.name)
+        assert reader.read(1) is None
+
+        publisher.write(1, 10.0, 21.5)
+        publisher.write(1, 11.0, 21.7)
+        publisher.write(3, 12.0, float('nan'),
+                        PicoStatus.PICO_NO_SAMPLES_AVAILABLE)
+
+        assert reader.read(1) == (2, 11.0, 21.7, 0)
+        assert set(reader.read_all()) == {1, 3}
+        assert reader.read(3).status == PicoStatus.PICO_NO_SAMPLES_AVAILABLE
+        with pytest.raises(IndexError):
+            reader.read(5)
+        reader.close()
+        publisher.unlink()
+
+    def should_be_read_from_other_processes(self):
+        publisher = TablePublisher(_name())
+        publisher.write(1, 10.0, 21.5)
+        queue = multiprocessing.get_context('spawn').Queue()
+        process = multiprocessing.get_context('spawn').Process(
+            target=_read_in_child, args=(publisher.name, queue)
+        )
+        process.start()
+        process.join(10)
+
+        assert queue.get(timeout=1) == (1, 10.0, 21.5, 0)
+        publisher.unlink()
+
+    def should_refuse_other_shared_memory(self):
+        from multiprocessing import shared_memory
+        shm = shared_memory.SharedMemory(create=True, size=64)
+
+        with pytest.raises(ValueError):
+            TableReader(shm.name)
+        shm.close()
+        shm.unlink()
+
+
+class A_PT104_publishing_acquisition:
+    def should_write_acquired_values_to_shared_table(self):
+        interface = Mock()
+        interface.get_value.side_effect = lambda id, number, lpf: number * 10
+        pt104 = PT104('publishing', interface)
+        pt104.scheduler.CONVERSION_TIME = 0.01
+        pt104.scheduler.MIN_WARM_UP = 0
+        pt104.scheduler.WARM_UP_FACTOR = 0
+        for number in (1, 2):
+            pt104.channels[number].data_type = DataTypes.PT100
+            pt104.channels[number].activate()
+
+        name = _name()
+        pt104.start_acquisition(size=10, publish=name)
+        reader = TableReader(name)
+        time.sleep(0.2)
+        interface.get_value.side_effect = PicoException(
+            PicoStatus.PICO_NOT_RESPONDING, 'publishing'
+        )
+        time.sleep(0.1)
+
+        readings = reader.read_all()
+        assert set(readings) == {1, 2}
+        assert readings[1].status == PicoStatus.PICO_NOT_RESPONDING
+        assert pt104.channels[1].latest[1] == 10
+        reader.close()
+        pt104.stop_acquisition()
+        assert pt104.publisher is None
+
+    def should_not_keep_acquisition_when_table_exists(self):
+        interface = Mock()
+        interface.get_value.side_effect = lambda id, number, lpf: number * 10
+        pt104 = PT104('publishing', interface)
+        pt104.channels[1].data_type = DataTypes.PT100
+        pt104.channels[1].activate()
+        publisher = TablePublisher(_name())
+
+        with pytest.raises(FileExistsError):
+            pt104.start_acquisition(publish=publisher.name)
+        assert pt104.acquisition is None
+
+        name = _name()
+        pt104.start_acquisition(publish=name)
+        assert pt104.acquisition.is_alive()
+        pt104.stop_acquisition()
+        publisher.unlink()
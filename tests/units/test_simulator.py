@@ -0,0 +1,150 @@
+import threading
+import time
+from PT104 import PT104, DataTypes, PicoException, PicoStatus
+from PT104.simulator import SimulatedDriver, SimulatedUnit
+from PT104.usb import USBinterface
+
+
+def _create_unit(conversion_time=0.02, **kwargs):
+    driver = SimulatedDriver(
+        [SimulatedUnit('SIM00/000', conversion_time=conversion_time,
+                       **kwargs)]
+    )
+    interface = USBinterface(driver=driver)
+    unit = PT104('SIM00/000', interface)
+    unit.scheduler.CONVERSION_TIME = conversion_time
+    unit.scheduler.MIN_WARM_UP = 5 * conversion_time
+    unit.scheduler.WARM_UP_FACTOR = 0
+    return driver, interface, unit
+
+
+class A_SimulatedDriver:
+    def should_be_selected_by_usb_interface(self):
+        driver = SimulatedDriver(units=3)
+        interface = USBinterface(driver=driver)
+
+        assert interface.driver is driver
+        assert interface.discover_devices() == [
+            'USB:SIM00/000', 'USB:SIM00/001', 'USB:SIM00/002'
+        ]
+
+    def should_report_unit_info(self):
+        driver, interface, unit = _create_unit()
+        unit.connect()
+
+        assert unit.info['batch_and_serial'] == 'SIM00/000'
+        assert unit.info['variant_info'] == 'PT104'
+
+    def should_supply_channel_values_once_converted(self):
+        driver, interface, unit = _create_unit(
+            signals={1: 21.5, 2: lambda t: 100.0}
+        )
+        unit.channels[1].data_type = DataTypes.PT100
+        unit.channels[1].activate()
+        unit.channels[2].data_type = DataTypes.RESISTANCE_TO_375R
+        unit.channels[2].activate()
+
+        try:
+            unit.get_value(2)
+            assert False
+        except PicoException as p:
+            assert p.status == PicoStatus.PICO_NO_SAMPLES_AVAILABLE
+
+        assert unit.channels[1].value == 21.5
+        assert unit.channels[2].value == 100.0
+
+    def should_add_noise_to_values(self):
+        driver, interface, unit = _create_unit(noise=0.1, seed=1)
+        unit.channels[1].data_type = DataTypes.PT100
+        unit.channels[1].activate()
+
+        values = [unit.channels[1].value for _ in range(5)]
+
+        assert len(set(values)) == 5
+        assert all(abs(value - 20) < 1 for value in values)
+
+    def should_inject_error_statuses(self):
+        driver, interface, unit = _create_unit()
+        unit.channels[1].data_type = DataTypes.PT100
+        unit.channels[1].activate()
+        driver.lib.inject_error('UsbPt104GetValue',
+                                PicoStatus.PICO_NOT_RESPONDING)
+        time.sleep(0.05)
+
+        try:
+            unit.get_value(1)
+            assert False
+        except PicoException as p:
+            assert p.status == PicoStatus.PICO_NOT_RESPONDING
+        assert unit.get_value(1) == 20.0
+
+    def should_read_channel_through_prebuilt_reader(self):
+        driver, interface, unit = _create_unit(signals={3: 30.5})
+        unit.channels[3].data_type = DataTypes.PT100
+        unit.channels[3].activate()
+        reader = unit.channels[3].get_reader()
+        time.sleep(0.05)
+
+        assert reader.read() == 30.5
+        driver.lib.inject_error('UsbPt104GetValue', PicoStatus.PICO_BUSY)
+        try:
+            reader.read()
+            assert False
+        except PicoException as p:
+            assert p.status == PicoStatus.PICO_BUSY
+
+
+class A_lazy_USBinterface:
+    def should_not_load_library_nor_open_units_on_creation(self):
+        driver = SimulatedDriver(units=2)
+        interface = USBinterface(driver=driver)
+
+        assert not any(unit.is_open for unit in driver.units)
+        unit = PT104(driver.serials[1], interface)
+        unit.connect()
+        assert [unit.is_open for unit in driver.units] == [False, True]
+
+    def should_load_default_driver_on_first_use_only(self):
+        USBinterface.instance = None
+        interface = USBinterface()
+
+        assert interface._driver is None
+
+    def should_cache_discovered_devices(self):
+        driver = SimulatedDriver(units=1)
+        interface = USBinterface(driver=driver)
+        enumerate_devices = driver.lib.UsbPt104Enumerate
+        calls = []
+        driver.lib.UsbPt104Enumerate = (
+            lambda *args: calls.append(args) or enumerate_devices(*args)
+        )
+
+        interface.discover_devices()
+        assert interface.discover_devices() == ['USB:SIM00/000']
+        assert len(calls) == 1
+
+        interface.discover_devices(refresh=True)
+        assert len(calls) == 2
+        interface.instance.DISCOVERY_TTL = 0
+        interface.discover_devices()
+        assert len(calls) == 3
+
+    def should_open_a_unit_once_when_opened_concurrently(self):
+        driver = SimulatedDriver(units=1, open_time=0.1)
+        interface = USBinterface(driver=driver)
+        open_unit = driver.lib.UsbPt104OpenUnit
+        calls = []
+        driver.lib.UsbPt104OpenUnit = (
+            lambda *args: calls.append(args) or open_unit(*args)
+        )
+
+        threads = [threading.Thread(target=interface.open_unit,
+                                    args=(driver.serials[0],))
+                   for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(calls) == 1
+        interface.close_unit(driver.serials[0])